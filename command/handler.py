@@ -32,6 +32,7 @@ class CommandHandler:
         self.lq_delete_handler = plugin.lq_delete_handler
         self.lq_initialize_handler = plugin.lq_initialize_handler
         self.lq_reset_handler = plugin.lq_reset_handler
+        self.lq_migrate_handler = plugin.lq_migrate_handler
         
         self.jq_handler = plugin.jq_handler
         self.jq_help_handler = plugin.jq_help_handler
@@ -89,6 +90,15 @@ class CommandHandler:
             async for result in self.lq_reset_handler.handle_reset(event, is_confirm):
                 yield result
             return
+        elif subcommand.lower() == "migrate":
+            # 将JSON数据导入SQLite
+            if not event.is_admin():
+                yield event.plain_result("❌ 此操作需要管理员权限")
+                return
+            is_confirm = self._has_confirm_param(event)
+            async for result in self.lq_migrate_handler.handle_migrate(event, is_confirm):
+                yield result
+            return
         
         # 默认处理：抽取或查询今日灵签
         async for result in self.lq_handler.handle_draw_or_query(event):
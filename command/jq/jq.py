@@ -3,10 +3,12 @@
 处理解签的核心功能
 """
 
+import asyncio
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 from ...core.core_lq_userinfo import UserInfoManager
 from ...core.core_lq_group import GroupManager
+from ...core.core_lq_template import compile_template
 from ...core.variable import get_today
 
 # 存储正在处理的用户
@@ -29,7 +31,7 @@ class JieqianHandler:
             user_info = await UserInfoManager.get_user_info(event)
             
             # 检查人品前置条件
-            if not self.plugin._check_jrrp_required(user_id):
+            if not await self.plugin._check_jrrp_required(user_id):
                 template = self.plugin.config.get('lingqian_jrrptip_template', '「{card}」今日还未检测人品运势')
                 variables = self.plugin._build_variables(event, user_info)
                 message = self.plugin._format_template(template, variables)
@@ -53,18 +55,26 @@ class JieqianHandler:
                 yield event.plain_result(message)
                 return
             
-            # 发送开始解签提示
-            begin_template = self.plugin.config.get('jieqian_config', {}).get('begin_template', '命运的丝线汇聚, {card}, 你的困惑即将解开, 正在窥视中...')
-            variables = self.plugin._build_variables(event, user_info)
-            begin_message = self.plugin._format_template(begin_template, variables)
-            yield event.plain_result(begin_message)
-            
-            # 标记用户为处理中
+            # 标记用户为处理中（检查后立即标记，发送提示期间的重复请求不会再次解签）
             processing_users.add(user_id)
             
+            # 进入LLM请求队列
+            ticket = self.llm_manager.enter_queue(event)
+            
             try:
-                # 调用LLM进行解签
-                jieqian_result = await self.llm_manager.process_jieqian(event, user_id, today_lingqian, content)
+                # 发送开始解签提示，需要排队时附带排队位置
+                variables = self.plugin._build_variables(event, user_info, jq_queue=ticket.position)
+                async for result in self._send_begin_message(event, variables, ticket.position):
+                    yield result
+                
+                # 调用LLM进行解签，启用流式输出时边生成边发送
+                outcome = {}
+                async for result in self._call_llm(
+                        event, user_info, today_lingqian, content, outcome,
+                        lambda stream: self.llm_manager.process_jieqian(
+                            event, user_id, today_lingqian, content, ticket, stream, user_info)):
+                    yield result
+                jieqian_result = outcome.get('result')
                 
                 if jieqian_result is None:
                     # 正在处理中
@@ -77,6 +87,10 @@ class JieqianHandler:
                 # 保存解签记录到群组管理器
                 self.group_manager.add_jieqian_record(user_id, content, jieqian_result)
                 
+                if outcome.get('streamed'):
+                    # 结果已流式发送
+                    return
+                
                 # 构建解签结果消息
                 variables = self.plugin._build_variables(event, user_info, today_lingqian)
                 variables.update({
@@ -91,7 +105,8 @@ class JieqianHandler:
                 yield event.plain_result(message)
                 
             finally:
-                # 移除处理标记
+                # 释放LLM请求名额并移除处理标记
+                ticket.release()
                 processing_users.discard(user_id)
             
         except Exception as e:
@@ -107,7 +122,7 @@ class JieqianHandler:
             user_info = await UserInfoManager.get_user_info(event)
             
             # 检查人品前置条件
-            if not self.plugin._check_jrrp_required(user_id):
+            if not await self.plugin._check_jrrp_required(user_id):
                 template = self.plugin.config.get('lingqian_jrrptip_template', '「{card}」今日还未检测人品运势')
                 variables = self.plugin._build_variables(event, user_info)
                 message = self.plugin._format_template(template, variables)
@@ -131,18 +146,26 @@ class JieqianHandler:
                 yield event.plain_result(message)
                 return
             
-            # 发送开始解签提示
-            begin_template = self.plugin.config.get('jieqian_config', {}).get('begin_template', '命运的丝线汇聚, {card}, 你的困惑即将解开, 正在窥视中...')
-            variables = self.plugin._build_variables(event, user_info)
-            begin_message = self.plugin._format_template(begin_template, variables)
-            yield event.plain_result(begin_message)
-            
-            # 标记用户为处理中
+            # 标记用户为处理中（检查后立即标记，发送提示期间的重复请求不会再次解签）
             processing_users.add(user_id)
             
+            # 进入LLM请求队列
+            ticket = self.llm_manager.enter_queue(event)
+            
             try:
-                # 调用LLM进行签文拆解
-                jieqian_result = await self.llm_manager.process_jieqian_self(event, user_id, today_lingqian)
+                # 发送开始解签提示，需要排队时附带排队位置
+                variables = self.plugin._build_variables(event, user_info, jq_queue=ticket.position)
+                async for result in self._send_begin_message(event, variables, ticket.position):
+                    yield result
+                
+                # 调用LLM进行签文拆解，启用流式输出时边生成边发送
+                outcome = {}
+                async for result in self._call_llm(
+                        event, user_info, today_lingqian, '签文拆解', outcome,
+                        lambda stream: self.llm_manager.process_jieqian_self(
+                            event, user_id, today_lingqian, ticket, stream, user_info)):
+                    yield result
+                jieqian_result = outcome.get('result')
                 
                 if jieqian_result is None:
                     # 正在处理中
@@ -155,6 +178,10 @@ class JieqianHandler:
                 # 保存解签记录到群组管理器（使用特殊标记表示是签文拆解）
                 self.group_manager.add_jieqian_record(user_id, "[签文拆解]", jieqian_result)
                 
+                if outcome.get('streamed'):
+                    # 结果已流式发送
+                    return
+                
                 # 构建解签结果消息（使用特殊模板用于签文拆解）
                 variables = self.plugin._build_variables(event, user_info, today_lingqian)
                 variables.update({
@@ -170,7 +197,8 @@ class JieqianHandler:
                 yield event.plain_result(message)
                 
             finally:
-                # 移除处理标记
+                # 释放LLM请求名额并移除处理标记
+                ticket.release()
                 processing_users.discard(user_id)
             
         except Exception as e:
@@ -178,6 +206,65 @@ class JieqianHandler:
             processing_users.discard(user_id)
             yield event.plain_result("签文拆解时发生错误，请稍后重试。")
     
+    async def _send_begin_message(self, event: AstrMessageEvent, variables: dict, queue_position: int):
+        """发送开始解签提示，排队时另外发送排队提示"""
+        jieqian_config = self.plugin.config.get('jieqian_config', {})
+        begin_template = jieqian_config.get('begin_template', '命运的丝线汇聚, {card}, 你的困惑即将解开, 正在窥视中...')
+        yield event.plain_result(self.plugin._format_template(begin_template, variables))
+        
+        if queue_position:
+            queue_template = jieqian_config.get('queue_template', '当前解签的人较多，「{card}」排在第 {jq_queue} 位，请稍候~')
+            if queue_template:
+                yield event.plain_result(self.plugin._format_template(queue_template, variables))
+    
+    async def _call_llm(self, event: AstrMessageEvent, user_info: dict, today_lingqian: dict, content: str,
+                        outcome: dict, call):
+        """
+        调用LLM获取解签结果，结果写入 outcome['result']
+        启用流式输出时，按解签模板中 {jieqian} 前的部分作为开头，边生成边逐段发送，
+        之后发送模板的剩余部分，并设置 outcome['streamed']；命中缓存等未产生片段时不发送任何内容
+        :param call: 接收片段队列（非流式时为None）并返回解签结果的协程函数
+        """
+        jieqian_config = self.plugin.config.get('jieqian_config', {})
+        template = jieqian_config.get('template', 
+            '-----「{card}」解签-----\n第 {qianxu} 签 {qianming}\n吉凶: {jixiong}\n宫位: {gongwei}\n---\n问: {content}\n---\n解:\n{jieqian}')
+        parts = compile_template(template).split('jieqian') if jieqian_config.get('stream_enabled', False) else None
+        if parts is None:
+            outcome['result'] = await call(None)
+            return
+        
+        stream = asyncio.Queue()
+        
+        async def run():
+            try:
+                return await call(stream)
+            finally:
+                stream.put_nowait(None)
+        
+        task = asyncio.create_task(run())
+        try:
+            before, after = parts
+            variables = self.plugin._build_variables(event, user_info, today_lingqian, content=content, jieqian='')
+            while True:
+                chunk = await stream.get()
+                if chunk is None:
+                    break
+                if not outcome.get('streamed'):
+                    # 第一段附带模板开头
+                    outcome['streamed'] = True
+                    header = self.plugin._format_template(before, variables)
+                    chunk = f"{header}\n{chunk}" if header else chunk
+                yield event.plain_result(chunk)
+            
+            outcome['result'] = await task
+            if outcome.get('streamed'):
+                footer = self.plugin._format_template(after, variables)
+                if footer:
+                    yield event.plain_result(footer)
+        finally:
+            if not task.done():
+                task.cancel()
+    
     async def handle_list(self, event: AstrMessageEvent, param: str = ""):
         """处理解签列表查询"""
         try:
@@ -5,7 +5,6 @@
 
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
-from ...core.variable import get_today
 
 class JieqianDeleteHandler:
     """解签删除处理器"""
@@ -44,55 +43,26 @@ class JieqianDeleteHandler:
     async def _delete_specific_jieqian(self, event: AstrMessageEvent, user_id: str, index: int):
         """删除指定序号的今日解签记录"""
         try:
-            # 获取今日解签列表
-            today_jieqian_list = self.plugin.llm_manager.get_user_today_jieqian_list(user_id)
+            # 持有用户锁，避免检查序号后列表被并发修改
+            async with self.plugin.llm_manager.user_locks.hold(user_id):
+                # 获取今日解签列表
+                today_jieqian_list = self.plugin.llm_manager.get_user_today_jieqian_list(user_id)
+                count = len(today_jieqian_list)
+                
+                # 删除指定记录（同时删除历史记录与内容记录中的对应项）
+                if 1 <= index <= count:
+                    deleted_item = self.plugin.llm_manager.delete_user_today_jieqian(user_id, index)
             
-            if not today_jieqian_list:
+            if not count:
                 yield event.plain_result("您今日还没有解签记录。")
                 return
             
             # 检查序号是否有效
-            if index < 1 or index > len(today_jieqian_list):
-                yield event.plain_result(f"❌ 序号无效，今日共有 {len(today_jieqian_list)} 条解签记录，请输入 1-{len(today_jieqian_list)} 之间的序号。")
+            if index < 1 or index > count:
+                yield event.plain_result(f"❌ 序号无效，今日共有 {count} 条解签记录，请输入 1-{count} 之间的序号。")
                 return
             
-            # 直接使用LLMManager的方法加载数据
-            jieqian_data = self.plugin.llm_manager.load_jieqian_history()
-            jieqian_content = self.plugin.llm_manager.load_jieqian_content()
-            
-            today = get_today()
-            deleted_item = None
-            
-            # 删除历史记录中的指定项
-            if user_id in jieqian_data and today in jieqian_data[user_id]:
-                if index <= len(jieqian_data[user_id][today]):
-                    deleted_item = jieqian_data[user_id][today].pop(index - 1)
-                    
-                    # 如果今日记录为空，删除整个日期
-                    if not jieqian_data[user_id][today]:
-                        del jieqian_data[user_id][today]
-                        if not jieqian_data[user_id]:
-                            del jieqian_data[user_id]
-            
-            # 删除内容记录中的对应项
-            if user_id in jieqian_content:
-                # 找到对应的内容记录并删除
-                content_to_remove = None
-                for i, item in enumerate(jieqian_content[user_id]):
-                    if (item.get('date') == today and 
-                        len([x for x in jieqian_content[user_id][:i+1] if x.get('date') == today]) == index):
-                        content_to_remove = i
-                        break
-                
-                if content_to_remove is not None:
-                    jieqian_content[user_id].pop(content_to_remove)
-                    if not jieqian_content[user_id]:
-                        del jieqian_content[user_id]
-            
-            # 保存数据
-            self.plugin.llm_manager.save_jieqian_history(jieqian_data)
-            self.plugin.llm_manager.save_jieqian_content(jieqian_content)
-            success1 = success2 = True
+            success1 = success2 = deleted_item is not None
             
             if success1 and success2:
                 if deleted_item:
@@ -112,35 +82,18 @@ class JieqianDeleteHandler:
         """删除除今日外的历史记录"""
         try:
             # 直接使用LLMManager的方法加载数据
-            jieqian_data = self.plugin.llm_manager.load_jieqian_history()
-            jieqian_content = self.plugin.llm_manager.load_jieqian_content()
+            async with self.plugin.llm_manager.user_locks.hold(user_id):
+                jieqian_data = self.plugin.llm_manager.load_jieqian_history()
+                has_history = user_id in jieqian_data
+                
+                # 保留今日数据，删除其他
+                if has_history:
+                    success1 = success2 = self.plugin.llm_manager.delete_user_jieqian_history_except_today(user_id)
             
-            if user_id not in jieqian_data:
+            if not has_history:
                 yield event.plain_result("您还没有解签历史记录。")
                 return
             
-            # 保留今日数据，删除其他
-            today = get_today()
-            user_history = jieqian_data[user_id]
-            
-            if today in user_history:
-                jieqian_data[user_id] = {today: user_history[today]}
-            else:
-                del jieqian_data[user_id]
-            
-            # 保留今日内容记录
-            if user_id in jieqian_content:
-                today_content = [item for item in jieqian_content[user_id] if item.get('date') == today]
-                if today_content:
-                    jieqian_content[user_id] = today_content
-                else:
-                    del jieqian_content[user_id]
-            
-            # 保存数据
-            self.plugin.llm_manager.save_jieqian_history(jieqian_data)
-            self.plugin.llm_manager.save_jieqian_content(jieqian_content)
-            success1 = success2 = True
-            
             if success1 and success2:
                 yield event.plain_result("✅ 已删除您除今日外的所有解签历史记录。")
                 logger.info(f"用户 {user_id} 删除了除今日外的解签历史记录")
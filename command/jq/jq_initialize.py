@@ -7,7 +7,6 @@ from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 from ...core.core_lq_userinfo import UserInfoManager
 from ...permission.permission import PermissionManager
-from ...core.variable import get_today
 
 class JieqianInitializeHandler:
     """解签初始化处理器"""
@@ -38,25 +37,10 @@ class JieqianInitializeHandler:
                 target_user_id = event.get_sender_id()
                 target_name = "您"
             
-            # 直接使用LLMManager的方法加载数据
-            jieqian_data = self.plugin.llm_manager.load_jieqian_history()
-            jieqian_content = self.plugin.llm_manager.load_jieqian_content()
-            
-            today = get_today()
-            
-            # 清除今日记录
-            if target_user_id in jieqian_data and today in jieqian_data[target_user_id]:
-                del jieqian_data[target_user_id][today]
-                if not jieqian_data[target_user_id]:
-                    del jieqian_data[target_user_id]
-            
-            if target_user_id in jieqian_content:
-                del jieqian_content[target_user_id]
-            
-            # 保存数据
-            self.plugin.llm_manager.save_jieqian_history(jieqian_data)
-            self.plugin.llm_manager.save_jieqian_content(jieqian_content)
-            success1 = success2 = True
+            # 清除今日记录，解签内容与以往一样全部清除
+            async with self.plugin.llm_manager.user_locks.hold(target_user_id):
+                success1 = success2 = self.plugin.llm_manager.initialize_user_jieqian_today(
+                    target_user_id, all_content=True)
             
             if success1 and success2:
                 yield event.plain_result(f"✅ 已初始化{target_name}的今日解签记录。")
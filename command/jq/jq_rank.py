@@ -23,36 +23,16 @@ class JieqianRankHandler:
                 yield event.plain_result("❌ 排行榜功能仅在群聊中可用。")
                 return
             
-            # 获取群内成员的解签数据
-            group_members = self.group_manager.get_group_members(event)
-            if not group_members:
-                yield event.plain_result("❌ 无法获取群成员信息。")
-                return
-            
-            # 加载解签历史数据
-            jieqian_data = self.group_manager.load_jieqian_history()
-            today = get_date()
-            
-            # 收集今日有解签记录的群成员
-            rank_data = []
-            for member in group_members:
-                user_id = str(member.get('user_id', ''))
-                if user_id in jieqian_data and today in jieqian_data[user_id]:
-                    count = len(jieqian_data[user_id][today])
-                    if count > 0:
-                        rank_data.append({
-                            'user_id': user_id,
-                            'card': member.get('card', user_id),
-                            'count': count
-                        })
+            # 读取群内今日的解签排行榜（已按解签数量降序排列，只取前10名）
+            llm_manager = self.plugin.llm_manager
+            rank_data = await self.group_manager.filter_group_jieqian_ranking_data(
+                event, llm_manager.load_jieqian_history(), llm_manager.get_today_solvers(),
+                llm_manager.leaderboards, limit=10)
             
             if not rank_data:
                 yield event.plain_result("📊 今日群内还没有人解签哦～")
                 return
             
-            # 按解签数量排序
-            rank_data.sort(key=lambda x: x['count'], reverse=True)
-            
             # 构建排行内容
             rank_content_template = self.plugin.config.get('jieqian_config', {}).get('ranks_content',
                 '{card} 今日解签{jieqian_count}\n---')
@@ -61,7 +41,7 @@ class JieqianRankHandler:
             for i, item in enumerate(rank_data[:10], 1):  # 只显示前10名
                 variables = {
                     'card': item['card'],
-                    'jieqian_count': item['count']
+                    'jieqian_count': item['jieqian_count']
                 }
                 content = f"{i}. " + self.plugin._format_template(rank_content_template, variables)
                 rank_content_list.append(content)
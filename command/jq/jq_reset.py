@@ -26,14 +26,10 @@ class JieqianResetHandler:
                 yield event.plain_result("⚠️ 重置所有数据需要确认参数，请使用: jq reset --confirm")
                 return
             
-            # 重置解签数据
-            from ...core.core_lq_group import GroupManager
-            group_manager = GroupManager()
+            # 重置解签数据（同时清空内存中的数据）
+            success = self.plugin.llm_manager.reset_all_jieqian_data()
             
-            success1 = group_manager.reset_jieqian_history()
-            success2 = group_manager.reset_jieqian_content()
-            
-            if success1 and success2:
+            if success:
                 yield event.plain_result("✅ 已重置所有解签数据。")
                 logger.info(f"管理员 {event.get_sender_id()} 重置了所有解签数据")
             else:
@@ -8,6 +8,7 @@ from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 from ...core.core_lq import DailyLingqianManager
 from ...core.core_lq_userinfo import UserInfoManager
+from ...core.core_lq_template import compile_template
 
 class LingqianHandler:
     """灵签处理器"""
@@ -31,37 +32,44 @@ class LingqianHandler:
                 return
             
             # 检查人品前置条件
-            if not self.plugin._check_jrrp_required(target_user_id):
+            if not await self.plugin._check_jrrp_required(target_user_id):
                 template = self.plugin.config.get('lingqian_jrrptip_template', '「{card}」今日还未检测人品运势')
                 variables = self.plugin._build_variables(event, user_info)
                 message = self.plugin._format_template(template, variables)
                 yield event.plain_result(message)
                 return
             
-            # 检查是否已抽取
-            today_lingqian = self.lingqian_manager.get_today_lingqian(target_user_id)
+            # 检查是否已抽取，未抽取则抽取（同一用户的检查与抽取串行执行，重复请求只会抽取一次）
+            drawn_lingqian = None
+            async with self.lingqian_manager.user_locks.hold(target_user_id):
+                today_lingqian = self.lingqian_manager.get_today_lingqian(target_user_id)
+                if not today_lingqian:
+                    drawn_lingqian = await self._draw(target_user_id)
+            
             if today_lingqian:
                 # 已抽取，显示查询结果
                 async for result in self._query_lingqian(event, target_user_id, user_info, today_lingqian):
                     yield result
             else:
-                # 未抽取，进行抽取
-                async for result in self._draw_lingqian(event, target_user_id, user_info):
+                # 发送抽取结果
+                async for result in self._draw_lingqian(event, user_info, drawn_lingqian):
                     yield result
                     
         except Exception as e:
             logger.error(f"处理灵签指令失败: {e}")
             yield event.plain_result("处理灵签时发生错误，请稍后重试。")
     
-    async def _draw_lingqian(self, event: AstrMessageEvent, user_id: str, user_info: dict):
-        """抽取灵签"""
+    async def _draw(self, user_id: str) -> dict:
+        """抽取灵签（调用方需持有该用户的锁）"""
+        # 获取人品调整参数
+        fortune_adjustment = await self.plugin._get_fortune_adjustment(user_id)
+        
+        # 抽取灵签
+        return self.lingqian_manager.draw_lingqian(user_id, fortune_adjustment)
+    
+    async def _draw_lingqian(self, event: AstrMessageEvent, user_info: dict, lingqian_data: dict):
+        """发送抽取的灵签"""
         try:
-            # 获取人品调整参数
-            fortune_adjustment = self.plugin._get_fortune_adjustment(user_id)
-            
-            # 抽取灵签
-            lingqian_data = self.lingqian_manager.draw_lingqian(user_id, fortune_adjustment)
-            
             # 构建变量
             variables = self.plugin._build_variables(event, user_info, lingqian_data)
             
@@ -115,15 +123,14 @@ class LingqianHandler:
             template_key = 'draw_template' if message_type == 'draw' else 'query_template'
             template = self.plugin.config.get('lingqian_config', {}).get(template_key, '-----「{card}」今日灵签-----\n{lqpic}')
             
-            # 处理模板中的文字部分
-            if '{lqpic}' in template:
-                # 分割模板，获取图片前后的文字
-                parts = template.split('{lqpic}')
-                text_before = parts[0].strip()
-                text_after = parts[1].strip() if len(parts) > 1 else ""
+            # 处理模板中的文字部分（按{lqpic}拆分的结果随模板编译缓存）
+            lqpic_split = compile_template(template).split('lqpic')
+            if lqpic_split:
+                # 图片前后的文字
+                text_before, text_after = lqpic_split
                 
                 # 添加图片前的文字
-                if text_before:
+                if text_before.text:
                     formatted_text = self.plugin._format_template(text_before, variables)
                     message_content.append(Plain(formatted_text))
                 
@@ -141,7 +148,7 @@ class LingqianHandler:
                         message_content.append(Plain(f"[图片不存在: {pics_version}/{lingqian_data['qianxu']}.png]"))
                 
                 # 添加图片后的文字
-                if text_after:
+                if text_after.text:
                     formatted_text = self.plugin._format_template(text_after, variables)
                     message_content.append(Plain(formatted_text))
             else:
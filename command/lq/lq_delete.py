@@ -23,7 +23,8 @@ class LingqianDeleteHandler:
             user_id = event.get_sender_id()
             
             # 执行删除操作
-            success = self.lingqian_manager.delete_user_history_except_today(user_id)
+            async with self.lingqian_manager.user_locks.hold(user_id):
+                success = self.lingqian_manager.delete_user_history_except_today(user_id)
             
             if success:
                 yield event.plain_result("✅ 已删除您除今日外的所有灵签历史记录。")
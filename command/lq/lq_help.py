@@ -100,6 +100,10 @@ class LingqianHelpHandler:
     - lingqian re --confirm
     - lingqianreset --confirm
     - lingqianre --confirm
+• 将JSON数据导入SQLite（需 storage_mode 为 sqlite）
+    - lq migrate --confirm
+    - lqmigrate --confirm
+    - lingqianmigrate --confirm
 
 💡 提示：带 --confirm 的指令需要确认参数才能执行
 """
@@ -39,7 +39,8 @@ class LingqianInitializeHandler:
                 target_name = "您"
             
             # 执行初始化操作
-            success = self.lingqian_manager.initialize_user_today(target_user_id)
+            async with self.lingqian_manager.user_locks.hold(target_user_id):
+                success = self.lingqian_manager.initialize_user_today(target_user_id)
             
             if success:
                 yield event.plain_result(f"✅ 已初始化{target_name}的今日灵签记录。")
@@ -0,0 +1,50 @@
+"""
+灵签数据迁移指令处理模块
+将JSON数据文件导入SQLite存储
+"""
+
+from astrbot.api.event import AstrMessageEvent
+from astrbot.api import logger
+from ...permission.permission import PermissionManager
+from ...core.variable import STORAGE_MODE
+
+class LingqianMigrateHandler:
+    """数据迁移处理器"""
+    
+    def __init__(self, plugin_instance):
+        self.plugin = plugin_instance
+        self.lingqian_manager = plugin_instance.lingqian_manager
+        self.llm_manager = plugin_instance.llm_manager
+        self.permission_manager = PermissionManager()
+    
+    async def handle_migrate(self, event: AstrMessageEvent, confirm: bool = False):
+        """处理JSON数据导入SQLite"""
+        try:
+            # 检查管理员权限
+            if not self.permission_manager.is_admin(event):
+                yield event.plain_result("❌ 数据迁移需要管理员权限。")
+                return
+            
+            if self.plugin.config.get('storage_mode', STORAGE_MODE['SNAPSHOT']) != STORAGE_MODE['SQLITE']:
+                yield event.plain_result("⚠️ 请先将存储模式 storage_mode 设置为 sqlite 并重载插件后再执行迁移。")
+                return
+            
+            if not confirm:
+                yield event.plain_result("⚠️ 数据迁移需要确认参数，请使用: lq migrate --confirm")
+                return
+            
+            # 导入灵签历史、解签历史与解签内容，已存在的记录不会被覆盖
+            lingqian_count = await self.lingqian_manager.migrate_from_json()
+            history_count, content_count = await self.llm_manager.migrate_from_json()
+            
+            yield event.plain_result(
+                f"✅ 数据迁移完成\n"
+                f"灵签记录: {lingqian_count}\n"
+                f"解签历史: {history_count}\n"
+                f"解签内容: {content_count}"
+            )
+            logger.info(f"管理员 {event.get_sender_id()} 将JSON数据迁移到了SQLite")
+            
+        except Exception as e:
+            logger.error(f"处理数据迁移指令失败: {e}")
+            yield event.plain_result("数据迁移时发生错误，请稍后重试。")
@@ -26,7 +26,9 @@ class LingqianRankHandler:
             sort_data = self.lingqian_manager._load_sort_data()
             
             # 筛选群内排行数据
-            ranking_data = GroupManager.filter_group_ranking_data(event, history_data, sort_data)
+            ranking_data = await GroupManager.filter_group_ranking_data(
+                event, history_data, sort_data, self.lingqian_manager.get_today_drawers(),
+                self.lingqian_manager.leaderboards)
             
             if not ranking_data:
                 yield event.plain_result("今日群内还没有人抽取灵签")
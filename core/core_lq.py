@@ -3,23 +3,42 @@
 处理灵签的抽取、查询、历史记录等核心功能
 """
 
-import json
 import os
 import random
-import hashlib
 from datetime import datetime
 from astrbot.api import logger
 from .variable import (
     PLUGIN_DATA_PATH, LINGQIAN_HISTORY_FILE, NUMBER_TO_CHINESE, 
-    LINGQIAN_TOTAL_COUNT, get_date, get_today, get_time
+    LINGQIAN_TOTAL_COUNT, STORAGE_MODE, get_date, get_today
 )
+from .core_lq_store import HistoryStore
+from .core_lq_io import run_io
+from .core_lq_corpus import get_corpus
+from .core_lq_draw import DrawTables, DrawEngine
+from .core_lq_lock import KeyedLock
+from .core_lq_leaderboard import LeaderboardCache
 
 class DailyLingqianManager:
     """每日灵签管理器"""
     
-    def __init__(self):
+    def __init__(self, config=None):
+        self.config = config or {}
         self.ensure_data_directory()
         self.lingqian_history_path = os.path.join(PLUGIN_DATA_PATH, LINGQIAN_HISTORY_FILE)
+        
+        # 常驻内存的灵签历史，启动时加载一次，由后台任务写回
+        self.history_store = HistoryStore.from_config(self.lingqian_history_path, "灵签历史数据", self.config)
+        
+        # 按人品范围预计算的抽签分布表，配置变化时重建
+        self._draw_tables = None
+        self.draw_engine = DrawEngine.from_config(self.config)
+        
+        # 用户锁：同一用户的抽签、初始化、删除串行执行
+        self.user_locks = KeyedLock()
+        
+        # 各群今日的灵签排行榜，按签序的排序优先级排列，随抽签与删除增量更新
+        self.leaderboards = LeaderboardCache(lambda qianxu: get_corpus().rank(qianxu))
+        self.history_store.day_index.subscribe(self.leaderboards)
     
     def ensure_data_directory(self):
         """确保数据目录存在"""
@@ -27,34 +46,58 @@ class DailyLingqianManager:
             os.makedirs(PLUGIN_DATA_PATH, exist_ok=True)
     
     def load_lingqian_history(self) -> dict:
-        """加载灵签历史数据"""
-        try:
-            if os.path.exists(self.lingqian_history_path):
-                with open(self.lingqian_history_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            logger.error(f"加载灵签历史数据失败: {e}")
-            return {}
+        """获取灵签历史数据（返回内存中的数据，修改后需调用 save_lingqian_history）"""
+        return self.history_store.data
+    
+    def get_today_drawers(self) -> dict:
+        """获取今日抽签的用户（用户ID -> 签序），只读"""
+        return self.history_store.day_index.day(get_today())
     
     def save_lingqian_history(self, history_data: dict):
-        """保存灵签历史数据"""
+        """保存灵签历史数据（由后台任务合并写回磁盘）"""
         try:
-            with open(self.lingqian_history_path, 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, ensure_ascii=False, indent=2)
+            self.history_store.replace(history_data)
         except Exception as e:
             logger.error(f"保存灵签历史数据失败: {e}")
     
-    def generate_random_seed(self, user_id: str) -> str:
-        """生成随机种子"""
-        try:
-            today = get_today()
-            time_str = get_time()
-            seed_string = f"{user_id}{today}{time_str}"
-            return hashlib.md5(seed_string.encode()).hexdigest()
-        except Exception as e:
-            logger.error(f"生成随机种子失败: {e}")
-            return f"{user_id}{get_today()}"
+    async def migrate_from_json(self) -> int:
+        """
+        将JSON数据文件中的灵签历史导入当前存储（用于迁移到SQLite）
+        读取JSON与写入SQLite都在I/O线程池中执行，事件循环中只合并内存数据
+        :return: 导入的记录数
+        """
+        if self.history_store.backend is None:
+            return 0
+        
+        legacy_data = await run_io(self._load_legacy_history)
+        imported = self.history_store.import_data(legacy_data)
+        await self.history_store.flush_async()
+        logger.info(f"已从JSON导入 {imported} 条灵签记录")
+        return imported
+    
+    def _load_legacy_history(self) -> dict:
+        """读取JSON数据文件中的灵签历史，旧版仅保存签序整数的记录重新构建为完整格式（在I/O线程池中执行）"""
+        legacy_store = HistoryStore(self.lingqian_history_path, "灵签历史数据(JSON)",
+                                    flush_interval=0, mode=STORAGE_MODE['SNAPSHOT'])
+        legacy_data = {}
+        for user_id, user_history in legacy_store.data.items():
+            if not isinstance(user_history, dict):
+                continue
+            legacy_data[user_id] = {}
+            for date, data in user_history.items():
+                if not isinstance(data, dict):
+                    # 兼容旧格式
+                    data = self._build_lingqian_result(int(data))
+                legacy_data[user_id][date] = data
+        return legacy_data
+    
+    def start_background_flush(self):
+        """启动历史数据的后台写回任务"""
+        self.history_store.start()
+    
+    async def close(self):
+        """停止后台写回并保存剩余修改"""
+        await self.history_store.close()
     
     def draw_lingqian(self, user_id: str, fortune_adjustment: dict = None) -> dict:
         """
@@ -78,22 +121,14 @@ class DailyLingqianManager:
                     qianxu = int(today_data)
                     return self._build_lingqian_result(qianxu)
             
-            # 生成随机数
-            seed = self.generate_random_seed(user_id)
-            random.seed(seed)
-            
-            # 根据人品调整概率（如果启用）
-            qianxu = self._draw_with_fortune_adjustment(fortune_adjustment)
+            # 根据人品调整概率（如果启用），使用独立的生成器抽取
+            qianxu = self._draw_with_fortune_adjustment(fortune_adjustment, user_id, today)
             
             # 获取灵签详细信息
             result = self._build_lingqian_result(qianxu)
             
             # 保存到历史记录
-            if user_id not in history_data:
-                history_data[user_id] = {}
-            history_data[user_id][today] = result
-            
-            self.save_lingqian_history(history_data)
+            self.history_store.set([user_id, today], result)
             
             return result
             
@@ -102,135 +137,31 @@ class DailyLingqianManager:
             # 返回默认结果
             return self._build_lingqian_result(1)
     
-    def _draw_with_fortune_adjustment(self, fortune_adjustment: dict = None) -> int:
+    def get_draw_tables(self, ranges_jrrp: str, shang_rate: str, zhong_rate: str) -> DrawTables:
+        """获取按人品范围预计算的抽签分布表，配置变化时重建"""
+        source = (ranges_jrrp, shang_rate, zhong_rate)
+        if self._draw_tables is None or self._draw_tables.source != source:
+            self._draw_tables = DrawTables(ranges_jrrp, shang_rate, zhong_rate)
+            self._draw_tables.log_summary()
+        return self._draw_tables
+    
+    def _draw_with_fortune_adjustment(self, fortune_adjustment: dict = None, user_id: str = "", today: str = None) -> int:
         """根据人品值调整概率抽取签序"""
         try:
-            if not fortune_adjustment:
-                # 无调整，纯随机
-                return random.randint(1, LINGQIAN_TOTAL_COUNT)
-            
-            # 读取排序数据
-            sort_data = self._load_sort_data()
-            if not sort_data:
-                return random.randint(1, LINGQIAN_TOTAL_COUNT)
-            
-            # 分类签序
-            shang_qian = [item['签序'] for item in sort_data if item['吉凶'] == '上签']
-            zhong_qian = [item['签序'] for item in sort_data if item['吉凶'] == '中签']
-            xia_qian = [item['签序'] for item in sort_data if item['吉凶'] == '下签']
-            
-            # 获取调整参数
-            shang_adjustment = fortune_adjustment.get('shang_rate', 0)
-            zhong_adjustment = fortune_adjustment.get('zhong_rate', 0)
-            
-            # 计算基础概率
-            base_shang_prob = len(shang_qian) / LINGQIAN_TOTAL_COUNT
-            base_zhong_prob = len(zhong_qian) / LINGQIAN_TOTAL_COUNT
-            base_xia_prob = len(xia_qian) / LINGQIAN_TOTAL_COUNT
-            
-            # 应用调整
-            adjusted_shang_prob = max(0, min(1, base_shang_prob + shang_adjustment / 100))
-            adjusted_zhong_prob = max(0, min(1, base_zhong_prob + zhong_adjustment / 100))
-            adjusted_xia_prob = max(0, 1 - adjusted_shang_prob - adjusted_zhong_prob)
-            
-            # 归一化概率
-            total_prob = adjusted_shang_prob + adjusted_zhong_prob + adjusted_xia_prob
-            if total_prob > 0:
-                adjusted_shang_prob /= total_prob
-                adjusted_zhong_prob /= total_prob
-                adjusted_xia_prob /= total_prob
-            
-            # 根据概率抽取
-            rand_val = random.random()
-            if rand_val < adjusted_shang_prob:
-                return random.choice(shang_qian)
-            elif rand_val < adjusted_shang_prob + adjusted_zhong_prob:
-                return random.choice(zhong_qian)
-            else:
-                return random.choice(xia_qian)
-                
+            return self.draw_engine.draw(user_id, today or get_today(), fortune_adjustment)
         except Exception as e:
             logger.error(f"按人品调整抽签失败: {e}")
             return random.randint(1, LINGQIAN_TOTAL_COUNT)
     
-    def _load_sort_data(self) -> list:
-        """加载排序数据"""
-        try:
-            sort_path = os.path.join(os.path.dirname(__file__), '..', 'sort', 'sort.json')
-            if os.path.exists(sort_path):
-                with open(sort_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return []
-        except Exception as e:
-            logger.error(f"加载排序数据失败: {e}")
-            return []
+    def _load_sort_data(self) -> tuple:
+        """获取排序数据（共享的只读副本）"""
+        return get_corpus().sort_data
     
     def _build_lingqian_result(self, qianxu: int) -> dict:
         """构建灵签结果"""
-        try:
-            # 获取灵签详细信息
-            lingqian_data = self._load_lingqian_data(qianxu)
-            
-            # 获取吉凶信息
-            sort_data = self._load_sort_data()
-            jixiong = "未知"
-            for item in sort_data:
-                if item.get('签序') == qianxu:
-                    jixiong = item.get('吉凶', '未知')
-                    break
-            
-            # 解析签名和宫位
-            qianming = "未知"
-            gongwei = "未知"
-            
-            if lingqian_data and '内容' in lingqian_data:
-                content = lingqian_data['内容']
-                lines = content.split('\n')
-                
-                # 提取签名（从第一行解析，格式如：观音灵签 第一签: 钟离成道）
-                for line in lines:
-                    line = line.strip()
-                    if '第' in line and '签:' in line:
-                        # 格式：观音灵签 第一签: 钟离成道
-                        if ':' in line:
-                            qianming = line.split(':', 1)[1].strip()
-                            break
-                        elif '：' in line:
-                            qianming = line.split('：', 1)[1].strip()
-                            break
-                
-                # 如果还是未知，尝试其他解析方法
-                if qianming == "未知":
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith('观音灵签') and ':' in line:
-                            qianming = line.split(':', 1)[1].strip()
-                            break
-                        elif line.startswith('观音灵签') and '：' in line:
-                            qianming = line.split('：', 1)[1].strip()
-                            break
-                
-                # 提取宫位信息
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('宫位'):
-                        if '：' in line:
-                            gongwei = line.split('：', 1)[1].strip()
-                        elif ':' in line:
-                            gongwei = line.split(':', 1)[1].strip()
-                        break
-            
-            return {
-                'qianxu': qianxu,
-                'qianxu_chinese': NUMBER_TO_CHINESE.get(qianxu, str(qianxu)),
-                'qianming': qianming,
-                'jixiong': jixiong,
-                'gongwei': gongwei,
-                'lingqian_data': lingqian_data
-            }
-            
-        except Exception as e:
-            logger.error(f"构建灵签结果失败: {e}")
+        slip = get_corpus().get(qianxu)
+        if slip is None:
+            logger.error(f"构建灵签结果失败: 签序 {qianxu} 不存在")
             return {
                 'qianxu': qianxu,
                 'qianxu_chinese': NUMBER_TO_CHINESE.get(qianxu, str(qianxu)),
@@ -239,18 +170,20 @@ class DailyLingqianManager:
                 'gongwei': "未知",
                 'lingqian_data': None
             }
+        
+        return {
+            'qianxu': qianxu,
+            'qianxu_chinese': slip.qianxu_chinese,
+            'qianming': slip.qianming,
+            'jixiong': slip.jixiong,
+            'gongwei': slip.gongwei,
+            'lingqian_data': slip.raw_dict()
+        }
     
     def _load_lingqian_data(self, qianxu: int) -> dict:
-        """加载指定签序的灵签数据"""
-        try:
-            lingqian_path = os.path.join(os.path.dirname(__file__), '..', 'guanyin_lingqian', f'{qianxu}.json')
-            if os.path.exists(lingqian_path):
-                with open(lingqian_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return None
-        except Exception as e:
-            logger.error(f"加载灵签数据失败 (签序: {qianxu}): {e}")
-            return None
+        """获取指定签序的灵签数据"""
+        slip = get_corpus().get(qianxu)
+        return slip.raw_dict() if slip else None
     
     def get_today_lingqian(self, user_id: str) -> dict:
         """获取用户今日的灵签"""
@@ -267,8 +200,7 @@ class DailyLingqianManager:
                     qianxu = int(today_data)
                     result = self._build_lingqian_result(qianxu)
                     # 更新存储格式
-                    history_data[user_id][today] = result
-                    self.save_lingqian_history(history_data)
+                    self.history_store.set([user_id, today], result)
                     return result
             
             return None
@@ -324,7 +256,7 @@ class DailyLingqianManager:
                 }
             
             user_history = history_data[user_id]
-            sort_data = self._load_sort_data()
+            corpus = get_corpus()
             
             total = len(user_history)
             shang_total = 0
@@ -337,17 +269,13 @@ class DailyLingqianManager:
                 else:
                     qianxu = int(data)
                 
-                # 查找对应的吉凶
-                for item in sort_data:
-                    if item.get('签序') == qianxu:
-                        jixiong = item.get('吉凶', '')
-                        if jixiong == '上签':
-                            shang_total += 1
-                        elif jixiong == '中签':
-                            zhong_total += 1
-                        elif jixiong == '下签':
-                            xia_total += 1
-                        break
+                jixiong = corpus.jixiong(qianxu, '')
+                if jixiong == '上签':
+                    shang_total += 1
+                elif jixiong == '中签':
+                    zhong_total += 1
+                elif jixiong == '下签':
+                    xia_total += 1
             
             return {
                 'total': total,
@@ -378,11 +306,10 @@ class DailyLingqianManager:
             
             # 保留今日数据
             if today in user_history:
-                history_data[user_id] = {today: user_history[today]}
+                self.history_store.set([user_id], {today: user_history[today]})
             else:
-                del history_data[user_id]
+                self.history_store.delete([user_id])
             
-            self.save_lingqian_history(history_data)
             return True
             
         except Exception as e:
@@ -396,13 +323,8 @@ class DailyLingqianManager:
             today = get_today()
             
             if user_id in history_data and today in history_data[user_id]:
-                del history_data[user_id][today]
-                
-                # 如果用户没有其他记录，删除用户条目
-                if not history_data[user_id]:
-                    del history_data[user_id]
-                
-                self.save_lingqian_history(history_data)
+                # 如果用户没有其他记录，会一并删除用户条目
+                self.history_store.delete([user_id, today])
             
             return True
             
@@ -413,9 +335,7 @@ class DailyLingqianManager:
     def reset_all_data(self) -> bool:
         """重置所有数据"""
         try:
-            if os.path.exists(self.lingqian_history_path):
-                os.remove(self.lingqian_history_path)
-            return True
+            return self.history_store.clear()
         except Exception as e:
             logger.error(f"重置所有数据失败: {e}")
             return False
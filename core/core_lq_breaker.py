@@ -0,0 +1,146 @@
+"""
+熔断模块
+根据真实请求的结果（超时、错误、响应耗时的指数加权平均）被动判断LLM供应商是否可用，不发送探测请求
+- closed：正常使用
+- open：连续失败或持续过慢后熔断，冷却期内不再使用，由备用供应商接替
+- half_open：冷却期结束后放行一个真实请求试探，成功则恢复，失败则继续熔断
+"""
+
+import time
+from astrbot.api import logger
+from .variable import DEFAULT_BREAKER_FAILURES, DEFAULT_BREAKER_COOLDOWN, DEFAULT_BREAKER_SLOW_SECONDS
+
+BREAKER_STATE = {
+    'CLOSED': 'closed',
+    'OPEN': 'open',
+    'HALF_OPEN': 'half_open'
+}
+
+# 响应耗时指数加权平均的平滑系数
+LATENCY_EWMA_ALPHA = 0.3
+
+
+def provider_key(provider) -> str:
+    """供应商标识，优先使用供应商ID"""
+    try:
+        return str(provider.meta().id)
+    except Exception:
+        return f"{type(provider).__name__}@{id(provider):x}"
+
+
+class ProviderHealth:
+    """单个供应商的健康状态"""
+
+    __slots__ = ('state', 'failures', 'latency', 'opened_at', 'probe_at')
+
+    def __init__(self):
+        self.state = BREAKER_STATE['CLOSED']
+        self.failures = 0      # 连续失败次数
+        self.latency = None    # 响应耗时的指数加权平均（秒）
+        self.opened_at = 0.0
+        self.probe_at = 0.0    # 半开状态下试探请求的开始时间
+
+
+class CircuitBreaker:
+    """被动熔断器（按供应商记录状态）"""
+
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_FAILURES,
+                 cooldown: float = DEFAULT_BREAKER_COOLDOWN, slow_seconds: float = DEFAULT_BREAKER_SLOW_SECONDS):
+        """
+        :param failure_threshold: 连续失败多少次后熔断
+        :param cooldown: 熔断后的冷却时间（秒）
+        :param slow_seconds: 响应耗时平均值超过该值时熔断，0为不按耗时熔断
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = max(0.0, float(cooldown))
+        self.slow_seconds = max(0.0, float(slow_seconds))
+        self._health = {}  # 供应商标识 -> ProviderHealth
+
+    @classmethod
+    def from_config(cls, config) -> "CircuitBreaker":
+        jieqian_config = (config or {}).get('jieqian_config', {})
+        return cls(
+            failure_threshold=jieqian_config.get('breaker_failure_threshold', DEFAULT_BREAKER_FAILURES),
+            cooldown=jieqian_config.get('breaker_cooldown', DEFAULT_BREAKER_COOLDOWN),
+            slow_seconds=jieqian_config.get('breaker_slow_seconds', DEFAULT_BREAKER_SLOW_SECONDS),
+        )
+
+    def health(self, key: str) -> ProviderHealth:
+        health = self._health.get(key)
+        if health is None:
+            health = self._health[key] = ProviderHealth()
+        return health
+
+    def state(self, key: str) -> str:
+        health = self._health.get(key)
+        return health.state if health else BREAKER_STATE['CLOSED']
+
+    def allow(self, key: str) -> bool:
+        """判断是否可以向该供应商发送请求（半开状态下只放行一个试探请求）"""
+        health = self._health.get(key)
+        if health is None or health.state == BREAKER_STATE['CLOSED']:
+            return True
+
+        now = time.monotonic()
+        if health.state == BREAKER_STATE['OPEN']:
+            if now - health.opened_at < self.cooldown:
+                return False
+            health.state = BREAKER_STATE['HALF_OPEN']
+            logger.info(f"[熔断] 供应商 {key} 冷却结束，放行试探请求")
+        elif now - health.probe_at < self.cooldown:
+            # 试探请求进行中；超过冷却时间仍无结果时视为丢失，重新放行
+            return False
+        health.probe_at = now
+        return True
+
+    def available(self, key: str) -> bool:
+        """判断供应商当前是否可以使用（与 allow 相同的判断，但不占用半开状态的试探名额）"""
+        health = self._health.get(key)
+        if health is None or health.state == BREAKER_STATE['CLOSED']:
+            return True
+        now = time.monotonic()
+        if health.state == BREAKER_STATE['OPEN']:
+            return now - health.opened_at >= self.cooldown
+        return now - health.probe_at >= self.cooldown
+
+    def record_success(self, key: str, latency: float):
+        """记录一次成功的请求"""
+        health = self.health(key)
+        if health.latency is None or health.state == BREAKER_STATE['HALF_OPEN']:
+            # 试探请求的耗时代表恢复后的状态，不与熔断前的平均值混合
+            health.latency = latency
+        else:
+            health.latency = LATENCY_EWMA_ALPHA * latency + (1 - LATENCY_EWMA_ALPHA) * health.latency
+        if self.slow_seconds and health.latency > self.slow_seconds:
+            self._open(health, key, f"平均响应耗时 {health.latency:.1f}s 超过 {self.slow_seconds:.0f}s")
+            return
+        if health.state != BREAKER_STATE['CLOSED']:
+            logger.info(f"[熔断] 供应商 {key} 已恢复")
+        health.state = BREAKER_STATE['CLOSED']
+        health.failures = 0
+
+    def record_failure(self, key: str, reason: str = ""):
+        """记录一次失败的请求（超时、错误或空响应）"""
+        health = self.health(key)
+        health.failures += 1
+        if health.state == BREAKER_STATE['HALF_OPEN'] or health.failures >= self.failure_threshold:
+            self._open(health, key, f"{reason or '请求失败'}（连续失败 {health.failures} 次）")
+
+    def _open(self, health: ProviderHealth, key: str, reason: str):
+        health.state = BREAKER_STATE['OPEN']
+        health.opened_at = time.monotonic()
+        logger.warning(f"[熔断] 供应商 {key} 已熔断 {self.cooldown:.0f}s: {reason}")
+
+    def peek(self, *providers):
+        """预判 pick 会选择的供应商，不改变熔断状态"""
+        for provider in providers:
+            if provider is not None and self.available(provider_key(provider)):
+                return provider
+        return None
+
+    def pick(self, *providers):
+        """按顺序选择第一个未熔断的供应商，全部熔断时返回None"""
+        for provider in providers:
+            if provider is not None and self.allow(provider_key(provider)):
+                return provider
+        return None
@@ -0,0 +1,163 @@
+"""
+LLM回复缓存模块
+按规范化后的提示词内容寻址缓存LLM回复，支持过期时间与容量上限（LRU淘汰）
+修改只标记待写回，由后台任务定期或关闭时持久化到磁盘，序列化与写入都在I/O线程池中执行
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from astrbot.api import logger
+from .core_lq_io import file_lock, run_io, write_file_atomic
+from .variable import DEFAULT_FLUSH_INTERVAL
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化提示词：去除每行首尾空白与空行，避免排版差异导致缓存不命中"""
+    return "\n".join(line.strip() for line in (prompt or "").splitlines() if line.strip())
+
+
+class ResponseCache:
+    """内容寻址的LLM回复缓存"""
+
+    def __init__(self, path: str, ttl: float, max_size: int, name: str = "",
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        """
+        :param path: 持久化文件路径
+        :param ttl: 缓存有效期（秒），小于等于0时不过期
+        :param max_size: 最大缓存条数，超出时淘汰最久未使用的条目
+        :param flush_interval: 写回间隔（秒），小于等于0时按默认间隔写回
+        """
+        self.path = path
+        self.ttl = float(ttl)
+        self.max_size = max(1, int(max_size))
+        self.name = name or os.path.basename(path)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 键 -> [回复, 写入时间]，按最近使用排序
+        self.flush_interval = flush_interval if flush_interval > 0 else DEFAULT_FLUSH_INTERVAL
+        self._dirty = False
+        self._flush_task = None
+        self._load()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """由提示词及影响回复的其他因素（如供应商）生成缓存键"""
+        digest = hashlib.blake2b(digest_size=20)
+        for part in parts:
+            digest.update(normalize_prompt(str(part)).encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def _load(self):
+        """从磁盘加载缓存，丢弃已过期的条目"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            for key, (value, stored_at) in (data.get('entries') or {}).items():
+                if not self._expired(stored_at, now):
+                    self._entries[key] = [value, stored_at]
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            logger.debug(f"[ResponseCache] 已加载{self.name} {len(self._entries)} 条")
+        except Exception as e:
+            logger.error(f"[ResponseCache] 加载{self.name}失败: {e}")
+
+    @staticmethod
+    def _serialize(entries: dict) -> bytes:
+        return json.dumps({'entries': entries}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _write(self, entries: dict):
+        """在I/O线程中序列化并写入磁盘"""
+        write_file_atomic(self.path, self._serialize(entries))
+
+    def get(self, key: str):
+        """获取缓存的回复，不存在或已过期时返回None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self._expired(entry[1], time.time()):
+            del self._entries[key]
+            self._dirty = True
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, value: str):
+        """写入缓存并标记待写回"""
+        self._entries[key] = [value, time.time()]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._dirty = True
+        self.start()
+
+    def start(self):
+        """启动后台写回任务，没有事件循环时等待关闭时写回"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._flush_task = loop.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """后台写回循环，合并间隔内的多次写入为一次落盘"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush_async()
+        except asyncio.CancelledError:
+            pass
+
+    async def flush_async(self) -> bool:
+        """
+        写回未保存的修改：在事件循环中复制条目表，在I/O线程池中序列化并写入
+        条目值在写入缓存后不会被原地修改，复制外层字典即可
+        :return: 是否成功（没有待写回的修改时返回True）
+        """
+        if not self._dirty:
+            return True
+        entries = dict(self._entries)
+        self._dirty = False
+        try:
+            async with file_lock(self.path):
+                await run_io(self._write, entries)
+            return True
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"[ResponseCache] 保存{self.name}失败: {e}")
+            return False
+
+    async def close(self):
+        """停止后台任务并写回未保存的修改"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush_async()
+
+    def clear(self):
+        """清空缓存并删除磁盘文件"""
+        self._entries.clear()
+        self._dirty = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,141 @@
+"""
+灵签签文模块
+一次性加载观音100灵签与排序数据，构建只读索引供所有模块共享
+"""
+
+import json
+import threading
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+from astrbot.api import logger
+from .variable import LINGQIAN_TOTAL_COUNT
+from .core_lq_meta import get_paths, read_sources, source_digest, build_meta, load_meta
+
+class LingqianSlip(NamedTuple):
+    """单支灵签（只读）"""
+    qianxu: int            # 签序
+    qianxu_chinese: str    # 中文签序
+    qianming: str          # 签名
+    gongwei: str           # 宫位
+    jixiong: str           # 吉凶
+    rank: int              # 在排序数据中的位置（越小越靠前）
+    raw: MappingProxyType  # 原始JSON内容
+
+    @property
+    def content(self) -> str:
+        return self.raw.get('内容', '')
+
+    def raw_dict(self) -> dict:
+        """原始JSON内容的可序列化副本"""
+        return dict(self.raw)
+
+    def detail_dict(self) -> dict:
+        """附带签名、吉凶、宫位的完整信息（供提示词使用）"""
+        detail = dict(self.raw)
+        detail.update({'签名': self.qianming, '吉凶': self.jixiong, '宫位': self.gongwei})
+        return detail
+
+
+class LingqianCorpus:
+    """观音100灵签索引（只读）"""
+
+    def __init__(self, slips: dict, sort_data: list):
+        # 按签序直接下标访问，下标0留空
+        self._slips = tuple(slips.get(i) for i in range(LINGQIAN_TOTAL_COUNT + 1))
+        self.sort_data = tuple(MappingProxyType(dict(item)) for item in sort_data)
+
+        by_jixiong = {}
+        for slip in self._slips:
+            if slip is not None:
+                by_jixiong.setdefault(slip.jixiong, []).append(slip.qianxu)
+        self.by_jixiong = MappingProxyType({k: tuple(v) for k, v in by_jixiong.items()})
+
+    def get(self, qianxu) -> Optional[LingqianSlip]:
+        """按签序获取灵签"""
+        try:
+            qianxu = int(qianxu)
+        except (TypeError, ValueError):
+            return None
+        if 1 <= qianxu <= LINGQIAN_TOTAL_COUNT:
+            return self._slips[qianxu]
+        return None
+
+    def jixiong(self, qianxu, default: str = "未知") -> str:
+        slip = self.get(qianxu)
+        return slip.jixiong if slip else default
+
+    def rank(self, qianxu) -> int:
+        """签序的排序优先级，找不到时排在最后"""
+        slip = self.get(qianxu)
+        return slip.rank if slip else len(self.sort_data)
+
+    def __iter__(self):
+        return (slip for slip in self._slips if slip is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def load_corpus() -> LingqianCorpus:
+    """
+    读取签文与排序数据并构建索引
+    签名、宫位等字段优先取自预编译的元数据文件，源文件变更后元数据失效时才现场解析
+    """
+    try:
+        slip_bytes, sort_bytes = read_sources()
+    except Exception as e:
+        logger.error(f"读取灵签数据失败: {e}")
+        slip_bytes, sort_bytes = {}, b''
+
+    meta = load_meta(get_paths()[2])
+    if meta is None or meta.get('digest') != source_digest(slip_bytes, sort_bytes):
+        logger.warning("灵签元数据不存在或已过期，将现场解析签文（可在插件目录执行 python -m core.core_lq_meta 重新编译）")
+        try:
+            meta = build_meta(slip_bytes, sort_bytes)
+        except Exception as e:
+            logger.error(f"解析灵签数据失败: {e}")
+            meta = {'slips': []}
+
+    try:
+        sort_data = json.loads(sort_bytes.decode('utf-8')) if sort_bytes else []
+    except Exception as e:
+        logger.error(f"加载排序数据失败: {e}")
+        sort_data = []
+
+    slips = {}
+    for entry in meta.get('slips', []):
+        qianxu = entry['签序']
+        try:
+            raw = json.loads(slip_bytes[qianxu].decode('utf-8'))
+        except Exception as e:
+            logger.error(f"加载灵签数据失败 (签序: {qianxu}): {e}")
+            continue
+
+        slips[qianxu] = LingqianSlip(
+            qianxu=qianxu,
+            qianxu_chinese=entry['中文签序'],
+            qianming=entry['签名'],
+            gongwei=entry['宫位'],
+            jixiong=entry['吉凶'],
+            rank=entry['排序'],
+            raw=MappingProxyType(raw),
+        )
+
+    missing = LINGQIAN_TOTAL_COUNT - len(slips)
+    if missing:
+        logger.warning(f"有 {missing} 支灵签数据缺失")
+    logger.debug(f"灵签签文加载完成: {len(slips)} 支")
+    return LingqianCorpus(slips, sort_data)
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+def get_corpus() -> LingqianCorpus:
+    """获取共享的灵签索引（首次调用时加载）"""
+    global _corpus
+    if _corpus is None:
+        with _corpus_lock:
+            if _corpus is None:
+                _corpus = load_corpus()
+    return _corpus
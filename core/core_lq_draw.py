@@ -0,0 +1,245 @@
+"""
+抽签模块
+按人品范围预计算100支灵签的抽取概率，并构建别名表（Vose Alias Method）实现O(1)抽取；
+抽签使用独立的随机数生成器，不修改全局 random 模块的状态
+"""
+
+import hashlib
+import random
+from functools import lru_cache
+from astrbot.api import logger
+from .core_lq_corpus import get_corpus
+from .variable import DRAW_MODE, LINGQIAN_TOTAL_COUNT
+
+JIXIONG_LEVELS = ('上签', '中签', '下签')
+
+class AliasTable:
+    """别名表：按给定概率在O(1)时间内抽取签序"""
+
+    __slots__ = ('outcomes', 'probabilities', '_prob', '_alias')
+
+    def __init__(self, weights: dict):
+        """
+        :param weights: {签序: 权重}，权重无需归一化
+        """
+        outcomes = [k for k, w in weights.items() if w > 0]
+        total = sum(weights[k] for k in outcomes)
+        if not outcomes or total <= 0:
+            raise ValueError("抽签权重必须至少有一个大于0")
+
+        n = len(outcomes)
+        self.outcomes = tuple(outcomes)
+        self.probabilities = {k: weights[k] / total for k in outcomes}
+
+        scaled = [self.probabilities[k] * n for k in outcomes]
+        prob = [0.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # 剩余项因浮点误差视为概率1
+        for i in large + small:
+            prob[i] = 1.0
+
+        self._prob = tuple(prob)
+        self._alias = tuple(outcomes[i] for i in alias)
+
+    def sample(self, rng=random) -> int:
+        """抽取一个签序（只消耗一次随机数）"""
+        u = rng.random() * len(self.outcomes)
+        i = int(u)
+        if i >= len(self.outcomes):
+            i = len(self.outcomes) - 1
+        return self.outcomes[i] if u - i < self._prob[i] else self._alias[i]
+
+    def level_probabilities(self) -> dict:
+        """按吉凶汇总的概率"""
+        corpus = get_corpus()
+        result = {level: 0.0 for level in JIXIONG_LEVELS}
+        for qianxu, p in self.probabilities.items():
+            level = corpus.jixiong(qianxu)
+            result[level] = result.get(level, 0.0) + p
+        return result
+
+
+@lru_cache(maxsize=64)
+def get_alias_table(shang_rate: float = 0, zhong_rate: float = 0) -> AliasTable:
+    """
+    按上签、中签概率调整值构建别名表（按调整值缓存）
+    各吉凶等级的基础概率为其签数占比，调整后下签取剩余概率，同一等级内各签等概率
+    """
+    corpus = get_corpus()
+    levels = {level: corpus.by_jixiong.get(level, ()) for level in JIXIONG_LEVELS}
+    total_count = sum(len(v) for v in levels.values())
+    if not total_count or not all(levels.values()):
+        # 签文数据不完整时退化为等概率
+        return AliasTable({slip.qianxu: 1 for slip in corpus} or {1: 1})
+
+    shang_prob = max(0, min(1, len(levels['上签']) / total_count + shang_rate / 100))
+    zhong_prob = max(0, min(1, len(levels['中签']) / total_count + zhong_rate / 100))
+    xia_prob = max(0, 1 - shang_prob - zhong_prob)
+    total_prob = shang_prob + zhong_prob + xia_prob
+    if total_prob <= 0:
+        return AliasTable({slip.qianxu: 1 for slip in corpus})
+
+    weights = {}
+    for level, level_prob in zip(JIXIONG_LEVELS, (shang_prob, zhong_prob, xia_prob)):
+        for qianxu in levels[level]:
+            weights[qianxu] = level_prob / total_prob / len(levels[level])
+    return AliasTable(weights)
+
+
+def parse_ranges(ranges_jrrp: str) -> list:
+    """解析人品范围字符串，如 "0-20,21-50,51-100" -> [(0, 20), (21, 50), (51, 100)]"""
+    ranges = []
+    for range_str in (ranges_jrrp or '').split(','):
+        range_str = range_str.strip()
+        if not range_str:
+            continue
+        if '-' in range_str:
+            start, end = map(int, range_str.split('-'))
+        else:
+            start = end = int(range_str)
+        ranges.append((start, end))
+    return ranges
+
+
+def parse_rates(rate_str: str) -> list:
+    """解析概率调整字符串，如 "-10,0,10" -> [-10.0, 0.0, 10.0]"""
+    if not rate_str:
+        return []
+    return [float(rate.strip()) for rate in rate_str.split(',')]
+
+
+class DrawTables:
+    """按人品范围预计算的抽签分布表"""
+
+    def __init__(self, ranges_jrrp: str, shang_rate: str, zhong_rate: str):
+        self.source = (ranges_jrrp, shang_rate, zhong_rate)
+        try:
+            self.ranges = parse_ranges(ranges_jrrp)
+        except ValueError as e:
+            logger.error(f"解析jrrp范围失败: {e}")
+            self.ranges = []
+        try:
+            shang_rates = parse_rates(shang_rate)
+            zhong_rates = parse_rates(zhong_rate)
+        except ValueError as e:
+            logger.error(f"解析概率字符串失败: {e}")
+            shang_rates, zhong_rates = [], []
+
+        # 每个人品范围对应 (上签调整值, 中签调整值, 别名表)，未配置调整值的范围为None
+        self.entries = []
+        for i in range(len(self.ranges)):
+            if i < len(shang_rates) and i < len(zhong_rates):
+                self.entries.append((shang_rates[i], zhong_rates[i],
+                                     get_alias_table(shang_rates[i], zhong_rates[i])))
+            else:
+                self.entries.append(None)
+
+    def range_index(self, jrrp: int) -> int:
+        """获取jrrp所属的范围索引，不在任何范围内时返回-1"""
+        for i, (start, end) in enumerate(self.ranges):
+            if start <= jrrp <= end:
+                return i
+        return -1
+
+    def lookup(self, jrrp: int) -> dict:
+        """
+        获取jrrp对应的抽签调整参数
+        :return: {'shang_rate', 'zhong_rate', 'range_index', 'alias_table'}，无调整时返回None
+        """
+        index = self.range_index(jrrp)
+        if index == -1 or self.entries[index] is None:
+            return None
+        shang_rate, zhong_rate, table = self.entries[index]
+        return {
+            'shang_rate': shang_rate,
+            'zhong_rate': zhong_rate,
+            'range_index': index,
+            'alias_table': table
+        }
+
+    def describe(self) -> list:
+        """各人品范围的实际抽签概率，供核对配置"""
+        result = []
+        for (start, end), entry in zip(self.ranges, self.entries):
+            item = {'range': f"{start}-{end}"}
+            if entry is None:
+                item['adjusted'] = False
+            else:
+                shang_rate, zhong_rate, table = entry
+                item.update({
+                    'adjusted': True,
+                    'shang_rate': shang_rate,
+                    'zhong_rate': zhong_rate,
+                    'levels': table.level_probabilities(),
+                    'slips': dict(sorted(table.probabilities.items()))
+                })
+            result.append(item)
+        return result
+
+    def log_summary(self):
+        """在日志中输出各人品范围的吉凶概率"""
+        for item in self.describe():
+            if not item['adjusted']:
+                logger.info(f"[灵签概率] 人品 {item['range']}: 未调整")
+                continue
+            levels = "，".join(f"{k} {v:.2%}" for k, v in item['levels'].items())
+            logger.info(f"[灵签概率] 人品 {item['range']}: {levels}")
+
+
+class DrawEngine:
+    """
+    抽签引擎
+    - fast：引擎独享一个以系统熵初始化的生成器，抽签时不做哈希与时间格式化
+    - reproducible：每次抽签由 (用户, 日期) 的带密钥哈希派生独立生成器，同一用户同一天结果固定，便于审计与测试
+    """
+
+    def __init__(self, mode: str = DRAW_MODE['FAST'], secret: str = ""):
+        if mode not in DRAW_MODE.values():
+            logger.warning(f"未知的抽签模式: {mode}，使用 {DRAW_MODE['FAST']}")
+            mode = DRAW_MODE['FAST']
+        self.mode = mode
+        # blake2b 密钥最长64字节，过长的密钥先取摘要
+        key = (secret or "").encode('utf-8')
+        self._key = key if len(key) <= 64 else hashlib.blake2b(key).digest()
+        self._rng = random.Random()
+
+    @classmethod
+    def from_config(cls, config) -> "DrawEngine":
+        config = config or {}
+        return cls(
+            mode=config.get('lingqian_draw_mode', DRAW_MODE['FAST']),
+            secret=config.get('lingqian_draw_secret', '')
+        )
+
+    def rng_for(self, user_id: str, day: str) -> random.Random:
+        """获取本次抽签使用的生成器"""
+        if self.mode == DRAW_MODE['REPRODUCIBLE']:
+            digest = hashlib.blake2b(f"{user_id}|{day}".encode('utf-8'), digest_size=32, key=self._key).digest()
+            return random.Random(digest)
+        return self._rng
+
+    def draw(self, user_id: str, day: str, fortune_adjustment: dict = None) -> int:
+        """
+        抽取签序
+        :param fortune_adjustment: 人品调整参数，含 alias_table 或 shang_rate / zhong_rate
+        """
+        rng = self.rng_for(user_id, day)
+        if not fortune_adjustment:
+            # 无调整，纯随机
+            return rng.randint(1, LINGQIAN_TOTAL_COUNT)
+
+        # 使用预计算的别名表，未提供时按调整值获取（按调整值缓存）
+        table = fortune_adjustment.get('alias_table')
+        if table is None:
+            table = get_alias_table(fortune_adjustment.get('shang_rate', 0),
+                                    fortune_adjustment.get('zhong_rate', 0))
+        return table.sample(rng)
@@ -0,0 +1,126 @@
+"""
+人品数据读取模块
+读取 daily_fortune 插件的人品历史与配置，按文件修改时间与大小缓存解析结果；
+异步接口在I/O线程池中解析文件，不阻塞事件循环
+"""
+
+import json
+import os
+from astrbot.api import logger
+from .variable import FORTUNE_DATA_PATH, CONFIG_PATH, get_today
+from .core_lq_io import run_io
+
+class CachedJsonFile:
+    """带缓存的JSON文件读取器，文件的修改时间或大小变化时才重新解析"""
+
+    def __init__(self, path: str, name: str = ""):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.stamp = None  # 当前缓存对应的文件标识
+        self._data = {}
+
+    def _stat(self):
+        """文件标识 (mtime_ns, size)，文件不存在时为None"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self, stamp) -> dict:
+        """读取并解析文件"""
+        data = {}
+        if stamp is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8-sig') as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.error(f"无法读取{self.name}内容: {e}")
+        return data if isinstance(data, dict) else {}
+
+    def _update(self, stamp, data: dict) -> dict:
+        # 读取失败也记录标识，避免文件未修复前反复解析
+        self.stamp = stamp
+        self._data = data
+        return data
+
+    def load(self) -> dict:
+        """获取文件内容，未变化时直接返回缓存"""
+        stamp = self._stat()
+        if stamp == self.stamp:
+            return self._data
+        return self._update(stamp, self._read(stamp))
+
+    async def load_async(self) -> dict:
+        """获取文件内容，需要重新解析时在I/O线程池中执行"""
+        stamp = self._stat()
+        if stamp == self.stamp:
+            return self._data
+        return self._update(stamp, await run_io(self._read, stamp))
+
+
+class FortuneReader:
+    """daily_fortune 插件数据读取器（插件内共享）"""
+
+    def __init__(self, data_path: str = FORTUNE_DATA_PATH, config_path: str = CONFIG_PATH):
+        self.history_file = CachedJsonFile(data_path, "fortune_history.json")
+        self.config_file = CachedJsonFile(config_path, "daily_fortune配置")
+        self._today_key = None      # (日期, 文件标识)
+        self._today_entries = {}    # {user_id: 今日人品数据}
+
+    def load_history(self) -> dict:
+        """获取完整的人品历史数据"""
+        return self.history_file.load()
+
+    def get_today_entries(self) -> dict:
+        """获取所有用户今日的人品数据 {user_id: data}，文件变化或跨天时重建"""
+        return self._build_today_entries(self.history_file.load())
+
+    async def get_today_entries_async(self) -> dict:
+        """get_today_entries 的异步版本"""
+        return self._build_today_entries(await self.history_file.load_async())
+
+    def _build_today_entries(self, history: dict) -> dict:
+        today = get_today()
+        key = (today, self.history_file.stamp)
+        if key == self._today_key:
+            return self._today_entries
+
+        entries = {}
+        for user_id, user_data in history.items():
+            if not isinstance(user_data, dict):
+                continue
+            # 支持带时间戳的日期格式，匹配今日日期，忽略时间部分
+            if today in user_data:
+                entries[user_id] = user_data[today]
+                continue
+            for date_key, data in user_data.items():
+                if date_key.startswith(today):
+                    entries[user_id] = data
+                    break
+
+        self._today_key = key
+        self._today_entries = entries
+        return entries
+
+    def get_today_fortune(self, user_id: str):
+        """获取用户今日的人品数据，不存在时返回None"""
+        return self.get_today_entries().get(user_id)
+
+    async def get_today_fortune_async(self, user_id: str):
+        """get_today_fortune 的异步版本"""
+        return (await self.get_today_entries_async()).get(user_id)
+
+    def get_ranges(self) -> tuple:
+        """获取人品范围配置 (ranges_jrrp, ranges_fortune)"""
+        return self._parse_ranges(self.config_file.load())
+
+    async def get_ranges_async(self) -> tuple:
+        """get_ranges 的异步版本"""
+        return self._parse_ranges(await self.config_file.load_async())
+
+    @staticmethod
+    def _parse_ranges(fortune_config: dict) -> tuple:
+        if not fortune_config:
+            return None, None
+        return fortune_config.get('ranges_jrrp', ''), fortune_config.get('ranges_fortune', '')
@@ -6,49 +6,124 @@
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 from .core_lq_userinfo import UserInfoManager
-from .variable import get_today
+from .core_lq_roster import RosterCache
+from .variable import get_today, LINGQIAN_TOTAL_COUNT, DEFAULT_ROSTER_TTL
 
 class GroupManager:
     """群聊管理器"""
     
+    # 各群成员列表的缓存，所有实例共用
+    roster = RosterCache()
+    
+    # 排序数据 -> (签序下标的优先级数组, 签序 -> 吉凶, 找不到时的优先级)，排序数据为共享只读副本，按对象标识缓存
+    _sort_tables = (None, None)
+    
+    @classmethod
+    def configure(cls, config):
+        """根据插件配置设置群成员缓存的有效期"""
+        cls.roster.configure(config.get('group_roster_ttl', DEFAULT_ROSTER_TTL))
+    
     @staticmethod
     async def get_group_members(event: AstrMessageEvent):
-        """获取群成员列表"""
+        """获取群成员列表（优先使用群成员缓存）"""
         try:
             if not event.get_group_id():
                 return []
             
-            group = await event.get_group()
-            if not group or not hasattr(group, 'members'):
-                return []
-            
-            members = []
-            for member in group.members:
-                user_id = str(member.user_id)
-                nickname = getattr(member, 'nickname', user_id)
-                card = getattr(member, 'card', None) or nickname
-                title = getattr(member, 'title', '')
-                
-                members.append({
-                    'user_id': user_id,
-                    'nickname': nickname,
-                    'card': card,
-                    'title': title
-                })
-            
-            return members
+            members = await GroupManager.roster.get(event)
+            return list(members.values())
             
         except Exception as e:
             logger.error(f"获取群成员列表失败: {e}")
             return []
     
     @staticmethod
-    async def filter_group_ranking_data(event: AstrMessageEvent, history_data: dict, sort_data: list):
+    def handle_member_notice(event: AstrMessageEvent) -> bool:
+        """处理群成员变动通知，增量更新群成员缓存"""
+        try:
+            raw_message = getattr(event.message_obj, 'raw_message', None)
+            return GroupManager.roster.handle_notice(raw_message)
+        except Exception as e:
+            logger.error(f"处理群成员变动通知失败: {e}")
+            return False
+    
+    @staticmethod
+    async def get_group_member_map(event: AstrMessageEvent) -> dict:
+        """获取群成员索引（用户ID -> 成员信息），供排行榜按ID直接查找"""
+        try:
+            if not event.get_group_id():
+                return {}
+            return await GroupManager.roster.get(event)
+        except Exception as e:
+            logger.error(f"获取群成员列表失败: {e}")
+            return {}
+    
+    @staticmethod
+    def _today_partition(user_data: dict, value_func) -> dict:
+        """未提供按日索引时，由完整数据筛选出今日有数据的用户（用户ID -> value_func(今日数据)）"""
+        today = get_today()
+        partition = {}
+        for user_id, data in user_data.items():
+            if isinstance(data, dict) and today in data:
+                value = value_func(data[today])
+                if value is not None:
+                    partition[user_id] = value
+        return partition
+    
+    @staticmethod
+    def _iter_group_users(members: dict, user_data: dict):
+        """
+        遍历同时在群内且今日有数据的用户，只遍历两者中较小的一方
+        :return: (用户ID, 成员信息, 用户数据) 迭代器
+        """
+        if len(members) <= len(user_data):
+            for user_id, member in members.items():
+                data = user_data.get(user_id)
+                if data is not None:
+                    yield user_id, member, data
+        else:
+            for user_id, data in user_data.items():
+                member = members.get(user_id)
+                if member is not None:
+                    yield user_id, member, data
+    
+    @staticmethod
+    def _rank_group_users(event: AstrMessageEvent, members: dict, partition: dict, key_func,
+                          leaderboards=None, limit: int = None) -> list:
+        """
+        获取群内今日有数据的用户排名
+        提供排行榜缓存时直接读取有序的排行榜，否则现场筛选并排序
+        :return: [(用户ID, 排序键)]，按排序键升序
+        """
+        if leaderboards is not None:
+            group_id = event.get_group_id()
+            board = leaderboards.board(group_id, get_today(), members, GroupManager.roster.version(group_id), partition)
+            return board.top(limit)
+        
+        ranked = [(user_id, key_func(value)) for user_id, _, value in GroupManager._iter_group_users(members, partition)]
+        ranked.sort(key=lambda item: item[1])
+        return ranked if limit is None else ranked[:limit]
+    
+    @staticmethod
+    def _record_qianxu(record):
+        """灵签记录中的签序（兼容只保存了签序的旧格式）"""
+        if isinstance(record, dict):
+            return record.get('qianxu')
+        try:
+            return int(record)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    async def filter_group_ranking_data(event: AstrMessageEvent, history_data: dict, sort_data: list,
+                                        drawers: dict = None, leaderboards=None):
         """
         筛选群聊内的排行数据
         :param event: 消息事件
         :param history_data: 历史数据字典
         :param sort_data: 排序数据列表
+        :param drawers: 今日抽签用户的按日索引（用户ID -> 签序），不提供时由历史数据筛选
+        :param leaderboards: 按签序维护的排行榜缓存，需与 drawers 一同提供
         :return: 筛选后的排行数据列表
         """
         try:
@@ -56,55 +131,38 @@ class GroupManager:
                 logger.debug("非群聊消息，无法生成群排行")
                 return []
             
-            # 获取群成员列表
-            group_members = await GroupManager.get_group_members(event)
+            # 获取群成员索引
+            group_members = await GroupManager.get_group_member_map(event)
             if not group_members:
                 logger.warning("无法获取群成员列表")
                 return []
             
-            # 获取群成员的用户ID列表
-            group_user_ids = {member['user_id'] for member in group_members}
-            
-            # 获取今日日期
+            sort_tables = GroupManager._get_sort_tables(sort_data)
+            jixiong_table = sort_tables[1]
             today = get_today()
+            if drawers is None:
+                drawers = GroupManager._today_partition(history_data, GroupManager._record_qianxu)
+                leaderboards = None
             
-            # 筛选出今日有数据且在群内的用户
-            ranking_data = []
+            # 今日有数据且在群内的用户，按排序优先级排列
+            ranked = GroupManager._rank_group_users(
+                event, group_members, drawers,
+                lambda qianxu: GroupManager._lookup_priority(sort_tables, qianxu), leaderboards)
             
-            for user_id, user_history in history_data.items():
-                # 检查用户是否在群内
-                if user_id not in group_user_ids:
-                    continue
-                
-                # 检查用户今日是否有数据
-                if today not in user_history:
-                    continue
-                
-                # 获取用户信息
-                user_info = None
-                for member in group_members:
-                    if member['user_id'] == user_id:
-                        user_info = member
-                        break
-                
-                if not user_info:
-                    continue
+            ranking_data = []
+            for user_id, sort_priority in ranked:
+                user_info = group_members[user_id]
+                today_data = history_data.get(user_id, {}).get(today)
                 
-                # 获取今日数据
-                today_data = user_history[today]
                 if isinstance(today_data, dict) and 'qianxu' in today_data:
                     qianxu = today_data['qianxu']
                     qianming = today_data.get('qianming', '未知')
                     jixiong = today_data.get('jixiong', '未知')
                 elif isinstance(today_data, (int, str)):
+                    # 兼容旧格式：只保存了签序
                     qianxu = int(today_data)
-                    # 查找对应的吉凶和签名信息
-                    jixiong = "未知"
                     qianming = "未知"
-                    for sort_item in sort_data:
-                        if sort_item.get('签序') == qianxu:
-                            jixiong = sort_item.get('吉凶', '未知')
-                            break
+                    jixiong = jixiong_table.get(qianxu, "未知")
                 else:
                     continue
                 
@@ -116,18 +174,39 @@ class GroupManager:
                     'qianxu': qianxu,
                     'qianming': qianming,
                     'jixiong': jixiong,
-                    'sort_priority': GroupManager._get_sort_priority(qianxu, sort_data)
+                    'sort_priority': sort_priority
                 })
             
-            # 根据排序优先级排序
-            ranking_data.sort(key=lambda x: x['sort_priority'])
-            
             return ranking_data
             
         except Exception as e:
             logger.error(f"筛选群排行数据失败: {e}")
             return []
     
+    @staticmethod
+    def _get_sort_tables(sort_data) -> tuple:
+        """获取由排序数据预计算的优先级数组与吉凶表"""
+        source, tables = GroupManager._sort_tables
+        if source is not sort_data:
+            missing = len(sort_data)  # 找不到时排在最后
+            priorities = [missing] * (LINGQIAN_TOTAL_COUNT + 1)
+            jixiong_table = {}
+            for i, sort_item in enumerate(sort_data):
+                qianxu = sort_item.get('签序')
+                if isinstance(qianxu, int) and 0 <= qianxu <= LINGQIAN_TOTAL_COUNT and priorities[qianxu] == missing:
+                    priorities[qianxu] = i
+                jixiong_table.setdefault(qianxu, sort_item.get('吉凶', '未知'))
+            tables = (priorities, jixiong_table, missing)
+            GroupManager._sort_tables = (sort_data, tables)
+        return tables
+    
+    @staticmethod
+    def _lookup_priority(tables: tuple, qianxu) -> int:
+        priorities, _, missing = tables
+        if isinstance(qianxu, int) and 0 <= qianxu < len(priorities):
+            return priorities[qianxu]
+        return missing
+    
     @staticmethod
     def _get_sort_priority(qianxu: int, sort_data: list) -> int:
         """
@@ -137,20 +216,21 @@ class GroupManager:
         :return: 排序优先级（越小越靠前）
         """
         try:
-            for i, sort_item in enumerate(sort_data):
-                if sort_item.get('签序') == qianxu:
-                    return i
-            return len(sort_data)  # 如果找不到，排在最后
+            return GroupManager._lookup_priority(GroupManager._get_sort_tables(sort_data), qianxu)
         except Exception as e:
             logger.error(f"获取排序优先级失败: {e}")
             return 9999
     
     @staticmethod
-    async def filter_group_jieqian_ranking_data(event: AstrMessageEvent, jieqian_data: dict):
+    async def filter_group_jieqian_ranking_data(event: AstrMessageEvent, jieqian_data: dict, solvers: dict = None,
+                                                leaderboards=None, limit: int = None):
         """
         筛选群聊内的解签排行数据
         :param event: 消息事件
         :param jieqian_data: 解签数据字典
+        :param solvers: 今日解签用户的按日索引（用户ID -> 解签次数），不提供时由解签数据统计
+        :param leaderboards: 按解签次数维护的排行榜缓存，需与 solvers 一同提供
+        :param limit: 只返回前几名，不指定时返回全部
         :return: 筛选后的解签排行数据列表
         """
         try:
@@ -158,58 +238,31 @@ class GroupManager:
                 logger.debug("非群聊消息，无法生成群解签排行")
                 return []
             
-            # 获取群成员列表
-            group_members = await GroupManager.get_group_members(event)
+            # 获取群成员索引
+            group_members = await GroupManager.get_group_member_map(event)
             if not group_members:
                 logger.warning("无法获取群成员列表")
                 return []
             
-            # 获取群成员的用户ID列表
-            group_user_ids = {member['user_id'] for member in group_members}
+            if solvers is None:
+                solvers = GroupManager._today_partition(
+                    jieqian_data, lambda records: len(records) if isinstance(records, list) and records else None)
+                leaderboards = None
             
-            # 获取今日日期
-            today = get_today()
+            # 今日有解签数据且在群内的用户，按解签数量降序排列
+            ranked = GroupManager._rank_group_users(
+                event, group_members, solvers, lambda count: -count, leaderboards, limit)
             
-            # 筛选出今日有解签数据且在群内的用户
             ranking_data = []
-            
-            for user_id, user_jieqian in jieqian_data.items():
-                # 检查用户是否在群内
-                if user_id not in group_user_ids:
-                    continue
-                
-                # 检查用户今日是否有解签数据
-                if today not in user_jieqian:
-                    continue
-                
-                # 获取用户信息
-                user_info = None
-                for member in group_members:
-                    if member['user_id'] == user_id:
-                        user_info = member
-                        break
-                
-                if not user_info:
-                    continue
-                
-                # 计算今日解签数量
-                today_jieqian = user_jieqian[today]
-                if isinstance(today_jieqian, list):
-                    jieqian_count = len(today_jieqian)
-                else:
-                    jieqian_count = 0
-                
-                if jieqian_count > 0:
-                    ranking_data.append({
-                        'user_id': user_id,
-                        'nickname': user_info['nickname'],
-                        'card': user_info['card'],
-                        'title': user_info['title'],
-                        'jieqian_count': jieqian_count
-                    })
-            
-            # 按解签数量降序排序
-            ranking_data.sort(key=lambda x: x['jieqian_count'], reverse=True)
+            for user_id, sort_key in ranked:
+                user_info = group_members[user_id]
+                ranking_data.append({
+                    'user_id': user_id,
+                    'nickname': user_info['nickname'],
+                    'card': user_info['card'],
+                    'title': user_info['title'],
+                    'jieqian_count': -sort_key
+                })
             
             return ranking_data
             
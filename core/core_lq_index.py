@@ -0,0 +1,101 @@
+"""
+按日索引模块
+为 {user_id: {date: ...}} 布局的历史数据维护按日期分区的二级索引 date -> {user_id: 签序 | 解签次数}，
+排行榜与今日统计只需读取当天的分区，不必遍历所有用户
+"""
+
+from .core_lq_sqlite import LAYOUT_DAY_RECORD, LAYOUT_DAY_LIST
+
+class DayIndex:
+    """按日期分区的用户索引，由 HistoryStore 在写入时同步维护"""
+
+    def __init__(self, layout: str = LAYOUT_DAY_RECORD):
+        """
+        :param layout: 数据布局；day_record 索引签序，day_list 索引当日记录条数
+        """
+        self.layout = layout
+        self._days = {}    # 日期 -> {用户ID: 签序 | 条数}
+        self._counts = {}  # 日期 -> 当日记录总数
+        self._total = 0
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """
+        订阅索引变化，listener 需提供：
+        - changed(user_id, date, value)：单个用户某一天的索引值变化，value 为None时表示移除
+        - reset()：索引整体重建
+        """
+        self._listeners.append(listener)
+
+    def _value(self, record):
+        """由一天的记录得到索引值，无效记录返回None"""
+        if self.layout == LAYOUT_DAY_LIST:
+            return len(record) if isinstance(record, list) and record else None
+        if isinstance(record, dict):
+            return record.get('qianxu')
+        try:
+            # 兼容旧格式：只保存了签序
+            return int(record)
+        except (TypeError, ValueError):
+            return None
+
+    def _weight(self, value) -> int:
+        """索引值对应的记录条数"""
+        return value if self.layout == LAYOUT_DAY_LIST else 1
+
+    def rebuild(self, data: dict):
+        """由完整数据重建索引"""
+        self._days = {}
+        self._counts = {}
+        self._total = 0
+        for user_id, user_data in (data or {}).items():
+            if isinstance(user_data, dict):
+                for date, record in user_data.items():
+                    self._set(user_id, date, self._value(record))
+        for listener in self._listeners:
+            listener.reset()
+
+    def update(self, user_id: str, date: str, record):
+        """同步一个用户某一天的记录，record 为None时移除"""
+        value = self._value(record)
+        if self._set(user_id, date, value):
+            for listener in self._listeners:
+                listener.changed(user_id, date, value)
+
+    def _set(self, user_id: str, date: str, value) -> bool:
+        """:return: 索引值是否变化"""
+        partition = self._days.get(date)
+        old = partition.get(user_id) if partition else None
+        if old == value:
+            return False
+
+        delta = (self._weight(value) if value is not None else 0) - (self._weight(old) if old is not None else 0)
+        if value is None:
+            del partition[user_id]
+            if not partition:
+                del self._days[date]
+        else:
+            if partition is None:
+                partition = self._days[date] = {}
+            partition[user_id] = value
+
+        count = self._counts.get(date, 0) + delta
+        if count > 0:
+            self._counts[date] = count
+        else:
+            self._counts.pop(date, None)
+        self._total += delta
+        return True
+
+    def day(self, date: str) -> dict:
+        """获取某一天的分区（用户ID -> 签序 | 条数），只读"""
+        return self._days.get(date) or {}
+
+    def count(self, date: str = None) -> int:
+        """某一天（不指定时为全部）的记录总数"""
+        if date is None:
+            return self._total
+        return self._counts.get(date, 0)
+
+    def __len__(self):
+        return len(self._days)
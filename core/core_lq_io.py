@@ -0,0 +1,99 @@
+"""
+文件I/O模块
+将磁盘读写放到插件专用的线程池中执行，避免阻塞事件循环；同一文件的写入按文件加锁串行执行
+数据文件先写入临时文件并落盘后再替换，可保留最近几份旧快照用于损坏后恢复
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from astrbot.api import logger
+
+IO_MAX_WORKERS = 2
+
+_executor = None
+_file_locks = {}  # 文件绝对路径 -> asyncio.Lock
+
+def get_executor() -> ThreadPoolExecutor:
+    """获取插件专用的I/O线程池（首次使用时创建）"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="lingqian_io")
+    return _executor
+
+
+async def run_io(func, *args):
+    """在I/O线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), func, *args)
+
+
+def file_lock(path: str) -> asyncio.Lock:
+    """获取文件对应的写入锁"""
+    key = os.path.abspath(path)
+    lock = _file_locks.get(key)
+    if lock is None:
+        lock = _file_locks[key] = asyncio.Lock()
+    return lock
+
+
+def backup_paths(path: str, count: int) -> list:
+    """旧快照路径，从新到旧排列：path.bak1 ... path.bakN"""
+    return [f"{path}.bak{i}" for i in range(1, count + 1)]
+
+
+def _rotate_backups(path: str, count: int):
+    """将当前文件移为 .bak1，已有的旧快照依次后移，超出数量的最旧快照被覆盖"""
+    backups = backup_paths(path, count)
+    for older, newer in zip(reversed(backups), reversed(backups[:-1])):
+        if os.path.exists(newer):
+            os.replace(newer, older)
+    os.replace(path, backups[0])
+
+
+def _fsync_dir(path: str):
+    """同步目录项，保证替换操作本身落盘（Windows 不支持打开目录，跳过）"""
+    if os.name == 'nt':
+        return
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_file_atomic(path: str, payload: bytes, backups: int = 0):
+    """
+    写入临时文件并落盘后替换目标文件，任何时刻磁盘上都不会出现写了一半的目标文件
+    :param backups: 保留的旧快照份数，替换前将当前文件轮转为 .bak1 ~ .bakN
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    if backups > 0 and os.path.exists(path):
+        _rotate_backups(path, backups)
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+async def write_file(path: str, payload: bytes, backups: int = 0):
+    """在I/O线程池中写入文件，同一文件的写入串行执行"""
+    async with file_lock(path):
+        await run_io(write_file_atomic, path, payload, backups)
+
+
+def shutdown_io():
+    """关闭I/O线程池（插件卸载时调用）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        logger.debug("[IO] I/O线程池已关闭")
+    _file_locks.clear()
@@ -0,0 +1,107 @@
+"""
+群排行榜模块
+按 (群, 日期) 维护有序的排行榜，订阅按日索引的变化增量更新，查看排行时无需重新排序；
+只保留当天的排行榜，日期变化时淘汰旧的
+"""
+
+import bisect
+import itertools
+
+class Leaderboard:
+    """单个群某一天的排行榜，条目按 (排序键, 写入序号) 有序保存"""
+
+    __slots__ = ('members', 'roster_version', '_entries', '_keys')
+
+    def __init__(self, members: dict, roster_version: int):
+        """
+        :param members: 构建时使用的群成员索引（用户ID -> 成员信息）
+        :param roster_version: 构建时群成员缓存的版本，成员变动后排行榜需重建
+        """
+        self.members = members
+        self.roster_version = roster_version
+        self._entries = []  # [(排序键, 序号, 用户ID)]，有序
+        self._keys = {}     # 用户ID -> 条目
+
+    def put(self, user_id: str, key, seq: int):
+        """插入或更新用户的排序键"""
+        self.remove(user_id)
+        entry = (key, seq, user_id)
+        bisect.insort(self._entries, entry)
+        self._keys[user_id] = entry
+
+    def remove(self, user_id: str):
+        entry = self._keys.pop(user_id, None)
+        if entry is not None:
+            del self._entries[bisect.bisect_left(self._entries, entry)]
+
+    def top(self, limit: int = None) -> list:
+        """按排名返回前 limit 名（不指定时为全部）的 (用户ID, 排序键)"""
+        entries = self._entries if limit is None else self._entries[:limit]
+        return [(user_id, key) for key, _, user_id in entries]
+
+    def __contains__(self, user_id):
+        return user_id in self._keys
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LeaderboardCache:
+    """各群当天的排行榜，作为按日索引的订阅者随写入更新"""
+
+    def __init__(self, key_func):
+        """
+        :param key_func: 由按日索引的值（签序或解签次数）计算排序键，越小越靠前
+        """
+        self.key_func = key_func
+        self._boards = {}  # 群ID -> Leaderboard
+        self._date = None  # 排行榜对应的日期
+        self._seq = itertools.count()
+
+    def board(self, group_id, date: str, members: dict, roster_version: int, partition: dict) -> Leaderboard:
+        """
+        获取群在某一天的排行榜，不存在或群成员已变化时由当天的索引分区重建
+        :param partition: 当天的按日索引分区（用户ID -> 签序 | 解签次数）
+        """
+        if date != self._date:
+            # 日期变化，淘汰之前的排行榜
+            self._boards.clear()
+            self._date = date
+
+        group_id = str(group_id)
+        board = self._boards.get(group_id)
+        if board is None or board.members is not members or board.roster_version != roster_version:
+            board = self._boards[group_id] = self._build(members, roster_version, partition)
+        return board
+
+    def _build(self, members: dict, roster_version: int, partition: dict) -> Leaderboard:
+        board = Leaderboard(members, roster_version)
+        # 只遍历群成员与当天用户中较小的一方
+        if len(partition) <= len(members):
+            items = ((user_id, value) for user_id, value in partition.items() if user_id in members)
+        else:
+            items = ((user_id, partition[user_id]) for user_id in members if user_id in partition)
+        for user_id, value in items:
+            board.put(user_id, self.key_func(value), next(self._seq))
+        return board
+
+    # ==================== 按日索引订阅 ====================
+
+    def changed(self, user_id: str, date: str, value):
+        """用户某一天的索引值变化，value 为None时表示记录已删除"""
+        if date != self._date:
+            return
+        for board in self._boards.values():
+            if user_id not in board.members:
+                continue
+            if value is None:
+                board.remove(user_id)
+            else:
+                board.put(user_id, self.key_func(value), next(self._seq))
+
+    def reset(self):
+        """索引整体重建，丢弃所有排行榜"""
+        self._boards.clear()
+
+    def __len__(self):
+        return len(self._boards)
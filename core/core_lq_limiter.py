@@ -0,0 +1,141 @@
+"""
+并发限制模块
+限制同时进行的LLM解签请求数（全局与每个群），超出的请求按到达顺序排队等待
+"""
+
+import asyncio
+from collections import deque
+from astrbot.api import logger
+from .variable import DEFAULT_LLM_CONCURRENCY, DEFAULT_LLM_GROUP_CONCURRENCY
+
+class LimiterTicket:
+    """排队凭证：进入队列后等待放行，请求结束时释放名额"""
+
+    WAITING = 'waiting'
+    ACTIVE = 'active'
+    DONE = 'done'
+
+    __slots__ = ('limiter', 'group_id', 'state', '_future')
+
+    def __init__(self, limiter: "ConcurrencyLimiter", group_id: str):
+        self.limiter = limiter
+        self.group_id = group_id
+        self.state = self.WAITING
+        self._future = asyncio.get_running_loop().create_future()
+
+    @property
+    def position(self) -> int:
+        """排队位置，1为下一个放行，已放行时为0"""
+        return self.limiter.position(self)
+
+    async def wait(self):
+        """等待放行"""
+        if self.state != self.WAITING:
+            return
+        try:
+            await self._future
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self):
+        """释放名额或退出队列（可重复调用）"""
+        self.limiter.release(self)
+
+    async def __aenter__(self):
+        await self.wait()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class ConcurrencyLimiter:
+    """
+    LLM请求并发限制器
+    全局与每个群分别限制同时进行的请求数；放行时按到达顺序扫描队列，
+    所在群名额已满的请求不会阻塞其他群的请求，同一群内严格先到先得
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_LLM_CONCURRENCY,
+                 max_group_concurrency: int = DEFAULT_LLM_GROUP_CONCURRENCY):
+        """
+        :param max_concurrency: 全局最大同时请求数
+        :param max_group_concurrency: 每个群最大同时请求数，0为不单独限制（私聊只受全局限制）
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_group_concurrency = max(0, int(max_group_concurrency))
+        self.active = 0
+        self._group_active = {}  # 群号 -> 进行中的请求数
+        self._queue = deque()
+
+    @classmethod
+    def from_config(cls, config) -> "ConcurrencyLimiter":
+        jieqian_config = (config or {}).get('jieqian_config', {})
+        return cls(
+            max_concurrency=jieqian_config.get('llm_max_concurrency', DEFAULT_LLM_CONCURRENCY),
+            max_group_concurrency=jieqian_config.get('llm_group_max_concurrency', DEFAULT_LLM_GROUP_CONCURRENCY),
+        )
+
+    @property
+    def waiting(self) -> int:
+        """排队中的请求数"""
+        return len(self._queue)
+
+    def enter(self, group_id: str = "") -> LimiterTicket:
+        """进入队列，有空闲名额时立即放行"""
+        ticket = LimiterTicket(self, group_id or "")
+        self._queue.append(ticket)
+        self._dispatch()
+        if ticket.state == LimiterTicket.WAITING:
+            logger.debug(f"[解签队列] 群 {group_id or '私聊'} 的请求排队中，位置 {self.position(ticket)}，"
+                         f"进行中 {self.active}/{self.max_concurrency}")
+        return ticket
+
+    def position(self, ticket: LimiterTicket) -> int:
+        if ticket.state != LimiterTicket.WAITING:
+            return 0
+        try:
+            return self._queue.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def release(self, ticket: LimiterTicket):
+        if ticket.state == LimiterTicket.ACTIVE:
+            self.active -= 1
+            if ticket.group_id:
+                count = self._group_active.get(ticket.group_id, 0) - 1
+                if count > 0:
+                    self._group_active[ticket.group_id] = count
+                else:
+                    self._group_active.pop(ticket.group_id, None)
+        elif ticket.state == LimiterTicket.WAITING:
+            try:
+                self._queue.remove(ticket)
+            except ValueError:
+                pass
+        else:
+            return
+        ticket.state = LimiterTicket.DONE
+        self._dispatch()
+
+    def _group_full(self, group_id: str) -> bool:
+        return (bool(group_id) and self.max_group_concurrency > 0
+                and self._group_active.get(group_id, 0) >= self.max_group_concurrency)
+
+    def _dispatch(self):
+        """按到达顺序放行可以执行的请求"""
+        if not self._queue or self.active >= self.max_concurrency:
+            return
+        for ticket in list(self._queue):
+            if self.active >= self.max_concurrency:
+                break
+            if self._group_full(ticket.group_id):
+                continue
+            self._queue.remove(ticket)
+            self.active += 1
+            if ticket.group_id:
+                self._group_active[ticket.group_id] = self._group_active.get(ticket.group_id, 0) + 1
+            ticket.state = LimiterTicket.ACTIVE
+            if not ticket._future.done():
+                ticket._future.set_result(None)
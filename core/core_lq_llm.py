@@ -3,12 +3,51 @@ LLM核心模块
 处理解签时的LLM调用功能
 """
 
-import json
 import os
+import time
 import asyncio
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
-from .variable import PLUGIN_DATA_PATH, JIEQIAN_HISTORY_FILE, JIEQIAN_CONTENT_FILE, JIEQIAN_STATUS, get_today
+from .variable import (
+    DEFAULT_STREAM_CHUNK_SIZE, PLUGIN_DATA_PATH, JIEQIAN_HISTORY_FILE, JIEQIAN_CONTENT_FILE, JIEQIAN_SELF_CACHE_FILE, JIEQIAN_STATUS, STORAGE_MODE,
+    DEFAULT_SELF_CACHE_TTL, DEFAULT_SELF_CACHE_SIZE, DEFAULT_FLUSH_INTERVAL, SELF_CACHE_USER_NAME, get_today
+)
+from .core_lq_store import HistoryStore
+from .core_lq_io import run_io
+from .core_lq_corpus import get_corpus
+from .core_lq_template import render_prompt
+from .core_lq_sqlite import LAYOUT_DAY_LIST, LAYOUT_USER_LIST
+from .core_lq_lock import KeyedLock
+from .core_lq_leaderboard import LeaderboardCache
+from .core_lq_limiter import ConcurrencyLimiter, LimiterTicket
+from .core_lq_cache import ResponseCache
+from .core_lq_question import QuestionCache
+from .core_lq_stream import SentenceChunker, iter_completion_text
+from .core_lq_resolver import LLMResolver
+from .core_lq_breaker import CircuitBreaker, provider_key
+
+# 提示词中无法提供实际值的变量的默认值
+PROMPT_VARIABLE_DEFAULTS = {
+    "lqpic": "",
+    "jqxh": "",
+    "jieqian": "",
+    "lingqian_ranks": "",
+    "lingqian_history_content": "",
+    "lqhi_display": "0",
+    "lqhi_total": "0",
+    "lqhi_shang_total": "0",
+    "lqhi_zhong_total": "0",
+    "lqhi_xia_total": "0",
+    "jieqian_ranks": "",
+    "jieqian_history_content": "",
+    "jieqian_count": "0",
+    "jqhi_display": "0",
+    "jqhi_total": "0",
+    "jqhi_total_today": "0",
+    "jqhi_max": "0",
+    "jqhi_avg": "0",
+    "jqhi_min": "0"
+}
 
 class LLMManager:
     """LLM管理器"""
@@ -20,50 +59,138 @@ class LLMManager:
         self.jieqian_content_path = os.path.join(PLUGIN_DATA_PATH, JIEQIAN_CONTENT_FILE)
         self.jieqian_status = {}  # 解签状态缓存
         self.ensure_data_directory()
+        
+        # 常驻内存的解签历史与内容，修改通过存储写回
+        self.history_store = HistoryStore.from_config(
+            self.jieqian_history_path, "解签历史数据", config, LAYOUT_DAY_LIST)
+        self.content_store = HistoryStore.from_config(
+            self.jieqian_content_path, "解签内容数据", config, LAYOUT_USER_LIST)
+        
+        # 用户锁：同一用户的解签记录写入、初始化、删除串行执行
+        self.user_locks = KeyedLock()
+        
+        # 各群今日的解签排行榜，按解签次数降序排列，随解签与删除增量更新
+        self.leaderboards = LeaderboardCache(lambda count: -count)
+        self.history_store.day_index.subscribe(self.leaderboards)
+        
+        # 解签使用的供应商与人格
+        self.resolver = LLMResolver(context, config)
+        
+        # 供应商熔断：根据真实请求的超时、错误与耗时判断供应商是否可用
+        self.breaker = CircuitBreaker.from_config(config)
+        
+        # LLM请求并发限制：超出全局或本群名额的请求按顺序排队
+        self.limiter = ConcurrencyLimiter.from_config(config)
+        
+        # 签文拆解回复缓存：结果只取决于签文、人格与提示词，用户名在缓存外替换
+        self.self_cache = None
+        jieqian_config = config.get('jieqian_config', {})
+        if jieqian_config.get('self_cache_enabled', False):
+            self.self_cache = ResponseCache(
+                os.path.join(PLUGIN_DATA_PATH, JIEQIAN_SELF_CACHE_FILE),
+                ttl=float(jieqian_config.get('self_cache_ttl', DEFAULT_SELF_CACHE_TTL)) * 3600,
+                max_size=int(jieqian_config.get('self_cache_size', DEFAULT_SELF_CACHE_SIZE)),
+                name="签文拆解缓存",
+                flush_interval=float(config.get('storage_flush_interval', DEFAULT_FLUSH_INTERVAL))
+            )
+        
+        # 相似问题去重：同一支签的相似问题复用解签结果，每条结果每天的复用次数有上限
+        self.question_cache = None
+        if jieqian_config.get('question_cache_enabled', False):
+            self.question_cache = QuestionCache.from_config(config)
     
     def ensure_data_directory(self):
         """确保数据目录存在"""
         if not os.path.exists(PLUGIN_DATA_PATH):
             os.makedirs(PLUGIN_DATA_PATH, exist_ok=True)
     
+    async def migrate_from_json(self) -> tuple:
+        """
+        将JSON数据文件中的解签历史与内容导入当前存储（用于迁移到SQLite）
+        读取JSON与写入SQLite都在I/O线程池中执行，事件循环中只合并内存数据
+        :return: (导入的历史记录数, 导入的内容记录数)
+        """
+        imported = []
+        for store, path, name in (
+            (self.history_store, self.jieqian_history_path, "解签历史数据(JSON)"),
+            (self.content_store, self.jieqian_content_path, "解签内容数据(JSON)"),
+        ):
+            if store.backend is None:
+                imported.append(0)
+                continue
+            legacy_store = await run_io(HistoryStore, path, name, 0, STORAGE_MODE['SNAPSHOT'])
+            imported.append(store.import_data(legacy_store.data))
+            await store.flush_async()
+        
+        logger.info(f"已从JSON导入 {imported[0]} 条解签历史、{imported[1]} 条解签内容")
+        return tuple(imported)
+    
+    def start_background_flush(self):
+        """启动解签数据的后台写回任务"""
+        self.history_store.start()
+        self.content_store.start()
+    
+    async def close(self):
+        """停止后台写回并保存剩余修改"""
+        await self.history_store.close()
+        await self.content_store.close()
+        if self.self_cache is not None:
+            await self.self_cache.close()
+        if self.question_cache is not None:
+            stats = self.question_cache.stats()
+            logger.info(f"[QuestionCache] 相似问题复用 {stats['hits']} 次，未命中 {stats['misses']} 次"
+                        f"（其中达到复用上限 {stats['capped']} 次），命中率 {stats['hit_rate']:.1%}")
+    
     def load_jieqian_history(self) -> dict:
-        """加载解签历史数据"""
-        try:
-            if os.path.exists(self.jieqian_history_path):
-                with open(self.jieqian_history_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            logger.error(f"加载解签历史数据失败: {e}")
-            return {}
+        """获取解签历史数据（返回内存中的数据，修改后需调用 save_jieqian_history）"""
+        return self.history_store.data
     
     def save_jieqian_history(self, history_data: dict):
         """保存解签历史数据"""
         try:
-            with open(self.jieqian_history_path, 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, ensure_ascii=False, indent=2)
+            self.history_store.replace(history_data)
         except Exception as e:
             logger.error(f"保存解签历史数据失败: {e}")
     
     def load_jieqian_content(self) -> dict:
-        """加载解签内容数据"""
-        try:
-            if os.path.exists(self.jieqian_content_path):
-                with open(self.jieqian_content_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            logger.error(f"加载解签内容数据失败: {e}")
-            return {}
+        """获取解签内容数据（返回内存中的数据，修改后需调用 save_jieqian_content）"""
+        return self.content_store.data
     
     def save_jieqian_content(self, content_data: dict):
         """保存解签内容数据"""
         try:
-            with open(self.jieqian_content_path, 'w', encoding='utf-8') as f:
-                json.dump(content_data, f, ensure_ascii=False, indent=2)
+            self.content_store.replace(content_data)
         except Exception as e:
             logger.error(f"保存解签内容数据失败: {e}")
     
+    def get_today_solvers(self) -> dict:
+        """获取今日解签的用户（用户ID -> 今日解签次数），只读"""
+        return self.history_store.day_index.day(get_today())
+    
+    def get_jieqian_statistics(self) -> dict:
+        """获取全局解签统计信息（所有用户），今日数按当前日期取值，跨天自动归零"""
+        try:
+            day_index = self.history_store.day_index
+            total_count = day_index.count()
+            today_count = day_index.count(get_today())
+            return {
+                "jqhi_total": total_count,           # 历史解签总数
+                "jqhi_total_today": today_count,     # 今日解签总数
+                "user_count": len(self.history_store.data),
+                # 保持向后兼容
+                "total_count": total_count,
+                "today_count": today_count
+            }
+        except Exception as e:
+            logger.error(f"获取全局解签统计信息失败: {e}")
+            return {
+                "jqhi_total": 0,
+                "jqhi_total_today": 0,
+                "user_count": 0,
+                "total_count": 0,
+                "today_count": 0
+            }
+    
     def is_user_processing(self, user_id: str) -> bool:
         """检查用户是否正在解签中"""
         return self.jieqian_status.get(user_id) == JIEQIAN_STATUS['PROCESSING']
@@ -75,13 +202,22 @@ class LLMManager:
         else:
             self.jieqian_status[user_id] = JIEQIAN_STATUS['IDLE']
     
-    async def process_jieqian(self, event: AstrMessageEvent, user_id: str, lingqian_data: dict, content: str) -> str:
+    def enter_queue(self, event: AstrMessageEvent) -> LimiterTicket:
+        """进入LLM请求队列，返回的凭证可通过 position 获取排队位置"""
+        return self.limiter.enter(event.get_group_id() or "")
+    
+    async def process_jieqian(self, event: AstrMessageEvent, user_id: str, lingqian_data: dict, content: str,
+                              ticket: LimiterTicket = None, stream: asyncio.Queue = None,
+                              user_info: dict = None) -> str:
         """
         处理解签请求
         :param event: 消息事件
         :param user_id: 用户ID
         :param lingqian_data: 灵签数据
         :param content: 解签内容
+        :param ticket: 已进入队列的凭证，未提供时在此排队
+        :param stream: 提供时流式调用LLM，回复按句子分段放入队列
+        :param user_info: 调用方已获取的用户信息，未提供时在构建提示词时查询
         :return: 解签结果
         """
         try:
@@ -92,9 +228,10 @@ class LLMManager:
             # 设置处理状态
             self.set_user_processing(user_id, True)
             
+            ticket = ticket or self.enter_queue(event)
             try:
-                # 调用LLM进行解签
-                jieqian_result = await self._call_llm_for_jieqian(event, lingqian_data, content)
+                # 调用LLM进行解签（复用相似问题的结果时无需等待并发名额）
+                jieqian_result = await self._call_llm_for_jieqian(event, lingqian_data, content, ticket, stream, user_info)
                 
                 # 保存解签记录
                 await self._save_jieqian_record(user_id, content, jieqian_result)
@@ -102,7 +239,8 @@ class LLMManager:
                 return jieqian_result
                 
             finally:
-                # 解除处理状态
+                # 释放并发名额，解除处理状态
+                ticket.release()
                 self.set_user_processing(user_id, False)
                 
         except Exception as e:
@@ -110,12 +248,17 @@ class LLMManager:
             self.set_user_processing(user_id, False)
             return "解签过程中发生错误，请稍后重试。"
     
-    async def process_jieqian_self(self, event: AstrMessageEvent, user_id: str, lingqian_data: dict) -> str:
+    async def process_jieqian_self(self, event: AstrMessageEvent, user_id: str, lingqian_data: dict,
+                                   ticket: LimiterTicket = None, stream: asyncio.Queue = None,
+                                   user_info: dict = None) -> str:
         """
         处理签文自身拆解请求（当用户没有提供具体问题时）
         :param event: 消息事件
         :param user_id: 用户ID
         :param lingqian_data: 灵签数据
+        :param ticket: 已进入队列的凭证，未提供时在此排队
+        :param stream: 提供时流式调用LLM，回复按句子分段放入队列
+        :param user_info: 调用方已获取的用户信息，未提供时在构建提示词时查询
         :return: 签文拆解结果
         """
         try:
@@ -126,9 +269,10 @@ class LLMManager:
             # 设置处理状态
             self.set_user_processing(user_id, True)
             
+            ticket = ticket or self.enter_queue(event)
             try:
-                # 调用LLM进行签文拆解
-                jieqian_result = await self._call_llm_for_jieqian_self(event, lingqian_data)
+                # 调用LLM进行签文拆解（命中缓存时无需等待并发名额）
+                jieqian_result = await self._call_llm_for_jieqian_self(event, lingqian_data, ticket, stream, user_info)
                 
                 # 保存解签记录（使用特殊标记表示签文拆解）
                 await self._save_jieqian_record(user_id, "[签文拆解]", jieqian_result)
@@ -136,7 +280,8 @@ class LLMManager:
                 return jieqian_result
                 
             finally:
-                # 解除处理状态
+                # 释放并发名额，解除处理状态
+                ticket.release()
                 self.set_user_processing(user_id, False)
                 
         except Exception as e:
@@ -144,87 +289,68 @@ class LLMManager:
             self.set_user_processing(user_id, False)
             return "签文拆解过程中发生错误，请稍后重试。"
     
-    async def _call_llm_for_jieqian(self, event: AstrMessageEvent, lingqian_data: dict, content: str) -> str:
-        """调用LLM进行解签 - 参考GitHub完美方案"""
+    async def _call_llm_for_jieqian(self, event: AstrMessageEvent, lingqian_data: dict, content: str,
+                                    ticket: LimiterTicket = None, stream: asyncio.Queue = None,
+                                    user_info: dict = None) -> str:
+        """
+        调用LLM进行解签 - 参考GitHub完美方案
+        :param ticket: LLM请求队列凭证，调用供应商前等待放行
+        :param stream: 流式输出的片段队列
+        :param user_info: 调用方已获取的用户信息
+        """
         try:
-            # 获取Provider - 使用优先级:插件配置的provider_id>第三方api>默认provider
-            provider = None
-            provider_id = self.config.get('jieqian_config', {}).get('provider_id', '').strip()
-            
-            # 1. 优先使用插件配置的provider_id
-            if provider_id:
-                provider = self.context.get_provider_by_id(provider_id)
-                if provider:
-                    logger.debug(f"[LLMManager] 使用指定provider: {provider_id}")
-                else:
-                    logger.warning(f"[LLMManager] 指定的provider_id不存在: {provider_id}")
-            
-            # 2. 如果没有指定provider或指定的不存在，使用默认provider
-            if not provider:
-                provider = self.context.get_using_provider()
-                if provider:
-                    logger.debug("[LLMManager] 使用默认provider")
-            
-            if not provider:
+            # 获取Provider与人格prompt（解析结果缓存，配置或人格列表变化时重新解析）
+            resolution = self.resolver.resolve()
+            if not resolution.provider:
                 logger.warning("[LLMManager] 没有可用的LLM提供商")
                 return "当前无法连接到AI服务，请稍后重试。"
-            
-            # 获取人格prompt - 使用优先级:插件配置的persona>默认persona
-            persona_prompt = ""
-            persona_name = self.config.get('jieqian_config', {}).get('persona', '').strip()
-            if persona_name:
-                # 使用指定的人格
-                personas = self.context.provider_manager.personas
-                for p in personas:
-                    if p.get('name') == persona_name:
-                        persona_prompt = p.get('prompt', '')
-                        logger.debug(f"[LLMManager] 使用指定人格: {persona_name}")
-                        break
-                else:
-                    logger.warning(f"[LLMManager] 未找到指定人格: {persona_name}")
-            
-            if not persona_prompt:
-                # 使用默认人格
-                default_persona = self.context.provider_manager.selected_default_persona
-                if default_persona and default_persona.get("name"):
-                    default_persona_name = default_persona["name"]
-                    personas = self.context.provider_manager.personas
-                    for p in personas:
-                        if p.get('name') == default_persona_name:
-                            persona_prompt = p.get('prompt', '')
-                            logger.debug(f"[LLMManager] 使用默认人格: {default_persona_name}")
-                            break
+            persona_prompt = resolution.persona_prompt
             
             # 获取解签提示词模板
             jieqian_prompt = self.config.get('jieqian_config', {}).get('jieqian_prompt', '')
             if not jieqian_prompt:
                 jieqian_prompt = "请根据{user_id}今日抽取的灵签，对其提出的问题进行简洁解签，请严格控制在50字以内"
             
+            # 启用相似问题去重时使用通用称呼构建提示词，使结果可以给其他用户复用
+            use_cache = self.question_cache is not None
+            user_name = None
+            qianxu = lingqian_data.get('qianxu', 0)
+            if use_cache:
+                user_name = await self._resolve_user_name(event, user_info)
+                # 缓存按实际回答的供应商区分；查找时预判将使用的供应商，不占用熔断器的试探名额
+                expected = self.breaker.peek(resolution.provider, resolution.fallback)
+                if expected is not None:
+                    cached = self.question_cache.get(QuestionCache.make_key(
+                        qianxu, content, provider_key(expected), persona_prompt, jieqian_prompt))
+                    if cached is not None:
+                        return cached.replace(SELF_CACHE_USER_NAME, user_name)
+            
             # 根据用户ID和灵签数据构建完整的解签提示词
             full_prompt = await self._build_detailed_jieqian_prompt(
-                persona_prompt, jieqian_prompt, lingqian_data, content, event
+                persona_prompt, jieqian_prompt, lingqian_data, content, event,
+                SELF_CACHE_USER_NAME if use_cache else None, user_info
             )
             
-            # 获取配置的超时时间
-            timeout_seconds = self.config.get('jieqian_config', {}).get('llm_timeout', 120)
-            
-            # 调用LLM - 使用人格prompt和解签提示词，不使用system_prompt避免兼容性问题
-            response = await asyncio.wait_for(
-                provider.text_chat(
-                    prompt=full_prompt,
-                    session_id=None,  # 不使用会话管理
-                    contexts=[],  # 不使用历史上下文
-                    image_urls=[],  # 不传递图片
-                    func_tool=None,  # 不使用函数工具
-                    system_prompt=""  # 不使用额外的system_prompt，人格已经在prompt中
-                ),
-                timeout=float(timeout_seconds)  # 使用配置的超时时间
-            )
+            # 等待LLM并发名额
+            if ticket is not None:
+                await ticket.wait()
             
-            if response and response.completion_text:
-                content = response.completion_text.strip()
-                logger.debug(f"[LLMManager] LLM解签回复: {content[:50]}...")
-                return content
+            # 缓存未命中且获得名额后才按熔断状态选择供应商，半开状态的试探名额只留给真正发出的请求
+            provider = self._get_provider_from(resolution)
+            if not provider:
+                return "当前无法连接到AI服务，请稍后重试。"
+            
+            # 调用LLM，提供stream时流式输出
+            reply = await self._request_completion(provider, full_prompt, stream, user_name, "解签")
+            
+            if reply:
+                logger.debug(f"[LLMManager] LLM解签回复: {reply[:50]}...")
+                if use_cache:
+                    # 熔断切换到备用供应商时，回复记在备用供应商名下
+                    self.question_cache.put(QuestionCache.make_key(
+                        qianxu, content, provider_key(provider), persona_prompt, jieqian_prompt), reply)
+                    return reply.replace(SELF_CACHE_USER_NAME, user_name)
+                return reply
             else:
                 logger.warning("[LLMManager] LLM返回空响应")
                 return "解签过程中AI未能提供回复，请稍后重试。"
@@ -236,86 +362,66 @@ class LLMManager:
             logger.error(f"[LLMManager] LLM解签失败: {e}")
             return "解签过程中发生错误，请稍后重试。"
     
-    async def _call_llm_for_jieqian_self(self, event: AstrMessageEvent, lingqian_data: dict) -> str:
-        """调用LLM进行签文自身拆解"""
+    async def _call_llm_for_jieqian_self(self, event: AstrMessageEvent, lingqian_data: dict,
+                                         ticket: LimiterTicket = None, stream: asyncio.Queue = None,
+                                         user_info: dict = None) -> str:
+        """
+        调用LLM进行签文自身拆解
+        :param ticket: LLM请求队列凭证，调用供应商前等待放行
+        :param stream: 流式输出的片段队列
+        :param user_info: 调用方已获取的用户信息
+        """
         try:
-            # 获取Provider - 使用优先级:插件配置的provider_id>第三方api>默认provider
-            provider = None
-            provider_id = self.config.get('jieqian_config', {}).get('provider_id', '').strip()
-            
-            # 1. 优先使用插件配置的provider_id
-            if provider_id:
-                provider = self.context.get_provider_by_id(provider_id)
-                if provider:
-                    logger.debug(f"[LLMManager] 使用指定provider: {provider_id}")
-                else:
-                    logger.warning(f"[LLMManager] 指定的provider_id不存在: {provider_id}")
-            
-            # 2. 如果没有指定provider或指定的不存在，使用默认provider
-            if not provider:
-                provider = self.context.get_using_provider()
-                if provider:
-                    logger.debug("[LLMManager] 使用默认provider")
-            
-            if not provider:
+            # 获取Provider与人格prompt（解析结果缓存，配置或人格列表变化时重新解析）
+            resolution = self.resolver.resolve()
+            if not resolution.provider:
                 logger.warning("[LLMManager] 没有可用的LLM提供商")
                 return "当前无法连接到AI服务，请稍后重试。"
-            
-            # 获取人格prompt - 使用优先级:插件配置的persona>默认persona
-            persona_prompt = ""
-            persona_name = self.config.get('jieqian_config', {}).get('persona', '').strip()
-            if persona_name:
-                # 使用指定的人格
-                personas = self.context.provider_manager.personas
-                for p in personas:
-                    if p.get('name') == persona_name:
-                        persona_prompt = p.get('prompt', '')
-                        logger.debug(f"[LLMManager] 使用指定人格: {persona_name}")
-                        break
-                else:
-                    logger.warning(f"[LLMManager] 未找到指定人格: {persona_name}")
-            
-            if not persona_prompt:
-                # 使用默认人格
-                default_persona = self.context.provider_manager.selected_default_persona
-                if default_persona and default_persona.get("name"):
-                    default_persona_name = default_persona["name"]
-                    personas = self.context.provider_manager.personas
-                    for p in personas:
-                        if p.get('name') == default_persona_name:
-                            persona_prompt = p.get('prompt', '')
-                            logger.debug(f"[LLMManager] 使用默认人格: {default_persona_name}")
-                            break
+            persona_prompt = resolution.persona_prompt
             
             # 获取签文拆解提示词模板
             jieqian_self_prompt = self.config.get('jieqian_config', {}).get('jieqian_self_prompt', '')
             if not jieqian_self_prompt:
                 jieqian_self_prompt = "请对{user_id}今日抽取的灵签进行简洁的翻译和拆解，包括核心寓意和指导建议，请严格控制在50字以内"
             
+            # 启用缓存时使用通用称呼构建提示词，使不同用户的同一支签共用缓存
+            user_name = None
+            if self.self_cache is not None:
+                user_name = await self._resolve_user_name(event, user_info)
+            
             # 根据用户ID和灵签数据构建完整的签文拆解提示词
             full_prompt = await self._build_detailed_jieqian_self_prompt(
-                persona_prompt, jieqian_self_prompt, lingqian_data, event
+                persona_prompt, jieqian_self_prompt, lingqian_data, event,
+                SELF_CACHE_USER_NAME if self.self_cache is not None else None, user_info
             )
             
-            # 获取配置的超时时间
-            timeout_seconds = self.config.get('jieqian_config', {}).get('llm_timeout', 120)
-            
-            # 调用LLM - 使用人格prompt和签文拆解提示词，不使用system_prompt避免兼容性问题
-            response = await asyncio.wait_for(
-                provider.text_chat(
-                    prompt=full_prompt,
-                    session_id=None,  # 不使用会话管理
-                    contexts=[],  # 不使用历史上下文
-                    image_urls=[],  # 不传递图片
-                    func_tool=None,  # 不使用函数工具
-                    system_prompt=""  # 不使用额外的system_prompt，人格已经在prompt中
-                ),
-                timeout=float(timeout_seconds)  # 使用配置的超时时间
-            )
+            if self.self_cache is not None:
+                # 缓存按实际回答的供应商区分；查找时预判将使用的供应商，不占用熔断器的试探名额
+                expected = self.breaker.peek(resolution.provider, resolution.fallback)
+                if expected is not None:
+                    cached = self.self_cache.get(ResponseCache.make_key(provider_key(expected), full_prompt))
+                    if cached is not None:
+                        logger.debug(f"[LLMManager] 签文拆解命中缓存 (命中 {self.self_cache.hits} / 未命中 {self.self_cache.misses})")
+                        return cached.replace(SELF_CACHE_USER_NAME, user_name)
+            
+            # 等待LLM并发名额
+            if ticket is not None:
+                await ticket.wait()
+            
+            # 缓存未命中且获得名额后才按熔断状态选择供应商，半开状态的试探名额只留给真正发出的请求
+            provider = self._get_provider_from(resolution)
+            if not provider:
+                return "当前无法连接到AI服务，请稍后重试。"
             
-            if response and response.completion_text:
-                content = response.completion_text.strip()
+            # 调用LLM，提供stream时流式输出
+            content = await self._request_completion(provider, full_prompt, stream, user_name, "签文拆解")
+            
+            if content:
                 logger.debug(f"[LLMManager] LLM签文拆解回复: {content[:50]}...")
+                if self.self_cache is not None:
+                    # 熔断切换到备用供应商时，回复记在备用供应商名下
+                    self.self_cache.put(ResponseCache.make_key(provider_key(provider), full_prompt), content)
+                    return content.replace(SELF_CACHE_USER_NAME, user_name)
                 return content
             else:
                 logger.warning("[LLMManager] LLM返回空响应")
@@ -328,14 +434,109 @@ class LLMManager:
             logger.error(f"[LLMManager] LLM签文拆解失败: {e}")
             return "签文拆解过程中发生错误，请稍后重试。"
     
+    @staticmethod
+    async def _resolve_user_name(event: AstrMessageEvent, user_info: dict = None) -> str:
+        """提示词中使用的称呼（群名片或昵称），未提供用户信息时查询"""
+        if user_info is None:
+            from .core_lq_userinfo import UserInfoManager
+            user_info = await UserInfoManager.get_user_info(event)
+        return user_info.get('card', user_info.get('nickname', '用户'))
+    
+    async def _request_completion(self, provider, prompt: str, stream: asyncio.Queue = None,
+                                  user_name: str = None, label: str = "解签") -> str:
+        """调用供应商获取完整回复，并将结果（超时、错误、空响应、耗时）记入熔断器"""
+        key = provider_key(provider)
+        start = time.monotonic()
+        try:
+            content = await self._call_provider(provider, prompt, stream, user_name, label)
+        except asyncio.TimeoutError:
+            self.breaker.record_failure(key, "响应超时")
+            raise
+        except Exception as e:
+            self.breaker.record_failure(key, f"请求出错: {e}")
+            raise
+        if content:
+            self.breaker.record_success(key, time.monotonic() - start)
+        else:
+            self.breaker.record_failure(key, "空响应")
+        return content
+    
+    async def _call_provider(self, provider, prompt: str, stream: asyncio.Queue = None,
+                             user_name: str = None, label: str = "解签") -> str:
+        """
+        调用供应商获取完整回复，并记录首段响应耗时以便比较流式与非流式
+        :param stream: 提供且供应商支持时流式输出，回复按句子分段放入队列
+        :param user_name: 放入队列前将回复中的通用称呼替换为该名称（缓存使用通用称呼时）
+        :return: 完整回复，无回复时为空字符串
+        """
+        jieqian_config = self.config.get('jieqian_config', {})
+        timeout_seconds = float(jieqian_config.get('llm_timeout', 120))
+        # 使用人格prompt和解签提示词，不使用system_prompt避免兼容性问题
+        kwargs = dict(
+            prompt=prompt,
+            session_id=None,  # 不使用会话管理
+            contexts=[],  # 不使用历史上下文
+            image_urls=[],  # 不传递图片
+            func_tool=None,  # 不使用函数工具
+            system_prompt=""  # 不使用额外的system_prompt，人格已经在prompt中
+        )
+        start = time.monotonic()
+        
+        if stream is not None and hasattr(provider, 'text_chat_stream'):
+            # 通用称呼在切分前替换，避免被强制切分拆到两个片段中而漏替换
+            chunker = SentenceChunker(jieqian_config.get('stream_chunk_size', DEFAULT_STREAM_CHUNK_SIZE),
+                                      (SELF_CACHE_USER_NAME, user_name) if user_name else None)
+            parts = []
+            first_chunk = None
+            
+            def send(chunk: str):
+                nonlocal first_chunk
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - start
+                stream.put_nowait(chunk)
+            
+            try:
+                async for delta in iter_completion_text(provider.text_chat_stream(**kwargs), timeout_seconds):
+                    parts.append(delta)
+                    for chunk in chunker.feed(delta):
+                        send(chunk)
+            except NotImplementedError:
+                # 供应商未实现流式输出，改用普通调用
+                logger.debug("[LLMManager] 供应商不支持流式输出，使用普通调用")
+                parts = None
+            except Exception as e:
+                if not parts:
+                    raise
+                # 已输出部分内容，保留已收到的回复
+                logger.warning(f"[LLMManager] LLM{label}流式输出中断，保留已收到的内容: {e}")
+            
+            if parts is not None:
+                rest = chunker.flush()
+                if rest:
+                    send(rest)
+                if first_chunk is not None:
+                    logger.info(f"[LLMManager] LLM{label}首段响应耗时 {first_chunk:.2f}s，"
+                                f"总耗时 {time.monotonic() - start:.2f}s（流式）")
+                return "".join(parts).strip()
+        
+        response = await asyncio.wait_for(provider.text_chat(**kwargs), timeout=timeout_seconds)
+        logger.info(f"[LLMManager] LLM{label}首段响应耗时 {time.monotonic() - start:.2f}s（非流式，即总耗时）")
+        if response and response.completion_text:
+            return response.completion_text.strip()
+        return ""
+    
     async def _build_detailed_jieqian_self_prompt(self, persona_prompt: str, jieqian_self_prompt: str, 
-                                                lingqian_data: dict, event: AstrMessageEvent) -> str:
-        """构建详细的签文拆解提示词"""
+                                                lingqian_data: dict, event: AstrMessageEvent, user_name: str = None,
+                                                user_info: dict = None) -> str:
+        """
+        构建详细的签文拆解提示词
+        :param user_name: 提示词中使用的称呼，未提供时使用用户的群名片或昵称
+        :param user_info: 调用方已获取的用户信息，未提供时查询
+        """
         try:
             # 获取用户信息
-            from .core_lq_userinfo import UserInfoManager
-            user_info = await UserInfoManager.get_user_info(event)
-            user_name = user_info.get('card', user_info.get('nickname', '用户'))
+            if user_name is None:
+                user_name = await self._resolve_user_name(event, user_info)
             
             # 读取具体的灵签内容
             qianxu = lingqian_data.get('qianxu', 0)
@@ -395,13 +596,17 @@ class LLMManager:
             return fallback_prompt
     
     async def _build_detailed_jieqian_prompt(self, persona_prompt: str, jieqian_prompt: str, 
-                                           lingqian_data: dict, content: str, event: AstrMessageEvent) -> str:
-        """构建详细的解签提示词 - 参考GitHub完美方案"""
+                                           lingqian_data: dict, content: str, event: AstrMessageEvent,
+                                           user_name: str = None, user_info: dict = None) -> str:
+        """
+        构建详细的解签提示词 - 参考GitHub完美方案
+        :param user_name: 提示词中使用的称呼，未提供时使用用户的群名片或昵称
+        :param user_info: 调用方已获取的用户信息，未提供时查询
+        """
         try:
             # 获取用户信息
-            from .core_lq_userinfo import UserInfoManager
-            user_info = await UserInfoManager.get_user_info(event)
-            user_name = user_info.get('card', user_info.get('nickname', '用户'))
+            if user_name is None:
+                user_name = await self._resolve_user_name(event, user_info)
             
             # 读取具体的灵签内容
             qianxu = lingqian_data.get('qianxu', 0)
@@ -463,28 +668,12 @@ class LLMManager:
             return fallback_prompt
     
     async def _load_lingqian_json(self, qianxu: int) -> dict:
-        """加载指定签序的灵签JSON文件"""
-        try:
-            if not qianxu or qianxu < 1 or qianxu > 100:
-                logger.warning(f"[LLMManager] 无效的签序: {qianxu}")
-                return {}
-            
-            # 构建JSON文件路径
-            plugin_dir = os.path.dirname(os.path.dirname(__file__))  # 回到插件根目录
-            json_path = os.path.join(plugin_dir, "guanyin_lingqian", f"{qianxu}.json")
-            
-            if not os.path.exists(json_path):
-                logger.warning(f"[LLMManager] 灵签JSON文件不存在: {json_path}")
-                return {}
-            
-            with open(json_path, 'r', encoding='utf-8') as f:
-                lingqian_json = json.load(f)
-                logger.debug(f"[LLMManager] 成功加载灵签JSON: {qianxu}")
-                return lingqian_json
-                
-        except Exception as e:
-            logger.error(f"[LLMManager] 加载灵签JSON文件失败: {e}")
+        """获取指定签序的灵签内容（含签名、吉凶、宫位）"""
+        slip = get_corpus().get(qianxu)
+        if slip is None:
+            logger.warning(f"[LLMManager] 无效的签序: {qianxu}")
             return {}
+        return slip.detail_dict()
     
     def _build_jieqian_prompt(self, lingqian_data: dict, content: str) -> str:
         """构建解签提示词"""
@@ -512,65 +701,30 @@ class LLMManager:
     async def _get_persona(self) -> str:
         """获取人格设置"""
         try:
-            persona_name = self.config.get('jieqian_config', {}).get('persona', '')
-            if not persona_name:
-                return ""
-            
-            # 获取所有人格
-            personas = self.context.provider_manager.personas
-            for persona in personas:
-                # 处理字典和对象两种格式
-                if isinstance(persona, dict):
-                    if persona.get('name') == persona_name:
-                        logger.info(f"获取人格成功, {persona.get('prompt', '')[:10]}...")
-                        return persona.get('prompt', '')
-                else:
-                    if hasattr(persona, 'name') and persona.name == persona_name:
-                        logger.info(f"获取人格成功, {persona.prompt[:10]}...")
-                        return persona.prompt
-            
-            logger.warning(f"未找到指定人格: {persona_name}")
-            return ""
-            
+            return self.resolver.resolve().persona_prompt
         except Exception as e:
             logger.error(f"人格获取失败: {e}")
             return ""
     
+    def _get_provider_from(self, resolution) -> object:
+        """
+        按熔断状态选择供应商：指定供应商熔断时改用默认供应商
+        半开状态的供应商被选中即占用试探名额，只应在即将发出请求时调用
+        """
+        if not resolution.provider:
+            logger.warning("[LLMManager] 没有可用的LLM提供商")
+            return None
+        provider = self.breaker.pick(resolution.provider, resolution.fallback)
+        if provider is None:
+            logger.warning("[LLMManager] 所有LLM提供商均处于熔断状态")
+        elif provider is not resolution.provider:
+            logger.info(f"[LLMManager] 供应商 {provider_key(resolution.provider)} 熔断中，改用默认供应商")
+        return provider
+    
     async def _get_provider(self):
-        """获取LLM供应商"""
+        """获取LLM供应商（根据真实请求的结果被动熔断，不发送测试请求）"""
         try:
-            jieqian_config = self.config.get('jieqian_config', {})
-            
-            # 优先使用指定的供应商ID
-            provider_id = jieqian_config.get('provider_id', '')
-            if provider_id:
-                provider = self.context.get_provider_by_id(provider_id)
-                if provider:
-                    # 测试连接
-                    test_response = await provider.text_chat(
-                        prompt="reply *PONG* only",
-                        contexts=[],
-                        session_id=None,
-                        image_urls=[],
-                        func_tool=None,
-                        system_prompt=""
-                    )
-                    if test_response:
-                        logger.info(f"成功连接{provider_id}")
-                        return provider
-            
-            # 尝试使用第三方API
-            api_key = jieqian_config.get('api_key', '')
-            api_url = jieqian_config.get('api_url', '')
-            model = jieqian_config.get('model', '')
-            
-            if api_key and api_url and model:
-                # 这里可以实现第三方API调用
-                # 由于需要实现完整的OpenAI兼容客户端，暂时跳过
-                logger.info("第三方API配置已找到，但暂未实现")
-            
-            return None
-            
+            return self._get_provider_from(self.resolver.resolve())
         except Exception as e:
             logger.error(f"获取LLM供应商失败: {e}")
             return None
@@ -580,34 +734,21 @@ class LLMManager:
         try:
             today = get_today()
             
-            # 保存到历史记录
-            history_data = self.load_jieqian_history()
-            if user_id not in history_data:
-                history_data[user_id] = {}
-            if today not in history_data[user_id]:
-                history_data[user_id][today] = []
-            
-            history_data[user_id][today].append({
-                'content': content,
-                'result': jieqian_result,
-                'timestamp': get_today()
-            })
-            
-            self.save_jieqian_history(history_data)
-            
-            # 保存到内容记录
-            content_data = self.load_jieqian_content()
-            if user_id not in content_data:
-                content_data[user_id] = []
-            
-            content_data[user_id].append({
-                'date': today,
-                'content': content,
-                'result': jieqian_result,
-                'timestamp': get_today()
-            })
-            
-            self.save_jieqian_content(content_data)
+            async with self.user_locks.hold(user_id):
+                # 保存到历史记录
+                self.history_store.append([user_id, today], {
+                    'content': content,
+                    'result': jieqian_result,
+                    'timestamp': today
+                })
+                
+                # 保存到内容记录
+                self.content_store.append([user_id], {
+                    'date': today,
+                    'content': content,
+                    'result': jieqian_result,
+                    'timestamp': today
+                })
             
         except Exception as e:
             logger.error(f"保存解签记录失败: {e}")
@@ -719,22 +860,18 @@ class LLMManager:
             if user_id in history_data:
                 user_history = history_data[user_id]
                 if today in user_history:
-                    history_data[user_id] = {today: user_history[today]}
+                    self.history_store.set([user_id], {today: user_history[today]})
                 else:
-                    del history_data[user_id]
-                
-                self.save_jieqian_history(history_data)
+                    self.history_store.delete([user_id])
             
             # 处理内容记录
             if user_id in content_data:
                 user_content = content_data[user_id]
                 today_content = [item for item in user_content if item.get('date') == today]
                 if today_content:
-                    content_data[user_id] = today_content
+                    self.content_store.set([user_id], today_content)
                 else:
-                    del content_data[user_id]
-                
-                self.save_jieqian_content(content_data)
+                    self.content_store.delete([user_id])
             
             return True
             
@@ -742,8 +879,43 @@ class LLMManager:
             logger.error(f"删除用户解签历史记录失败: {e}")
             return False
     
-    def initialize_user_jieqian_today(self, user_id: str) -> bool:
-        """初始化用户今日解签记录（清除今日数据）"""
+    def delete_user_today_jieqian(self, user_id: str, index: int):
+        """
+        删除用户今日指定序号的解签记录
+        :param user_id: 用户ID
+        :param index: 序号（从1开始）
+        :return: 被删除的记录，不存在时返回None
+        """
+        try:
+            today = get_today()
+            today_list = self.history_store.data.get(user_id, {}).get(today)
+            if not isinstance(today_list, list) or not 1 <= index <= len(today_list):
+                return None
+            
+            deleted_item = today_list[index - 1]
+            self.history_store.pop([user_id, today], index - 1)
+            
+            # 删除内容记录中今日的第index条
+            user_content = self.content_store.data.get(user_id, [])
+            today_position = 0
+            for i, item in enumerate(user_content):
+                if item.get('date') == today:
+                    today_position += 1
+                    if today_position == index:
+                        self.content_store.pop([user_id], i)
+                        break
+            
+            return deleted_item
+            
+        except Exception as e:
+            logger.error(f"删除用户今日解签记录失败: {e}")
+            return None
+    
+    def initialize_user_jieqian_today(self, user_id: str, all_content: bool = False) -> bool:
+        """
+        初始化用户今日解签记录（清除今日数据）
+        :param all_content: 是否清除该用户的全部解签内容，而不只是今日的
+        """
         try:
             history_data = self.load_jieqian_history()
             content_data = self.load_jieqian_content()
@@ -751,18 +923,19 @@ class LLMManager:
             
             # 清除历史记录中的今日数据
             if user_id in history_data and today in history_data[user_id]:
-                del history_data[user_id][today]
-                if not history_data[user_id]:
-                    del history_data[user_id]
-                self.save_jieqian_history(history_data)
+                self.history_store.delete([user_id, today])
             
             # 清除内容记录中的今日数据
-            if user_id in content_data:
+            if user_id in content_data and all_content:
+                self.content_store.delete([user_id])
+            elif user_id in content_data:
                 user_content = content_data[user_id]
-                content_data[user_id] = [item for item in user_content if item.get('date') != today]
-                if not content_data[user_id]:
-                    del content_data[user_id]
-                self.save_jieqian_content(content_data)
+                remaining = [item for item in user_content if item.get('date') != today]
+                if len(remaining) != len(user_content):
+                    if remaining:
+                        self.content_store.set([user_id], remaining)
+                    else:
+                        self.content_store.delete([user_id])
             
             return True
             
@@ -773,10 +946,12 @@ class LLMManager:
     def reset_all_jieqian_data(self) -> bool:
         """重置所有解签数据"""
         try:
-            if os.path.exists(self.jieqian_history_path):
-                os.remove(self.jieqian_history_path)
-            if os.path.exists(self.jieqian_content_path):
-                os.remove(self.jieqian_content_path)
+            self.history_store.clear()
+            self.content_store.clear()
+            if self.self_cache is not None:
+                self.self_cache.clear()
+            if self.question_cache is not None:
+                self.question_cache.clear()
             return True
         except Exception as e:
             logger.error(f"重置所有解签数据失败: {e}")
@@ -784,59 +959,43 @@ class LLMManager:
     
     def _replace_all_variables(self, template: str, user_name: str, lingqian_data: dict, 
                               detailed_lingqian: dict, content: str, event: AstrMessageEvent) -> str:
-        """替换提示词模板中的所有变量"""
+        """替换提示词模板中的所有变量（单遍替换，模板按文本缓存编译结果）"""
         try:
-            from .variable import get_today
+            today = get_today()
             
             # 基础变量
-            result = template.replace("{user_id}", user_name)
-            result = result.replace("{nickname}", user_name)
-            result = result.replace("{card}", user_name)
-            result = result.replace("{date}", get_today())
-            result = result.replace("{today}", get_today())
-            result = result.replace("{content}", content or "")
+            values = {
+                "user_id": user_name,
+                "nickname": user_name,
+                "card": user_name,
+                "date": today,
+                "today": today,
+                "content": content or "",
+            }
             
             # 灵签相关变量
             if detailed_lingqian:
-                result = result.replace("{title}", detailed_lingqian.get('签名', ''))
-                result = result.replace("{qianxu}", str(detailed_lingqian.get('签序', '')))
-                result = result.replace("{qianming}", detailed_lingqian.get('签名', ''))
-                result = result.replace("{jixiong}", detailed_lingqian.get('吉凶', ''))
-                result = result.replace("{gongwei}", detailed_lingqian.get('宫位', ''))
+                values.update({
+                    "title": detailed_lingqian.get('签名', ''),
+                    "qianxu": str(detailed_lingqian.get('签序', '')),
+                    "qianming": detailed_lingqian.get('签名', ''),
+                    "jixiong": detailed_lingqian.get('吉凶', ''),
+                    "gongwei": detailed_lingqian.get('宫位', ''),
+                })
             elif lingqian_data:
-                result = result.replace("{title}", lingqian_data.get('qianming', ''))
-                result = result.replace("{qianxu}", str(lingqian_data.get('qianxu', '')))
-                result = result.replace("{qianming}", lingqian_data.get('qianming', ''))
-                result = result.replace("{jixiong}", lingqian_data.get('jixiong', ''))
-                result = result.replace("{gongwei}", lingqian_data.get('gongwei', ''))
+                values.update({
+                    "title": lingqian_data.get('qianming', ''),
+                    "qianxu": str(lingqian_data.get('qianxu', '')),
+                    "qianming": lingqian_data.get('qianming', ''),
+                    "jixiong": lingqian_data.get('jixiong', ''),
+                    "gongwei": lingqian_data.get('gongwei', ''),
+                })
             
             # 处理其他可能的变量（设置为空值或默认值）
-            variable_defaults = {
-                "{lqpic}": "",
-                "{jqxh}": "",
-                "{jieqian}": "",
-                "{lingqian_ranks}": "",
-                "{lingqian_history_content}": "",
-                "{lqhi_display}": "0",
-                "{lqhi_total}": "0",
-                "{lqhi_shang_total}": "0",
-                "{lqhi_zhong_total}": "0",
-                "{lqhi_xia_total}": "0",
-                "{jieqian_ranks}": "",
-                "{jieqian_history_content}": "",
-                "{jieqian_count}": "0",
-                "{jqhi_display}": "0",
-                "{jqhi_total}": "0",
-                "{jqhi_total_today}": "0",
-                "{jqhi_max}": "0",
-                "{jqhi_avg}": "0",
-                "{jqhi_min}": "0"
-            }
-            
-            for var, default_value in variable_defaults.items():
-                result = result.replace(var, default_value)
+            for var, default_value in PROMPT_VARIABLE_DEFAULTS.items():
+                values.setdefault(var, default_value)
             
-            return result
+            return render_prompt(template, values)
             
         except Exception as e:
             logger.error(f"替换提示词变量失败: {e}")
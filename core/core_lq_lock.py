@@ -0,0 +1,39 @@
+"""
+用户锁模块
+按用户ID加锁，同一用户的操作串行执行，不同用户互不影响
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+class KeyedLock:
+    """
+    按键分配的异步锁
+    锁只在有协程持有或等待时保留，最后一个使用者释放后立即回收，内存占用与并发中的键数成正比
+    """
+
+    def __init__(self):
+        self._locks = {}  # 键 -> [asyncio.Lock, 持有与等待的协程数]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        """获取指定键的锁"""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] <= 0 and self._locks.get(key) is entry:
+                del self._locks[key]
+
+    def locked(self, key) -> bool:
+        """指定键当前是否被持有"""
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    def __len__(self):
+        return len(self._locks)
@@ -0,0 +1,158 @@
+"""
+灵签元数据编译模块
+将 guanyin_lingqian/*.json 与 sort/sort.json 预编译为紧凑的元数据文件，
+运行时直接读取签名、宫位、吉凶与排序，无需再逐行解析签文
+
+用法（在插件根目录下执行）：
+    python -m core.core_lq_meta
+"""
+
+import hashlib
+import json
+import os
+import sys
+from .variable import NUMBER_TO_CHINESE, LINGQIAN_TOTAL_COUNT
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+META_FILE = "lingqian_meta.json"
+META_VERSION = 1
+
+def get_paths(plugin_dir: str = PLUGIN_DIR) -> tuple:
+    """返回 (签文目录, 排序文件, 元数据文件) 路径"""
+    return (
+        os.path.join(plugin_dir, "guanyin_lingqian"),
+        os.path.join(plugin_dir, "sort", "sort.json"),
+        os.path.join(plugin_dir, "sort", META_FILE),
+    )
+
+
+def read_sources(plugin_dir: str = PLUGIN_DIR) -> tuple:
+    """
+    读取全部源文件的原始字节
+    :return: ({签序: bytes}, 排序文件bytes)，缺失的文件不出现在结果中
+    """
+    lingqian_dir, sort_path, _ = get_paths(plugin_dir)
+    slip_bytes = {}
+    for qianxu in range(1, LINGQIAN_TOTAL_COUNT + 1):
+        path = os.path.join(lingqian_dir, f"{qianxu}.json")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                slip_bytes[qianxu] = f.read()
+
+    sort_bytes = b''
+    if os.path.exists(sort_path):
+        with open(sort_path, 'rb') as f:
+            sort_bytes = f.read()
+    return slip_bytes, sort_bytes
+
+
+def source_digest(slip_bytes: dict, sort_bytes: bytes) -> str:
+    """计算源文件内容摘要，用于判断元数据是否过期"""
+    h = hashlib.blake2b(digest_size=16)
+    for qianxu in sorted(slip_bytes):
+        h.update(f"{qianxu}:{len(slip_bytes[qianxu])}:".encode())
+        h.update(slip_bytes[qianxu])
+    h.update(b"sort:")
+    h.update(sort_bytes)
+    return h.hexdigest()
+
+
+def parse_qianming(lines: list) -> str:
+    """从内容中解析签名（格式如：观音灵签 第一签: 钟离成道）"""
+    for line in lines:
+        if '第' in line and '签:' in line:
+            if ':' in line:
+                return line.split(':', 1)[1].strip()
+            elif '：' in line:
+                return line.split('：', 1)[1].strip()
+
+    for line in lines:
+        if line.startswith('观音灵签') and ':' in line:
+            return line.split(':', 1)[1].strip()
+        elif line.startswith('观音灵签') and '：' in line:
+            return line.split('：', 1)[1].strip()
+    return "未知"
+
+
+def parse_gongwei(lines: list) -> str:
+    """从内容中解析宫位"""
+    for line in lines:
+        if line.startswith('宫位'):
+            if '：' in line:
+                return line.split('：', 1)[1].strip()
+            elif ':' in line:
+                return line.split(':', 1)[1].strip()
+            return "未知"
+    return "未知"
+
+
+def build_meta(slip_bytes: dict, sort_bytes: bytes) -> dict:
+    """由源文件字节构建元数据"""
+    sort_data = json.loads(sort_bytes.decode('utf-8')) if sort_bytes else []
+    jixiong_map = {}
+    rank_map = {}
+    for i, item in enumerate(sort_data):
+        qianxu = item.get('签序')
+        jixiong_map.setdefault(qianxu, item.get('吉凶', '未知'))
+        rank_map.setdefault(qianxu, i)
+
+    slips = []
+    for qianxu in sorted(slip_bytes):
+        content = json.loads(slip_bytes[qianxu].decode('utf-8')).get('内容', '')
+        lines = [line.strip() for line in content.split('\n')]
+        slips.append({
+            '签序': qianxu,
+            '中文签序': NUMBER_TO_CHINESE.get(qianxu, str(qianxu)),
+            '签名': parse_qianming(lines),
+            '宫位': parse_gongwei(lines),
+            '吉凶': jixiong_map.get(qianxu, "未知"),
+            '排序': rank_map.get(qianxu, len(sort_data)),
+        })
+
+    return {
+        'version': META_VERSION,
+        'digest': source_digest(slip_bytes, sort_bytes),
+        'slips': slips,
+    }
+
+
+def load_meta(path: str) -> dict:
+    """读取元数据文件，不存在或版本不符时返回None"""
+    try:
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != META_VERSION:
+            return None
+        return meta
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(meta: dict, path: str):
+    """写入元数据文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def compile_meta(plugin_dir: str = PLUGIN_DIR) -> dict:
+    """编译并写入元数据文件"""
+    slip_bytes, sort_bytes = read_sources(plugin_dir)
+    meta = build_meta(slip_bytes, sort_bytes)
+    write_meta(meta, get_paths(plugin_dir)[2])
+    return meta
+
+
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+    plugin_dir = os.path.abspath(argv[0]) if argv else PLUGIN_DIR
+    meta = compile_meta(plugin_dir)
+    print(f"已编译 {len(meta['slips'])} 支灵签元数据 -> {get_paths(plugin_dir)[2]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+用户资料缓存模块
+按 (平台, 群ID, 用户ID) 缓存平台接口返回的用户资料，支持过期时间与容量上限；
+同一用户并发的查询共用一次接口调用
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from .variable import DEFAULT_PROFILE_CACHE_TTL, DEFAULT_PROFILE_CACHE_SIZE
+
+class ProfileCache:
+    """异步用户资料缓存"""
+
+    def __init__(self, ttl: float = DEFAULT_PROFILE_CACHE_TTL, max_size: int = DEFAULT_PROFILE_CACHE_SIZE):
+        """
+        :param ttl: 资料有效期（秒），小于等于0时不缓存，但并发的查询仍共用一次接口调用
+        :param max_size: 最大缓存条数，超出时淘汰最久未使用的条目
+        """
+        self.ttl = float(ttl)
+        self.max_size = max(1, int(max_size))
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 键 -> (资料, 写入时间)
+        self._pending = {}             # 键 -> 进行中的查询任务
+
+    def configure(self, ttl: float, max_size: int = None):
+        self.ttl = float(ttl)
+        if max_size is not None:
+            self.max_size = max(1, int(max_size))
+        self._entries.clear()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def get(self, key: tuple, loader):
+        """
+        获取资料，未缓存或已过期时调用 loader 查询
+        :param key: (平台, 群ID, 用户ID)
+        :param loader: 无参数的协程函数，返回None时不缓存
+        """
+        if self.ttl > 0:
+            profile = self._lookup(key)
+            if profile is not None:
+                self.hits += 1
+                return profile
+        self.misses += 1
+
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.ensure_future(self._load(key, loader))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # 单个调用方被取消时不影响共用同一查询的其他调用方
+        return await asyncio.shield(task)
+
+    async def _load(self, key: tuple, loader):
+        profile = await loader()
+        if profile is not None and self.ttl > 0:
+            self._entries[key] = (profile, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return profile
+
+    def invalidate(self, key: tuple = None):
+        """丢弃指定（不指定时为全部）的缓存资料"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,129 @@
+"""
+解签问题去重模块
+将用户的问题规范化为标准键（折叠全角字符、去除标点与语气词、同义词归并），
+同一支签、同一标准问题、同一人格下复用已有的解签结果；每条结果每天的复用次数有上限，保持回复多样
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+from astrbot.api import logger
+from .variable import get_today, DEFAULT_QUESTION_CACHE_REUSE, DEFAULT_QUESTION_CACHE_SIZE
+
+# 同义词归并：每组的第一个词为标准词
+SYNONYM_BUCKETS = (
+    ('今天', '今日', '今儿', '当天', '本日'),
+    ('运势', '运气', '运程', '气运', '时运', '运道'),
+    ('事业', '工作', '职场', '仕途', '前程', '职业'),
+    ('财运', '财富', '钱财', '赚钱', '偏财', '正财', '收入'),
+    ('感情', '爱情', '恋爱', '姻缘', '桃花', '婚姻', '对象'),
+    ('健康', '身体', '病情', '疾病'),
+    ('学业', '考试', '学习', '读书', '升学'),
+    ('出行', '旅行', '旅游', '出门', '远行'),
+    ('怎么样', '怎样', '如何', '咋样', '好不好', '好吗', '顺利吗', '顺不顺'),
+)
+
+# 语气词与无意义的填充词，规范化时只去除问题首尾的，避免改变问题含义
+FILLER_WORDS = ('请问', '想问', '问问', '一下', '吗', '呢', '呀', '啊', '吧', '哦', '嘛')
+
+_SYNONYMS = {word: bucket[0] for bucket in SYNONYM_BUCKETS for word in bucket}
+# 较长的词优先匹配，避免“好不好”被拆开
+_SYNONYM_PATTERN = re.compile('|'.join(sorted(map(re.escape, _SYNONYMS), key=len, reverse=True)))
+_FILLER_ALTERNATION = '|'.join(sorted(map(re.escape, FILLER_WORDS), key=len, reverse=True))
+_FILLER_PATTERN = re.compile(f'^(?:{_FILLER_ALTERNATION})+|(?:{_FILLER_ALTERNATION})+$')
+
+
+def normalize_question(question: str) -> str:
+    """将问题规范化为标准键"""
+    # 全角字符折叠为半角，统一大小写
+    text = unicodedata.normalize('NFKC', question or '').lower()
+    # 去除标点、符号与空白
+    text = ''.join(ch for ch in text if unicodedata.category(ch)[0] not in 'PSZC')
+    # 先归并同义词再去除语气词，避免语气词截断同义词（如“好吗”）
+    text = _SYNONYM_PATTERN.sub(lambda m: _SYNONYMS[m.group(0)], text)
+    return _FILLER_PATTERN.sub('', text)
+
+
+class QuestionCache:
+    """按 (签序, 标准问题, 人格与提示词) 复用解签结果"""
+
+    def __init__(self, daily_reuse: int = DEFAULT_QUESTION_CACHE_REUSE, max_size: int = DEFAULT_QUESTION_CACHE_SIZE):
+        """
+        :param daily_reuse: 每条结果每天最多复用的次数，达到后重新调用LLM生成
+        :param max_size: 最大缓存条数，超出时淘汰最久未使用的条目
+        """
+        self.daily_reuse = max(1, int(daily_reuse))
+        self.max_size = max(1, int(max_size))
+        self.hits = 0
+        self.misses = 0
+        self.capped = 0  # 因达到复用上限而重新生成的次数
+        self._entries = OrderedDict()  # 键 -> {'result', 'day', 'uses'}
+
+    @classmethod
+    def from_config(cls, config) -> "QuestionCache":
+        jieqian_config = (config or {}).get('jieqian_config', {})
+        return cls(
+            daily_reuse=jieqian_config.get('question_cache_daily_reuse', DEFAULT_QUESTION_CACHE_REUSE),
+            max_size=jieqian_config.get('question_cache_size', DEFAULT_QUESTION_CACHE_SIZE),
+        )
+
+    @staticmethod
+    def make_key(qianxu, question: str, *context) -> tuple:
+        """
+        生成缓存键
+        :param context: 影响回复的其他因素，如供应商、人格提示词、解签提示词模板
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for part in context:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\x00')
+        return (int(qianxu or 0), normalize_question(question), digest.hexdigest())
+
+    def get(self, key: tuple):
+        """获取可复用的解签结果，不存在或今日复用次数已满时返回None"""
+        if not key[1]:
+            # 问题规范化后为空（只有标点或语气词），不复用
+            self.misses += 1
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        today = get_today()
+        if entry['day'] != today:
+            entry['day'] = today
+            entry['uses'] = 0
+        if entry['uses'] >= self.daily_reuse:
+            self.capped += 1
+            self.misses += 1
+            return None
+
+        entry['uses'] += 1
+        self._entries.move_to_end(key)
+        self.hits += 1
+        logger.debug(f"[QuestionCache] 复用解签结果: 第{key[0]}签「{key[1]}」(命中 {self.hits} / 未命中 {self.misses})")
+        return entry['result']
+
+    def put(self, key: tuple, result: str):
+        """保存解签结果，覆盖已达复用上限的旧结果"""
+        if not key[1]:
+            return
+        self._entries[key] = {'result': result, 'day': get_today(), 'uses': 0}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'capped': self.capped,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        self._entries.clear()
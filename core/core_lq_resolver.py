@@ -0,0 +1,138 @@
+"""
+LLM供应商与人格解析模块
+解析解签使用的LLM供应商与人格提示词并缓存结果，插件配置、供应商列表或人格列表变化时才重新解析
+"""
+
+import time
+from typing import NamedTuple, Any
+from astrbot.api import logger
+from .core_lq_breaker import provider_key
+from .variable import RESOLVER_REVALIDATE_INTERVAL
+
+class LLMResolution(NamedTuple):
+    """解析结果"""
+    provider: Any        # 供应商实例，没有可用供应商时为None
+    fallback: Any        # 备用供应商（指定供应商时为默认供应商），无备用时为None
+    provider_id: str     # 插件配置的供应商ID，使用默认供应商时为空
+    persona_name: str    # 实际使用的人格名称，未找到人格时为空
+    persona_prompt: str  # 人格提示词
+
+
+def _persona_field(persona, key: str) -> str:
+    """读取人格字段（兼容字典与对象两种格式）"""
+    if isinstance(persona, dict):
+        return persona.get(key) or ''
+    return getattr(persona, key, '') or ''
+
+
+class LLMResolver:
+    """
+    解签LLM解析器
+    - 供应商优先级：插件配置的 provider_id > 默认供应商
+    - 人格优先级：插件配置的 persona > 默认人格
+    """
+
+    def __init__(self, context, config):
+        self.context = context
+        self.config = config or {}
+        self._token = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._resolution = None
+
+    def _current_token(self) -> tuple:
+        """每次解析都比较的廉价状态：插件配置与列表的对象标识、长度，不遍历列表"""
+        jieqian_config = self.config.get('jieqian_config', {})
+        provider_manager = getattr(self.context, 'provider_manager', None)
+        personas = getattr(provider_manager, 'personas', None)
+        providers = getattr(provider_manager, 'provider_insts', None)
+        default_persona = getattr(provider_manager, 'selected_default_persona', None)
+        return (
+            jieqian_config.get('provider_id', '').strip(),
+            jieqian_config.get('persona', '').strip(),
+            id(personas), len(personas or ()),
+            id(providers), len(providers or ()),
+            _persona_field(default_persona, 'name') if default_persona else '',
+            id(getattr(provider_manager, 'curr_provider_inst', None)),
+        )
+
+    def _current_signature(self) -> tuple:
+        """完整状态：人格按名称与提示词、供应商按ID比较，列表原地修改时也能发现变化"""
+        provider_manager = getattr(self.context, 'provider_manager', None)
+        personas = getattr(provider_manager, 'personas', None) or ()
+        providers = getattr(provider_manager, 'provider_insts', None) or ()
+        return (
+            hash(tuple((_persona_field(persona, 'name'), _persona_field(persona, 'prompt')) for persona in personas)),
+            tuple(provider_key(provider) for provider in providers),
+        )
+
+    def resolve(self) -> LLMResolution:
+        """
+        获取解签使用的供应商与人格
+        廉价状态未变化时直接返回缓存；列表原地修改（标识与长度不变）最迟在完整校验间隔后发现
+        """
+        token = self._current_token()
+        now = time.monotonic()
+        if self._resolution is not None and token == self._token:
+            if now - self._checked_at < RESOLVER_REVALIDATE_INTERVAL:
+                return self._resolution
+            self._checked_at = now
+            signature = self._current_signature()
+            if signature == self._signature:
+                return self._resolution
+        else:
+            self._checked_at = now
+            signature = self._current_signature()
+
+        self._resolution = self._resolve(token[0], token[1])
+        self._token = token
+        self._signature = signature
+        return self._resolution
+
+    def _resolve(self, provider_id: str, persona_name: str) -> LLMResolution:
+        provider = self._resolve_provider(provider_id)
+        fallback = None
+        if provider_id and provider is not None:
+            fallback = self.context.get_using_provider()
+            if fallback is provider:
+                fallback = None
+        name, prompt = self._resolve_persona(persona_name)
+        return LLMResolution(provider, fallback, provider_id, name, prompt)
+
+    def _resolve_provider(self, provider_id: str):
+        # 1. 优先使用插件配置的provider_id
+        if provider_id:
+            provider = self.context.get_provider_by_id(provider_id)
+            if provider:
+                logger.debug(f"[LLMResolver] 使用指定provider: {provider_id}")
+                return provider
+            logger.warning(f"[LLMResolver] 指定的provider_id不存在: {provider_id}")
+
+        # 2. 如果没有指定provider或指定的不存在，使用默认provider
+        provider = self.context.get_using_provider()
+        if provider:
+            logger.debug("[LLMResolver] 使用默认provider")
+        return provider
+
+    def _resolve_persona(self, persona_name: str) -> tuple:
+        """:return: (人格名称, 人格提示词)"""
+        provider_manager = getattr(self.context, 'provider_manager', None)
+        personas = {}
+        for persona in getattr(provider_manager, 'personas', None) or ():
+            personas.setdefault(_persona_field(persona, 'name'), _persona_field(persona, 'prompt'))
+
+        # 使用指定的人格
+        if persona_name:
+            prompt = personas.get(persona_name)
+            if prompt:
+                logger.debug(f"[LLMResolver] 使用指定人格: {persona_name}")
+                return persona_name, prompt
+            logger.warning(f"[LLMResolver] 未找到指定人格: {persona_name}")
+
+        # 使用默认人格
+        default_persona = getattr(provider_manager, 'selected_default_persona', None)
+        default_name = _persona_field(default_persona, 'name') if default_persona else ''
+        if default_name and personas.get(default_name):
+            logger.debug(f"[LLMResolver] 使用默认人格: {default_name}")
+            return default_name, personas[default_name]
+        return '', ''
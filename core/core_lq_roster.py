@@ -0,0 +1,163 @@
+"""
+群成员缓存模块
+按群缓存成员列表，过期后先返回旧数据并在后台刷新；
+平台推送入群/退群通知时增量更新，排行榜指令不必每次都拉取完整的成员列表
+"""
+
+import asyncio
+import time
+from astrbot.api import logger
+from .variable import DEFAULT_ROSTER_TTL
+
+# OneBot 群成员变动通知类型
+NOTICE_MEMBER_JOINED = 'group_increase'
+NOTICE_MEMBER_LEFT = 'group_decrease'
+
+
+def member_from_platform(member) -> dict:
+    """将平台返回的群成员对象转换为插件使用的字典"""
+    user_id = str(member.user_id)
+    nickname = getattr(member, 'nickname', None) or user_id
+    return {
+        'user_id': user_id,
+        'nickname': nickname,
+        'card': getattr(member, 'card', None) or nickname,
+        'title': getattr(member, 'title', '') or ''
+    }
+
+
+class RosterEntry:
+    """单个群的成员缓存"""
+
+    __slots__ = ('members', 'fetched_at', 'refresh_task', 'version')
+
+    def __init__(self, members: dict):
+        self.members = members      # 用户ID -> 成员信息
+        self.fetched_at = time.monotonic()
+        self.refresh_task = None    # 进行中的拉取任务
+        self.version = 0            # 入群/退群增量更新的次数
+
+
+class RosterCache:
+    """按群ID缓存的群成员列表"""
+
+    def __init__(self, ttl: float = DEFAULT_ROSTER_TTL):
+        """
+        :param ttl: 成员列表的有效期（秒），小于等于0时不缓存，每次都重新拉取
+        """
+        self.ttl = float(ttl)
+        self._entries = {}   # 群ID -> RosterEntry
+        self._pending = {}   # 群ID -> 首次拉取任务，同一个群并发的请求共用一次拉取
+
+    def configure(self, ttl: float):
+        self.ttl = float(ttl)
+        if self.ttl <= 0:
+            self._entries.clear()
+
+    def _stale(self, entry: RosterEntry) -> bool:
+        return time.monotonic() - entry.fetched_at > self.ttl
+
+    @staticmethod
+    async def _fetch(event) -> dict:
+        group = await event.get_group()
+        if not group or not hasattr(group, 'members'):
+            return {}
+        members = {}
+        for member in group.members:
+            info = member_from_platform(member)
+            members[info['user_id']] = info
+        return members
+
+    async def get(self, event) -> dict:
+        """
+        获取消息所在群的成员（用户ID -> 成员信息）
+        缓存过期时返回旧数据并在后台刷新，没有缓存时等待拉取完成
+        """
+        group_id = str(event.get_group_id() or '')
+        if not group_id:
+            return {}
+        if self.ttl <= 0:
+            return await self._fetch(event)
+
+        entry = self._entries.get(group_id)
+        if entry is not None:
+            if self._stale(entry) and entry.refresh_task is None:
+                entry.refresh_task = asyncio.create_task(self._refresh(group_id, event, entry))
+            return entry.members
+
+        task = self._pending.get(group_id)
+        if task is None:
+            task = self._pending[group_id] = asyncio.create_task(self._fetch(event))
+            task.add_done_callback(lambda _: self._pending.pop(group_id, None))
+        members = await asyncio.shield(task)
+        if members and group_id not in self._entries:
+            self._entries[group_id] = RosterEntry(members)
+        return members
+
+    async def _refresh(self, group_id: str, event, entry: RosterEntry):
+        """后台刷新成员列表，失败时保留旧数据，下次读取时重试"""
+        try:
+            members = await self._fetch(event)
+            if members:
+                self._entries[group_id] = RosterEntry(members)
+                logger.debug(f"[RosterCache] 已刷新群 {group_id} 成员列表: {len(members)} 人")
+        except Exception as e:
+            logger.error(f"[RosterCache] 刷新群 {group_id} 成员列表失败: {e}")
+        finally:
+            entry.refresh_task = None
+
+    def member_joined(self, group_id, user_id):
+        """
+        记录新成员入群
+        通知中只有用户ID，先以ID作为昵称加入，并让缓存在下次读取时于后台刷新
+        """
+        entry = self._entries.get(str(group_id))
+        if entry is None:
+            return
+        user_id = str(user_id)
+        entry.members.setdefault(user_id, {'user_id': user_id, 'nickname': user_id, 'card': user_id, 'title': ''})
+        entry.fetched_at = 0.0
+        entry.version += 1
+
+    def member_left(self, group_id, user_id):
+        """记录成员退群"""
+        entry = self._entries.get(str(group_id))
+        if entry is not None:
+            entry.members.pop(str(user_id), None)
+            entry.version += 1
+
+    def handle_notice(self, raw_message) -> bool:
+        """
+        处理平台推送的群成员变动通知（目前支持 OneBot 的 group_increase / group_decrease）
+        :return: 是否为群成员变动通知
+        """
+        if not isinstance(raw_message, dict) or raw_message.get('post_type') != 'notice':
+            return False
+        notice_type = raw_message.get('notice_type')
+        group_id = raw_message.get('group_id')
+        user_id = raw_message.get('user_id')
+        if not group_id or not user_id:
+            return False
+        if notice_type == NOTICE_MEMBER_JOINED:
+            self.member_joined(group_id, user_id)
+        elif notice_type == NOTICE_MEMBER_LEFT:
+            self.member_left(group_id, user_id)
+        else:
+            return False
+        logger.debug(f"[RosterCache] 群 {group_id} 成员变动: {notice_type} {user_id}")
+        return True
+
+    def version(self, group_id) -> int:
+        """群成员缓存的增量更新版本，成员列表重新拉取后从0开始"""
+        entry = self._entries.get(str(group_id))
+        return entry.version if entry else 0
+
+    def invalidate(self, group_id=None):
+        """丢弃指定群（不指定时为全部）的缓存"""
+        if group_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(str(group_id), None)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,174 @@
+"""
+SQLite存储后端模块
+将灵签、解签历史与解签内容按行保存在本地SQLite数据库中
+"""
+
+import json
+import os
+import sqlite3
+from astrbot.api import logger
+
+# 数据布局
+LAYOUT_DAY_RECORD = 'day_record'  # {user_id: {date: record}}，如灵签历史
+LAYOUT_DAY_LIST = 'day_list'      # {user_id: {date: [item, ...]}}，如解签历史
+LAYOUT_USER_LIST = 'user_list'    # {user_id: [item, ...]}，item中带date字段，如解签内容
+
+class SqliteBackend:
+    """SQLite存储后端 - 每个存储对应一张表，同一数据库文件共享一个连接"""
+
+    _connections = {}  # 数据库路径 -> [连接, 引用计数]
+
+    def __init__(self, db_path: str, table: str, layout: str):
+        """
+        :param db_path: 数据库文件路径
+        :param table: 表名
+        :param layout: 数据布局，决定内存字典与数据行之间的转换方式
+        """
+        self.db_path = db_path
+        self.table = table
+        self.layout = layout
+        self.conn = self._acquire(db_path)
+        self._ensure_schema()
+
+    @classmethod
+    def _acquire(cls, db_path: str) -> sqlite3.Connection:
+        """获取共享连接"""
+        entry = cls._connections.get(db_path)
+        if entry is None:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            entry = cls._connections[db_path] = [conn, 0]
+        entry[1] += 1
+        return entry[0]
+
+    def release(self):
+        """释放共享连接，最后一个使用者负责关闭"""
+        entry = self._connections.get(self.db_path)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            try:
+                entry[0].commit()
+                entry[0].close()
+            finally:
+                self._connections.pop(self.db_path, None)
+
+    def _ensure_schema(self):
+        """建表并创建 (user_id, date) 索引"""
+        t = self.table
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {t} ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id TEXT NOT NULL, "
+            "date TEXT NOT NULL, "
+            "data TEXT NOT NULL)"
+        )
+        unique = "UNIQUE " if self.layout == LAYOUT_DAY_RECORD else ""
+        self.conn.execute(f"CREATE {unique}INDEX IF NOT EXISTS idx_{t}_user_date ON {t}(user_id, date)")
+        self.conn.commit()
+
+    # ==================== 行与字典的转换 ====================
+
+    def _rows(self, user_id: str, value):
+        """将一个用户的数据转换为数据行"""
+        if value is None:
+            return
+        if self.layout == LAYOUT_USER_LIST:
+            for item in value:
+                date = item.get('date', '') if isinstance(item, dict) else ''
+                yield user_id, date, json.dumps(item, ensure_ascii=False)
+        elif self.layout == LAYOUT_DAY_LIST:
+            for date, items in value.items():
+                for item in items if isinstance(items, list) else []:
+                    yield user_id, date, json.dumps(item, ensure_ascii=False)
+        else:
+            for date, record in value.items():
+                yield user_id, date, json.dumps(record, ensure_ascii=False)
+
+    def _put(self, data: dict, user_id: str, date: str, value):
+        """将一行数据放回内存字典"""
+        if self.layout == LAYOUT_USER_LIST:
+            data.setdefault(user_id, []).append(value)
+        elif self.layout == LAYOUT_DAY_LIST:
+            data.setdefault(user_id, {}).setdefault(date, []).append(value)
+        else:
+            data.setdefault(user_id, {})[date] = value
+
+    # ==================== 读写 ====================
+
+    def load(self) -> dict:
+        """加载整张表为内存字典"""
+        data = {}
+        for user_id, date, raw in self.conn.execute(
+                f"SELECT user_id, date, data FROM {self.table} ORDER BY id"):
+            try:
+                self._put(data, user_id, date, json.loads(raw))
+            except ValueError:
+                logger.warning(f"[SqliteBackend] {self.table} 中存在无法解析的记录: {user_id} {date}")
+        return data
+
+    def is_empty(self) -> bool:
+        return self.conn.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone() is None
+
+    def writes_row(self, entry: dict) -> bool:
+        """该操作能否直接按行写入；否则需要按数据重写该用户（整体替换时为整张表）的数据行"""
+        op = entry.get('op')
+        length = len(entry.get('path') or [])
+        return ((op == 'append' and self.layout == LAYOUT_DAY_LIST and length == 2)
+                or (op == 'append' and self.layout == LAYOUT_USER_LIST and length == 1)
+                or (op == 'set' and self.layout == LAYOUT_DAY_RECORD and length == 2))
+
+    def apply(self, entry: dict, data: dict):
+        """
+        将一条存储操作同步到数据表（不提交事务）
+        追加与单日写入直接按行执行，其余操作重写该用户的数据行
+        :param data: 操作后的数据，只需包含受影响的用户；按行写入时不使用
+        """
+        op = entry.get('op')
+        path = entry.get('path') or []
+
+        if op == 'replace' or not path:
+            self.rewrite_all(data)
+        elif op == 'append' and self.layout == LAYOUT_DAY_LIST and len(path) == 2:
+            self._insert([(path[0], path[1], json.dumps(entry.get('value'), ensure_ascii=False))])
+        elif op == 'append' and self.layout == LAYOUT_USER_LIST and len(path) == 1:
+            self._insert(self._rows(path[0], [entry.get('value')]))
+        elif op == 'set' and self.layout == LAYOUT_DAY_RECORD and len(path) == 2:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (user_id, date, data) VALUES (?, ?, ?)",
+                (path[0], path[1], json.dumps(entry.get('value'), ensure_ascii=False))
+            )
+        else:
+            self.rewrite_user(path[0], data)
+
+    def _insert(self, rows):
+        self.conn.executemany(
+            f"INSERT INTO {self.table} (user_id, date, data) VALUES (?, ?, ?)", rows
+        )
+
+    def rewrite_user(self, user_id: str, data: dict):
+        """按内存数据重写单个用户的数据行"""
+        self.conn.execute(f"DELETE FROM {self.table} WHERE user_id = ?", (user_id,))
+        self._insert(self._rows(user_id, data.get(user_id)))
+
+    def rewrite_all(self, data: dict):
+        """按内存数据重写整张表"""
+        self.conn.execute(f"DELETE FROM {self.table}")
+        for user_id, value in data.items():
+            self._insert(self._rows(user_id, value))
+
+    def write(self, batch: list):
+        """
+        执行一批存储操作并提交，失败时回滚整批（在I/O线程池中执行）
+        :param batch: [(操作, 操作后的数据)]
+        """
+        try:
+            for entry, data in batch:
+                self.apply(entry, data)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
@@ -0,0 +1,664 @@
+"""
+数据存储模块
+常驻内存的历史数据存储，由后台任务合并写回磁盘
+
+支持三种持久化模式：
+- snapshot: 修改后由后台任务整体写回数据文件
+- journal: 每次修改以一行JSON追加到日志文件，定期压缩为数据文件快照，
+  启动时加载快照后重放日志尾部以恢复崩溃前的修改
+- sqlite: 修改暂存为待写入的操作，由后台任务在I/O线程池中按行写入本地SQLite数据库并合并提交
+
+运行中的写回在I/O线程池中执行，事件循环中只复制容器结构，序列化与写入都在线程池中完成
+数据文件通过临时文件落盘后替换写入，并保留最近几份旧快照；加载时数据文件损坏则从最新的有效快照恢复
+按日布局的数据同时维护按日索引（date -> {user_id: ...}），随每次写入同步更新
+"""
+
+import json
+import os
+import asyncio
+from astrbot.api import logger
+from .variable import DEFAULT_FLUSH_INTERVAL, DEFAULT_COMPACT_THRESHOLD, DEFAULT_BACKUP_COUNT, STORAGE_MODE, SQLITE_DB_FILE
+from .core_lq_sqlite import SqliteBackend, LAYOUT_DAY_RECORD, LAYOUT_DAY_LIST, LAYOUT_USER_LIST
+from .core_lq_io import run_io, file_lock, write_file_atomic, backup_paths
+from .core_lq_index import DayIndex
+
+class HistoryStore:
+    """历史数据存储 - 内存为准，延迟写回"""
+
+    def __init__(self, path: str, name: str = "", flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 mode: str = STORAGE_MODE['SNAPSHOT'], compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+                 layout: str = LAYOUT_DAY_RECORD, backup_count: int = DEFAULT_BACKUP_COUNT):
+        """
+        :param path: 数据文件路径
+        :param name: 存储名称（用于日志）
+        :param flush_interval: 写回间隔（秒），小于等于0时每次修改立即写回
+        :param mode: 持久化模式，snapshot、journal 或 sqlite
+        :param compact_threshold: journal 模式下触发压缩的日志条数
+        :param layout: 数据布局，sqlite 模式下用于转换数据行
+        :param backup_count: 写入数据文件时保留的旧快照份数，0为不保留
+        """
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.name = name or os.path.basename(path)
+        self.flush_interval = flush_interval
+        self.mode = mode if mode in STORAGE_MODE.values() else STORAGE_MODE['SNAPSHOT']
+        self.compact_threshold = max(1, int(compact_threshold))
+        self.backup_count = max(0, int(backup_count))
+        self._dirty = False
+        self._flush_task = None
+        self._journal = None
+        self._journal_count = 0
+        self._pending = None  # 快照写入期间暂存的日志条目，None 表示直接写日志
+        self._tasks = set()   # 立即写回的后台任务
+        self._sql_pending = []  # sqlite 模式下待写入的 (操作, 操作后的数据)
+        self.layout = layout
+        self.backend = None
+        # 按日索引，仅用于 {user_id: {date: ...}} 布局
+        self.day_index = DayIndex(layout) if layout in (LAYOUT_DAY_RECORD, LAYOUT_DAY_LIST) else None
+
+        if self.mode == STORAGE_MODE['SQLITE']:
+            self.backend = SqliteBackend(
+                os.path.join(os.path.dirname(path), SQLITE_DB_FILE),
+                os.path.splitext(os.path.basename(path))[0],
+                layout
+            )
+            self.data = self.backend.load()
+            if self.backend.is_empty() and os.path.exists(path):
+                logger.info(f"[HistoryStore] 检测到{self.name}的JSON数据文件，可使用 lq migrate --confirm 导入SQLite")
+        else:
+            self.data = self._load()
+            self._recover_journal()
+        self._reindex()
+
+    @classmethod
+    def from_config(cls, path: str, name: str, config, layout: str = LAYOUT_DAY_RECORD) -> 'HistoryStore':
+        """根据插件配置创建存储"""
+        config = config or {}
+        return cls(
+            path, name,
+            flush_interval=float(config.get('storage_flush_interval', DEFAULT_FLUSH_INTERVAL)),
+            mode=config.get('storage_mode', STORAGE_MODE['SNAPSHOT']),
+            compact_threshold=int(config.get('storage_compact_threshold', DEFAULT_COMPACT_THRESHOLD)),
+            layout=layout,
+            backup_count=int(config.get('storage_backup_count', DEFAULT_BACKUP_COUNT)),
+        )
+
+    @property
+    def journal_mode(self) -> bool:
+        return self.mode == STORAGE_MODE['JOURNAL']
+
+    # ==================== 加载与恢复 ====================
+
+    @staticmethod
+    def _read_snapshot(path: str):
+        """读取一份快照，文件不存在时返回None，内容损坏时抛出异常"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("数据格式错误")
+        return data
+
+    def _load(self) -> dict:
+        """
+        从磁盘加载数据（仅在启动时调用一次）
+        数据文件损坏或缺失时，依次尝试旧快照，使用最新的有效快照
+        """
+        candidates = [self.path] + backup_paths(self.path, self.backup_count)
+        corrupted = False
+        for path in candidates:
+            try:
+                data = self._read_snapshot(path)
+            except Exception as e:
+                logger.error(f"[HistoryStore] 加载{self.name}失败（{os.path.basename(path)}）: {e}")
+                if path == self.path:
+                    corrupted = True
+                continue
+            if data is None:
+                continue
+            if path != self.path:
+                logger.warning(f"[HistoryStore] {self.name} 已从旧快照 {os.path.basename(path)} 恢复")
+                # 恢复的数据写回数据文件
+                self._dirty = True
+            break
+        else:
+            data = {}
+
+        if corrupted:
+            # 损坏的文件移到一旁，避免被轮转进旧快照或被空数据覆盖
+            try:
+                os.replace(self.path, f"{self.path}.corrupt")
+                logger.warning(f"[HistoryStore] {self.name} 损坏的数据文件已保存为 {os.path.basename(self.path)}.corrupt")
+            except OSError as e:
+                logger.error(f"[HistoryStore] 移动损坏的{self.name}失败: {e}")
+        return data
+
+    def _snapshot_identity(self):
+        """数据文件的标识，用于判断日志是否基于当前快照"""
+        try:
+            st = os.stat(self.path)
+            return [st.st_ino, st.st_size, st.st_mtime_ns]
+        except OSError:
+            return None
+
+    def _recover_journal(self):
+        """重放日志尾部，恢复上次未压缩的修改"""
+        if not os.path.exists(self.journal_path):
+            return
+
+        replayed = 0
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                header = f.readline()
+                try:
+                    base = json.loads(header).get('base') if header.strip() else None
+                except ValueError:
+                    base = None
+
+                if header.strip() and base == self._snapshot_identity():
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # 最后一行可能因崩溃只写了一半，丢弃之后的内容
+                            logger.warning(f"[HistoryStore] {self.name} 日志尾部不完整，已截断")
+                            break
+                        self._apply(entry)
+                        replayed += 1
+                elif header.strip():
+                    logger.debug(f"[HistoryStore] {self.name} 日志已包含在快照中，跳过重放")
+        except Exception as e:
+            logger.error(f"[HistoryStore] 重放{self.name}日志失败: {e}")
+
+        if replayed:
+            logger.info(f"[HistoryStore] {self.name} 已从日志恢复 {replayed} 条修改")
+
+        # 将恢复结果压缩为新快照，并丢弃旧日志
+        if replayed:
+            self._dirty = True
+        self.compact()
+
+    # ==================== 数据操作 ====================
+
+    def _walk(self, keys, create: bool):
+        """沿路径找到容器，create 为 True 时自动创建中间层"""
+        node = self.data
+        for key in keys:
+            if key not in node:
+                if not create:
+                    return None
+                node[key] = {}
+            node = node[key]
+        return node
+
+    def _apply(self, entry: dict):
+        """将一条操作应用到内存数据"""
+        op = entry.get('op')
+        path = entry.get('path') or []
+        if op == 'replace':
+            self.data = entry.get('value') or {}
+            return
+        if not path:
+            return
+
+        if op == 'set':
+            self._walk(path[:-1], True)[path[-1]] = entry.get('value')
+        elif op == 'append':
+            parent = self._walk(path[:-1], True)
+            if not isinstance(parent.get(path[-1]), list):
+                parent[path[-1]] = []
+            parent[path[-1]].append(entry.get('value'))
+        elif op == 'pop':
+            parent = self._walk(path[:-1], False)
+            items = parent.get(path[-1]) if parent is not None else None
+            index = entry.get('index', -1)
+            if isinstance(items, list) and -len(items) <= index < len(items):
+                items.pop(index)
+                if not items:
+                    self._delete(path)
+        elif op == 'delete':
+            self._delete(path)
+
+    def _delete(self, path):
+        """删除路径上的键，并清理因此变空的上层容器"""
+        parents = [self.data]
+        for key in path[:-1]:
+            node = parents[-1].get(key)
+            if not isinstance(node, dict):
+                return
+            parents.append(node)
+        parents[-1].pop(path[-1], None)
+        for depth in range(len(path) - 1, 0, -1):
+            if parents[depth]:
+                break
+            parents[depth - 1].pop(path[depth - 1], None)
+
+    def _reindex(self):
+        """由内存数据重建按日索引"""
+        if self.day_index is not None:
+            self.day_index.rebuild(self.data)
+
+    def _apply_indexed(self, entry: dict):
+        """将一条操作应用到内存数据，并同步受影响用户的按日索引"""
+        path = entry.get('path') or []
+        if self.day_index is None or not path:
+            self._apply(entry)
+            if entry.get('op') == 'replace':
+                self._reindex()
+            return
+
+        user_id = path[0]
+        user_data = self.data.get(user_id)
+        # 路径指向某一天时只影响这一天，指向用户时影响该用户修改前后的所有日期
+        dates = [path[1]] if len(path) > 1 else list(user_data if isinstance(user_data, dict) else ())
+        self._apply(entry)
+        user_data = self.data.get(user_id)
+        if not isinstance(user_data, dict):
+            user_data = {}
+        if len(path) == 1:
+            dates.extend(user_data)
+        for date in dates:
+            self.day_index.update(user_id, date, user_data.get(date))
+
+    def _record(self, entry: dict):
+        """应用一条操作并持久化"""
+        self._apply_indexed(entry)
+        if self.backend is not None:
+            self._queue_sql(entry)
+        elif self.journal_mode:
+            self._append_journal(entry)
+        else:
+            self.mark_dirty()
+
+    def _queue_sql(self, entry: dict):
+        """
+        暂存待写入SQLite的操作，由写回任务在I/O线程池中执行
+        需要重写数据行的操作在事件循环中附带受影响数据的副本，写入时不再读取会被修改的内存数据
+        """
+        path = entry.get('path') or []
+        if entry.get('op') == 'replace' or not path:
+            data = self._snapshot()
+        elif self.backend.writes_row(entry):
+            data = None
+        else:
+            user_data = self.data.get(path[0])
+            data = {} if user_data is None else {path[0]: self._copy_user(user_data)}
+        self._sql_pending.append((entry, data))
+        self.mark_dirty()
+
+    def set(self, path: list, value):
+        """设置路径上的值"""
+        self._record({'op': 'set', 'path': list(path), 'value': value})
+
+    def append(self, path: list, value):
+        """向路径上的列表追加元素"""
+        self._record({'op': 'append', 'path': list(path), 'value': value})
+
+    def pop(self, path: list, index: int):
+        """移除路径上列表的指定元素，列表为空时一并删除"""
+        self._record({'op': 'pop', 'path': list(path), 'index': index})
+
+    def delete(self, path: list):
+        """删除路径上的值，并清理变空的上层容器"""
+        self._record({'op': 'delete', 'path': list(path)})
+
+    def replace(self, data: dict):
+        """整体替换内存数据"""
+        if data is not self.data:
+            self.data = data
+        self._reindex()
+        if self.backend is not None:
+            self._queue_sql({'op': 'replace'})
+        elif self.journal_mode:
+            # 任意修改无法用单条日志表示，需要压缩为新快照；之后的修改在新日志就绪前暂存
+            self._dirty = True
+            if self._has_loop():
+                self._pause_journal()
+                self._schedule_flush()
+            else:
+                self.compact()
+        else:
+            self.mark_dirty()
+
+    def import_data(self, data: dict) -> int:
+        """
+        合并导入外部数据（用于从JSON文件迁移），已存在的记录保持不变
+        与其他修改一样由写回任务持久化，需要立即落盘时调用方再 await flush_async()
+        :return: 导入的记录数
+        """
+        imported = 0
+        for user_id, value in (data or {}).items():
+            if self.layout == LAYOUT_USER_LIST:
+                if user_id in self.data or not isinstance(value, list) or not value:
+                    continue
+                self.set([user_id], value)
+                imported += len(value)
+            else:
+                if not isinstance(value, dict):
+                    continue
+                existing = self.data.get(user_id, {})
+                for date, record in value.items():
+                    if date in existing:
+                        continue
+                    if self.layout == LAYOUT_DAY_LIST:
+                        if not isinstance(record, list):
+                            continue
+                        for item in record:
+                            self.append([user_id, date], item)
+                        imported += len(record)
+                    else:
+                        self.set([user_id, date], record)
+                        imported += 1
+        return imported
+
+    # ==================== 持久化 ====================
+
+    def _append_journal(self, entry: dict):
+        """向日志追加一行"""
+        if self._pending is not None:
+            self._pending.append(entry)
+            return
+        try:
+            if self._journal is None:
+                self._open_journal()
+            self._journal.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._journal.flush()
+            self._journal_count += 1
+        except Exception as e:
+            # 日志写入失败时退回到整体写回，保证修改不丢失
+            logger.error(f"[HistoryStore] 写入{self.name}日志失败: {e}")
+            self._dirty = True
+            self._ensure_flush_task()
+            return
+
+        if self._journal_count >= self.compact_threshold:
+            self._ensure_flush_task()
+
+    def _write_journal_header(self):
+        """新建日志文件，写入基于当前快照的头部"""
+        payload = json.dumps({'base': self._snapshot_identity()}) + '\n'
+        write_file_atomic(self.journal_path, payload.encode('utf-8'))
+
+    def _open_journal(self):
+        """打开日志文件，新建时写入基于当前快照的头部"""
+        self._close_journal()
+        self._write_journal_header()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal_count = 0
+
+    def _pause_journal(self):
+        """暂停写日志，之后的条目暂存在内存中直到新日志就绪"""
+        self._close_journal()
+        if self._pending is None:
+            self._pending = []
+
+    def _resume_journal(self, rebased: bool):
+        """
+        恢复写日志并写入暂存的条目
+        :param rebased: 是否已基于新快照重建日志；否则继续追加到原日志
+        """
+        pending, self._pending = self._pending or [], None
+        if rebased or not os.path.exists(self.journal_path):
+            if not rebased:
+                self._write_journal_header()
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_count = 0
+        else:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        for entry in pending:
+            self._append_journal(entry)
+
+    def _close_journal(self):
+        if self._journal is not None:
+            try:
+                self._journal.close()
+            except Exception:
+                pass
+            self._journal = None
+
+    def _snapshot(self) -> dict:
+        """
+        复制内存数据的容器结构（在事件循环中执行，保证快照一致）
+        存储只会原地修改用户与日期层的字典和列表，记录本身总是整体替换，因此只需复制到列表这一层
+        """
+        return {user_id: self._copy_user(user_data) for user_id, user_data in self.data.items()}
+
+    @staticmethod
+    def _copy_user(user_data):
+        """复制单个用户数据的容器结构"""
+        if isinstance(user_data, dict):
+            return {key: list(value) if isinstance(value, list) else value for key, value in user_data.items()}
+        if isinstance(user_data, list):
+            return list(user_data)
+        return user_data
+
+    @staticmethod
+    def _serialize(data: dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _write_snapshot(self, data: dict = None):
+        """将数据（默认为内存数据）整体写入数据文件"""
+        write_file_atomic(self.path, self._serialize(self.data if data is None else data), self.backup_count)
+
+    @staticmethod
+    def _has_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def mark_dirty(self):
+        """标记数据已修改，等待后台任务写回"""
+        self._dirty = True
+        if self.flush_interval <= 0:
+            if self._has_loop():
+                self._schedule_flush()
+            else:
+                self.flush()
+            return
+        self._ensure_flush_task()
+
+    def _schedule_flush(self):
+        """立即在后台写回一次"""
+        task = asyncio.get_running_loop().create_task(self.flush_async())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _ensure_flush_task(self):
+        """确保后台写回任务在运行，没有事件循环时直接写回"""
+        if not self._has_loop():
+            # 没有运行中的事件循环（如脚本调用），直接写回
+            self.flush()
+            return
+
+        if self._flush_task is None or self._flush_task.done():
+            self.start()
+
+    def flush(self) -> bool:
+        """将内存数据写回磁盘（无修改时跳过）"""
+        if self.backend is not None:
+            if not self._dirty:
+                return True
+            batch, self._sql_pending = self._sql_pending, []
+            try:
+                self._dirty = False
+                self.backend.write(batch)
+                return True
+            except Exception as e:
+                self._sql_pending = batch + self._sql_pending
+                self._dirty = True
+                logger.error(f"[HistoryStore] 提交{self.name}失败: {e}")
+                return False
+
+        if self.journal_mode:
+            if self._dirty or self._journal_count >= self.compact_threshold:
+                return self.compact()
+            return True
+
+        if not self._dirty:
+            return True
+        try:
+            self._dirty = False
+            self._write_snapshot()
+            return True
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"[HistoryStore] 保存{self.name}失败: {e}")
+            return False
+
+    async def flush_async(self) -> bool:
+        """将内存数据写回磁盘，文件写入在I/O线程池中执行"""
+        if self.backend is not None:
+            # 同一数据库的存储共用连接，按数据库加锁使每批写入独占一次提交
+            async with file_lock(self.backend.db_path):
+                if not self._dirty:
+                    return True
+                batch, self._sql_pending = self._sql_pending, []
+                self._dirty = False
+                try:
+                    await run_io(self.backend.write, batch)
+                    return True
+                except Exception as e:
+                    self._sql_pending = batch + self._sql_pending
+                    self._dirty = True
+                    logger.error(f"[HistoryStore] 提交{self.name}失败: {e}")
+                    return False
+
+        if self.journal_mode:
+            if self._dirty or self._journal_count >= self.compact_threshold:
+                return await self.compact_async()
+            return True
+
+        async with file_lock(self.path):
+            if not self._dirty:
+                return True
+            snapshot = self._snapshot()
+            self._dirty = False
+            try:
+                await run_io(self._write_snapshot, snapshot)
+                return True
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"[HistoryStore] 保存{self.name}失败: {e}")
+                return False
+
+    def _write_compaction(self, snapshot: dict):
+        """写入快照并以其为基础新建日志（在I/O线程池中执行）"""
+        if snapshot is not None:
+            self._write_snapshot(snapshot)
+        self._write_journal_header()
+
+    async def compact_async(self) -> bool:
+        """
+        异步压缩：事件循环中复制快照，I/O线程池中序列化并写入快照与新日志头部
+        写入期间的修改暂存在内存中，新日志就绪后再写入；取快照前暂存的条目已包含在快照中，不再写入新日志
+        """
+        async with file_lock(self.path):
+            if not (self._dirty or self._journal_count or self._pending is not None
+                    or not os.path.exists(self.path)):
+                return True
+            snapshot = None
+            if self.data or os.path.exists(self.path):
+                snapshot = self._snapshot()
+            # 取快照与清空暂存条目之间没有 await，保证新日志只记录快照之后的修改
+            included = self._pending or []
+            self._pause_journal()
+            self._pending = []
+            self._dirty = False
+            try:
+                await run_io(self._write_compaction, snapshot)
+                rebased = True
+            except Exception as e:
+                self._dirty = True
+                rebased = False
+                # 快照未写入，暂存的条目仍需追加到原日志
+                self._pending = included + self._pending
+                logger.error(f"[HistoryStore] 压缩{self.name}失败: {e}")
+
+            # 写入期间数据被整体替换时，暂存的条目需等待下一次压缩
+            if self._dirty and rebased:
+                self._ensure_flush_task()
+                return True
+            self._resume_journal(rebased)
+            return rebased
+
+    def compact(self) -> bool:
+        """将内存数据压缩为快照，并以新快照为基础重新开始日志"""
+        try:
+            if self._dirty or self._journal_count or self._pending or not os.path.exists(self.path):
+                if self.data or os.path.exists(self.path):
+                    self._write_snapshot()
+            self._dirty = False
+            if self.journal_mode:
+                self._close_journal()
+                self._write_journal_header()
+                # 暂存的条目已包含在刚写入的快照中
+                self._pending = None
+                self._resume_journal(True)
+            else:
+                self._close_journal()
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+            return True
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"[HistoryStore] 压缩{self.name}失败: {e}")
+            return False
+
+    def clear(self) -> bool:
+        """清空内存数据并删除磁盘文件"""
+        self._close_journal()
+        self.data = {}
+        self._reindex()
+        self._dirty = False
+        self._pending = None
+        self._journal_count = 0
+        if self.backend is not None:
+            # 与其他修改一样由写回任务执行，避免与进行中的写入交错
+            self._queue_sql({'op': 'replace'})
+        for path in [self.path, self.journal_path] + backup_paths(self.path, self.backup_count):
+            if os.path.exists(path):
+                os.remove(path)
+        return True
+
+    def start(self):
+        """启动后台写回任务"""
+        if self.flush_interval <= 0 and not self.journal_mode:
+            return
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """后台写回循环，合并间隔内的多次修改为一次写入"""
+        interval = self.flush_interval if self.flush_interval > 0 else DEFAULT_FLUSH_INTERVAL
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush_async()
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self):
+        """停止后台任务并写回剩余修改"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.journal_mode and (self._journal_count or self._pending is not None):
+            await self.compact_async()
+        else:
+            await self.flush_async()
+        self._close_journal()
+        if self.backend is not None:
+            self.backend.release()
+            self.backend = None
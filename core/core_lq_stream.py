@@ -0,0 +1,105 @@
+"""
+流式输出模块
+读取供应商的增量输出，并按句子切分为适合逐条发送的片段
+"""
+
+import asyncio
+
+# 句末标点，片段优先在这些位置切分
+SENTENCE_ENDINGS = '。！？!?；;…\n'
+
+class SentenceChunker:
+    """将增量文本切分为片段：达到最小长度后在句末切分，长时间没有句末时按最大长度强制切分"""
+
+    def __init__(self, chunk_size: int, replace: tuple = None):
+        """
+        :param chunk_size: 片段的最小字数，强制切分的长度为其两倍
+        :param replace: (原文, 替换文本)，切分前在累积的文本上替换，跨增量片段的原文也能完整替换
+        """
+        self.chunk_size = max(1, int(chunk_size))
+        self.replace = replace if replace and replace[0] else None
+        self._buffer = ""
+        self._pending = ""  # 可能是待替换原文开头的尾部文本，等待后续增量再决定
+
+    def _substitute(self, text: str) -> str:
+        """替换累积文本中的原文，保留可能与后续增量组成原文的尾部"""
+        old, new = self.replace
+        text = self._pending + text
+        hold = 0
+        for size in range(min(len(old) - 1, len(text)), 0, -1):
+            if text.endswith(old[:size]):
+                hold = size
+                break
+        # 保留的尾部不能与已完整出现的原文重叠
+        last = text.rfind(old)
+        if last >= 0:
+            hold = min(hold, len(text) - last - len(old))
+        cut = len(text) - hold
+        self._pending = text[cut:]
+        return text[:cut].replace(old, new)
+
+    def _find_cut(self):
+        for i in range(self.chunk_size - 1, len(self._buffer)):
+            if self._buffer[i] in SENTENCE_ENDINGS:
+                return i + 1
+        if len(self._buffer) >= self.chunk_size * 2:
+            return self.chunk_size * 2
+        return None
+
+    def feed(self, text: str) -> list:
+        """追加文本，返回已可发送的片段"""
+        if self.replace:
+            text = self._substitute(text)
+        self._buffer += text
+        chunks = []
+        while len(self._buffer) >= self.chunk_size:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunk, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self) -> str:
+        """取出剩余的文本"""
+        rest, self._buffer = (self._buffer + self._pending).strip(), ""
+        self._pending = ""
+        return rest
+
+
+async def iter_completion_text(responses, timeout: float):
+    """
+    逐段产出供应商流式回复中的增量文本
+    兼容两种输出：增量片段（is_chunk 为 True）与最后一次性返回的完整回复
+    :param responses: 供应商 text_chat_stream 返回的异步迭代器
+    :param timeout: 整个回复的超时时间（秒）
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    iterator = responses.__aiter__()
+    received = ""
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            try:
+                response = await asyncio.wait_for(iterator.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            text = getattr(response, 'completion_text', None) or ""
+            if getattr(response, 'is_chunk', True):
+                received += text
+                yield text
+            elif text.startswith(received) and len(text) > len(received):
+                # 完整回复中还有未以增量形式产出的部分
+                yield text[len(received):]
+                received = text
+    finally:
+        aclose = getattr(iterator, 'aclose', None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
@@ -0,0 +1,180 @@
+"""
+模板模块
+提供按需解析的模板变量字典，以及消息模板、提示词模板的预编译与单遍渲染
+"""
+
+import re
+from functools import lru_cache
+from string import Formatter
+from astrbot.api import logger
+
+# 包含消息模板的配置分组
+TEMPLATE_CONFIG_GROUPS = ('lingqian_config', 'jieqian_config')
+
+class LazyVariables(dict):
+    """
+    惰性模板变量字典
+    普通变量直接存放；代价较高的变量注册为解析函数，仅在模板实际引用时计算一次
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._resolvers = {}
+
+    def lazy(self, key: str, resolver):
+        """注册惰性变量，resolver 为无参函数"""
+        self.pop(key, None)
+        self._resolvers[key] = resolver
+
+    def __missing__(self, key):
+        resolver = self._resolvers.pop(key, None)
+        if resolver is None:
+            raise KeyError(key)
+        value = resolver()
+        self[key] = value
+        return value
+
+    def __contains__(self, key):
+        return super().__contains__(key) or key in self._resolvers
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        self._resolvers.pop(key, None)
+        super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def copy(self):
+        copied = LazyVariables(super().copy())
+        copied._resolvers = dict(self._resolvers)
+        return copied
+
+
+_formatter = Formatter()
+
+class CompiledTemplate:
+    """
+    预编译的消息模板（str.format 语法）
+    模板只解析一次为片段列表，渲染时单遍拼接
+    """
+
+    __slots__ = ('text', 'segments', 'fields', 'error', '_splits')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.error = None
+        self._splits = {}
+        segments = []
+        fields = set()
+        try:
+            for literal, field_name, format_spec, conversion in _formatter.parse(text):
+                if field_name is not None:
+                    if not field_name or field_name.isdigit():
+                        raise ValueError("模板不支持位置参数")
+                    # 只取根变量名，如 {card.x} / {items[0]} 取 card / items
+                    fields.add(field_name.split('.', 1)[0].split('[', 1)[0])
+                    spec = compile_template(format_spec) if format_spec and '{' in format_spec else format_spec
+                    segments.append((literal, field_name, conversion, spec))
+                elif literal:
+                    segments.append((literal, None, None, None))
+        except ValueError as e:
+            self.error = e
+            segments = []
+        self.segments = tuple(segments)
+        self.fields = frozenset(fields)
+
+    def render(self, variables) -> str:
+        """单遍渲染；缺少变量时抛出 KeyError，模板无效时抛出 ValueError"""
+        if self.error is not None:
+            raise ValueError(self.error)
+        parts = []
+        for literal, field_name, conversion, spec in self.segments:
+            if literal:
+                parts.append(literal)
+            if field_name is None:
+                continue
+            if '.' in field_name or '[' in field_name:
+                value = _formatter.get_field(field_name, (), variables)[0]
+            else:
+                value = variables[field_name]
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            if isinstance(spec, CompiledTemplate):
+                spec = spec.render(variables)
+            parts.append(format(value, spec) if spec else str(value))
+        return ''.join(parts)
+
+    def split(self, name: str) -> tuple:
+        """
+        按 {name} 占位符将模板拆分为前后两段（各自去除首尾空白后编译）
+        :return: (前段, 后段)；模板中不含该占位符时返回 None
+        """
+        if name not in self._splits:
+            placeholder = '{' + name + '}'
+            if placeholder in self.text:
+                parts = self.text.split(placeholder)
+                before = parts[0].strip()
+                after = parts[1].strip() if len(parts) > 1 else ""
+                self._splits[name] = (compile_template(before), compile_template(after))
+            else:
+                self._splits[name] = None
+        return self._splits[name]
+
+
+@lru_cache(maxsize=512)
+def compile_template(template: str) -> CompiledTemplate:
+    """编译消息模板（按模板文本缓存）"""
+    return CompiledTemplate(template)
+
+
+# 提示词模板中的 {变量名} 占位符
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+@lru_cache(maxsize=128)
+def compile_prompt(template: str) -> tuple:
+    """编译提示词模板为 (文本, 变量名, 文本, 变量名, ..., 文本) 片段（按模板文本缓存）"""
+    return tuple(PLACEHOLDER_PATTERN.split(template))
+
+
+def render_prompt(template: str, values: dict) -> str:
+    """
+    单遍替换提示词模板中的 {变量名} 占位符
+    未提供的变量保持原样，变量值中的花括号不会被再次替换
+    """
+    segments = compile_prompt(template)
+    parts = list(segments)
+    for i in range(1, len(parts), 2):
+        name = parts[i]
+        parts[i] = values.get(name, '{' + name + '}')
+    return ''.join(parts)
+
+
+def iter_config_templates(config) -> list:
+    """列出配置中的所有消息模板"""
+    templates = []
+    if not config:
+        return templates
+    for key, value in config.items():
+        if key.endswith('_template') and isinstance(value, str):
+            templates.append(value)
+    for group in TEMPLATE_CONFIG_GROUPS:
+        for key, value in (config.get(group) or {}).items():
+            if key.endswith('_template') and isinstance(value, str):
+                templates.append(value)
+    return templates
+
+
+def compile_config_templates(config) -> dict:
+    """预编译配置中的全部消息模板，返回 {模板: 编译结果}"""
+    compiled = {}
+    for template in iter_config_templates(config):
+        compiled[template] = compile_template(template)
+        if compiled[template].error is not None:
+            logger.warning(f"消息模板无效: {compiled[template].error}，模板: {template[:30]}")
+    return compiled
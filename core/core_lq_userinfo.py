@@ -8,10 +8,20 @@ from typing import Dict, Optional, Tuple, Any
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 import astrbot.api.message_components as Comp
+from .core_lq_profile import ProfileCache
+from .variable import DEFAULT_PROFILE_CACHE_TTL
 
 class UserInfoManager:
     """用户信息管理器 - API直接获取版"""
     
+    # aiocqhttp用户资料缓存，所有调用共用
+    profile_cache = ProfileCache()
+    
+    @classmethod
+    def configure(cls, config):
+        """根据插件配置设置用户资料缓存的有效期"""
+        cls.profile_cache.configure(config.get('user_info_cache_ttl', DEFAULT_PROFILE_CACHE_TTL))
+    
     @staticmethod
     async def get_user_info(event: AstrMessageEvent, target_user_id: str = None) -> Dict[str, Any]:
         """
@@ -76,45 +86,15 @@ class UserInfoManager:
             from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import AiocqhttpMessageEvent
             
             if isinstance(event, AiocqhttpMessageEvent):
-                client = event.bot
-                
-                # 获取陌生人信息
-                stranger_info = {}
-                try:
-                    stranger_info = await client.get_stranger_info(
-                        user_id=int(user_id), no_cache=True
-                    )
-                    logger.debug(f"[UserInfoManager] 获取陌生人信息成功: {user_id}")
-                except Exception as e:
-                    logger.debug(f"[UserInfoManager] 获取陌生人信息失败: {e}")
-                
-                # 获取群成员信息
-                member_info = {}
-                group_id = event.get_group_id()
-                if group_id:
-                    try:
-                        member_info = await client.get_group_member_info(
-                            user_id=int(user_id), group_id=int(group_id)
-                        )
-                        logger.debug(f"[UserInfoManager] 获取群成员信息成功: {user_id}")
-                    except Exception as e:
-                        logger.debug(f"[UserInfoManager] 获取群成员信息失败: {e}")
-                
-                # 组合信息
-                nickname = stranger_info.get("nickname") or f"用户{user_id[-6:]}"
-                card = member_info.get("card") or nickname
-                title = member_info.get("title") or "无"
-                sex = stranger_info.get("sex") or "unknown"
-                
-                return {
-                    "user_id": user_id,
-                    "nickname": nickname,
-                    "card": card,
-                    "title": title,
-                    "sex": sex,
-                    "platform": "aiocqhttp",
-                    "group_id": group_id or ""
-                }
+                # 资料按 (平台, 群, 用户) 缓存，并发的查询共用一次接口调用
+                group_id = event.get_group_id() or ""
+                profile = await UserInfoManager.profile_cache.get(
+                    ("aiocqhttp", group_id, user_id),
+                    lambda: UserInfoManager._fetch_aiocqhttp_user_info(event.bot, user_id, group_id)
+                )
+                if profile is not None:
+                    # 返回副本，调用方修改不影响缓存
+                    return dict(profile)
             
         except Exception as e:
             logger.error(f"[UserInfoManager] aiocqhttp信息获取失败: {e}")
@@ -130,6 +110,61 @@ class UserInfoManager:
             "group_id": event.get_group_id() or ""
         }
     
+    @staticmethod
+    async def _fetch_aiocqhttp_user_info(client, user_id: str, group_id: str) -> Dict[str, Any]:
+        """
+        调用aiocqhttp接口查询用户资料
+        
+        Args:
+            client: aiocqhttp客户端
+            user_id: 用户ID
+            group_id: 群ID（私聊时为空）
+            
+        Returns:
+            用户信息字典，接口全部调用失败时返回None（不缓存，由调用方降级处理）
+        """
+        # 获取陌生人信息
+        stranger_info = None
+        try:
+            stranger_info = await client.get_stranger_info(
+                user_id=int(user_id), no_cache=True
+            )
+            logger.debug(f"[UserInfoManager] 获取陌生人信息成功: {user_id}")
+        except Exception as e:
+            logger.debug(f"[UserInfoManager] 获取陌生人信息失败: {e}")
+        
+        # 获取群成员信息
+        member_info = None
+        if group_id:
+            try:
+                member_info = await client.get_group_member_info(
+                    user_id=int(user_id), group_id=int(group_id)
+                )
+                logger.debug(f"[UserInfoManager] 获取群成员信息成功: {user_id}")
+            except Exception as e:
+                logger.debug(f"[UserInfoManager] 获取群成员信息失败: {e}")
+        
+        if stranger_info is None and member_info is None:
+            return None
+        stranger_info = stranger_info or {}
+        member_info = member_info or {}
+        
+        # 组合信息
+        nickname = stranger_info.get("nickname") or f"用户{user_id[-6:]}"
+        card = member_info.get("card") or nickname
+        title = member_info.get("title") or "无"
+        sex = stranger_info.get("sex") or "unknown"
+        
+        return {
+            "user_id": user_id,
+            "nickname": nickname,
+            "card": card,
+            "title": title,
+            "sex": sex,
+            "platform": "aiocqhttp",
+            "group_id": group_id
+        }
+    
     @staticmethod
     def extract_at_user_id(event: AstrMessageEvent) -> Optional[str]:
         """
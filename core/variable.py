@@ -14,6 +14,8 @@ FORTUNE_DATA_PATH = "data/plugin_data/astrbot_plugin_daily_fortune/fortune_histo
 LINGQIAN_HISTORY_FILE = "lingqian_history.json"
 JIEQIAN_HISTORY_FILE = "jieqian_history.json"
 JIEQIAN_CONTENT_FILE = "jieqian_content.json"
+JIEQIAN_SELF_CACHE_FILE = "jieqian_self_cache.json"
+SQLITE_DB_FILE = "lingqian.db"
 
 # 数字转中文映射表
 NUMBER_TO_CHINESE = {
@@ -68,6 +70,7 @@ TEMPLATE_VARIABLES = [
     '{jqxh}',      # 解签序号
     '{content}',   # 解签内容
     '{jieqian}',   # 解签结果
+    '{jq_queue}',  # 解签排队位置（0为无需排队）
     '{lingqian_ranks}',          # 灵签排行显示
     '{lingqian_history_content}', # 灵签历史内容
     '{lqhi_display}',    # 灵签历史展示数量
@@ -95,6 +98,26 @@ INTERNAL_VARIABLES = [
 DEFAULT_DISPLAY_COUNT = 10
 DEFAULT_SHANG_RATE = "-20, -10, -5, -1, 0, 1, 3, 5, 10"
 DEFAULT_ZHONG_RATE = "-1, -3, -5, -10, 0, 1, 5, 10, 20"
+DEFAULT_FLUSH_INTERVAL = 5  # 历史数据写回间隔（秒）
+DEFAULT_COMPACT_THRESHOLD = 1000  # journal模式下触发压缩的日志条数
+DEFAULT_BACKUP_COUNT = 3  # 数据文件保留的旧快照份数
+DEFAULT_LLM_CONCURRENCY = 3  # 全局同时进行的LLM解签请求数
+DEFAULT_LLM_GROUP_CONCURRENCY = 1  # 每个群同时进行的LLM解签请求数
+DEFAULT_SELF_CACHE_TTL = 168  # 签文拆解缓存有效期（小时）
+DEFAULT_SELF_CACHE_SIZE = 500  # 签文拆解缓存最大条数
+DEFAULT_QUESTION_CACHE_REUSE = 5  # 相似问题的解签结果每天最多复用次数
+DEFAULT_QUESTION_CACHE_SIZE = 1000  # 相似问题缓存最大条数
+DEFAULT_STREAM_CHUNK_SIZE = 60  # 流式输出时每条消息的最小字数
+DEFAULT_BREAKER_FAILURES = 3  # 供应商连续失败多少次后熔断
+DEFAULT_BREAKER_COOLDOWN = 60  # 供应商熔断后的冷却时间（秒）
+DEFAULT_BREAKER_SLOW_SECONDS = 0  # 供应商平均响应耗时超过该值时熔断（秒），0为不按耗时熔断
+DEFAULT_ROSTER_TTL = 600  # 群成员列表缓存有效期（秒）
+DEFAULT_PROFILE_CACHE_TTL = 300  # 用户资料缓存有效期（秒）
+DEFAULT_PROFILE_CACHE_SIZE = 2000  # 用户资料缓存最大条数
+RESOLVER_REVALIDATE_INTERVAL = 60  # 解析结果的完整校验间隔（秒），期间只比较配置与列表标识
+
+# 解签缓存使用的通用称呼，回复中的该称呼在发送前替换为用户名
+SELF_CACHE_USER_NAME = "求签人"
 
 # 灵签数量
 LINGQIAN_TOTAL_COUNT = 100
@@ -105,53 +128,15 @@ JIEQIAN_STATUS = {
     'PROCESSING': 'processing'  # 解签中
 }
 
-# 统计函数
-def get_jieqian_statistics() -> dict:
-    """获取全局解签统计信息（所有用户）"""
-    import json
-    import os
-    
-    try:
-        jieqian_history_path = os.path.join(PLUGIN_DATA_PATH, JIEQIAN_HISTORY_FILE)
-        today = get_today()
-        
-        # 统计所有用户的解签数据
-        total_count = 0      # 历史解签总数
-        today_count = 0      # 今日解签总数
-        user_count = 0       # 参与用户数
-        
-        if os.path.exists(jieqian_history_path):
-            with open(jieqian_history_path, 'r', encoding='utf-8') as f:
-                jieqian_data = json.load(f)
-            
-            for user_id, user_data in jieqian_data.items():
-                if user_data:  # 用户有数据
-                    user_count += 1
-                    
-                    for date, records in user_data.items():
-                        if isinstance(records, list):
-                            total_count += len(records)
-                            
-                            # 统计今日解签数
-                            if date == today:
-                                today_count += len(records)
-        
-        return {
-            "jqhi_total": total_count,           # 历史解签总数
-            "jqhi_total_today": today_count,     # 今日解签总数
-            "user_count": user_count,
-            # 保持向后兼容
-            "total_count": total_count,
-            "today_count": today_count
-        }
-        
-    except Exception as e:
-        # 这里不能使用logger，因为可能会导致循环导入
-        print(f"获取全局解签统计信息失败: {e}")
-        return {
-            "jqhi_total": 0,
-            "jqhi_total_today": 0,
-            "user_count": 0,
-            "total_count": 0,
-            "today_count": 0
-        }
+# 存储模式
+STORAGE_MODE = {
+    'SNAPSHOT': 'snapshot',  # 整体写回数据文件
+    'JOURNAL': 'journal',    # 追加日志，定期压缩为快照
+    'SQLITE': 'sqlite'       # 按行写入本地SQLite数据库
+}
+
+# 抽签模式
+DRAW_MODE = {
+    'FAST': 'fast',                  # 独立生成器连续抽取，开销最小
+    'REPRODUCIBLE': 'reproducible'   # 按用户与日期的带密钥哈希派生，结果可复现
+}
@@ -12,11 +12,14 @@ import os
 import asyncio
 
 # 导入核心模块
-from .core.variable import get_date, get_today, NUMBER_TO_CHINESE, get_jieqian_statistics
+from .core.variable import get_date, get_today, NUMBER_TO_CHINESE
 from .core.core_lq import DailyLingqianManager
 from .core.core_lq_llm import LLMManager
 from .core.core_lq_userinfo import UserInfoManager
 from .core.core_lq_group import GroupManager
+from .core.core_lq_fortune import FortuneReader
+from .core.core_lq_io import shutdown_io
+from .core.core_lq_template import LazyVariables, CompiledTemplate, compile_template, compile_config_templates
 from .permission.permission import PermissionManager
 from .permission.whitelist import WhitelistManager
 
@@ -28,6 +31,7 @@ from .command.lq.lq_history import LingqianHistoryHandler
 from .command.lq.lq_delete import LingqianDeleteHandler
 from .command.lq.lq_initialize import LingqianInitializeHandler
 from .command.lq.lq_reset import LingqianResetHandler
+from .command.lq.lq_migrate import LingqianMigrateHandler
 
 from .command.jq.jq import JieqianHandler
 from .command.jq.jq_help import JieqianHelpHandler
@@ -57,10 +61,13 @@ class DailyLingqianPlugin(Star):
         self._update_pics_version_options()
         
         # 初始化管理器
-        self.lingqian_manager = DailyLingqianManager()
+        self.lingqian_manager = DailyLingqianManager(config)
         self.llm_manager = LLMManager(context, config)
         self.whitelist_manager = WhitelistManager(config)
+        GroupManager.configure(config)
+        UserInfoManager.configure(config)
         self.group_manager = GroupManager()
+        self.fortune_reader = FortuneReader()
         
         # 初始化指令处理器
         self.lq_handler = LingqianHandler(self)
@@ -70,6 +77,7 @@ class DailyLingqianPlugin(Star):
         self.lq_delete_handler = LingqianDeleteHandler(self)
         self.lq_initialize_handler = LingqianInitializeHandler(self)
         self.lq_reset_handler = LingqianResetHandler(self)
+        self.lq_migrate_handler = LingqianMigrateHandler(self)
         
         self.jq_handler = JieqianHandler(self)
         self.jq_help_handler = JieqianHelpHandler(self)
@@ -86,7 +94,13 @@ class DailyLingqianPlugin(Star):
     
     async def initialize(self):
         """异步初始化方法"""
-        pass
+        # 启动历史数据的后台写回任务
+        self.lingqian_manager.start_background_flush()
+        self.llm_manager.start_background_flush()
+        
+        # 预编译配置中的消息模板
+        compiled = compile_config_templates(self.config)
+        logger.debug(f"已编译 {len(compiled)} 个消息模板")
     
     def _update_pics_version_options(self):
         """动态更新图片版本选项"""
@@ -135,7 +149,7 @@ class DailyLingqianPlugin(Star):
         """检查白名单权限"""
         return self.whitelist_manager.is_group_allowed(event)
     
-    def _get_fortune_adjustment(self, user_id: str) -> dict:
+    async def _get_fortune_adjustment(self, user_id: str) -> dict:
         """获取人品值调整参数"""
         try:
             if not self.config.get('lingqian_daily_fortune_support', False):
@@ -144,110 +158,31 @@ class DailyLingqianPlugin(Star):
             if not self.config.get('lingqian_ratefix', False):
                 return None
             
-            # 读取人品数据
-            fortune_data = self._load_fortune_data()
-            if not fortune_data or user_id not in fortune_data:
-                return None
-            
-            today = get_today()
-            user_fortune_data = fortune_data[user_id]
-            
             # 查找今日的人品数据（支持带时间戳的日期格式）
-            user_fortune = None
-            for date_key, data in user_fortune_data.items():
-                if date_key.startswith(today):  # 匹配今日日期，忽略时间部分
-                    user_fortune = data
-                    break
-            
+            user_fortune = await self.fortune_reader.get_today_fortune_async(user_id)
             if not user_fortune:
                 return None
             
             jrrp = user_fortune.get('jrrp', 0)
             
             # 读取ranges配置
-            ranges_jrrp, ranges_fortune = self._load_fortune_ranges()
+            ranges_jrrp, ranges_fortune = await self.fortune_reader.get_ranges_async()
             if not ranges_jrrp:
                 return None
             
-            # 确定用户属于哪个range
-            range_index = self._get_jrrp_range_index(jrrp, ranges_jrrp)
-            if range_index == -1:
-                return None
-            
-            # 获取调整参数
-            shang_rates = self._parse_rate_string(self.config.get('lingqian_shang_rate', ''))
-            zhong_rates = self._parse_rate_string(self.config.get('lingqian_zhong_rate', ''))
-            
-            if range_index < len(shang_rates) and range_index < len(zhong_rates):
-                return {
-                    'shang_rate': shang_rates[range_index],
-                    'zhong_rate': zhong_rates[range_index]
-                }
-            
-            return None
+            # 按用户所属range获取预计算的调整参数与别名表（配置变化时才重新解析）
+            draw_tables = self.lingqian_manager.get_draw_tables(
+                ranges_jrrp,
+                self.config.get('lingqian_shang_rate', ''),
+                self.config.get('lingqian_zhong_rate', '')
+            )
+            return draw_tables.lookup(jrrp)
             
         except Exception as e:
             logger.error(f"获取人品调整参数失败: {e}")
             return None
     
-    def _load_fortune_data(self) -> dict:
-        """加载人品数据"""
-        try:
-            fortune_path = "data/plugin_data/astrbot_plugin_daily_fortune/fortune_history.json"
-            if os.path.exists(fortune_path):
-                with open(fortune_path, 'r', encoding='utf-8-sig') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            logger.error(f"无法读取fortune_history.json内容: {e}")
-            return {}
-    
-    def _load_fortune_ranges(self) -> tuple:
-        """加载人品范围配置"""
-        try:
-            config_path = "data/config/astrbot_plugin_daily_fortune_config.json"
-            if os.path.exists(config_path):
-                with open(config_path, 'r', encoding='utf-8-sig') as f:
-                    fortune_config = json.load(f)
-                    ranges_jrrp = fortune_config.get('ranges_jrrp', '')
-                    ranges_fortune = fortune_config.get('ranges_fortune', '')
-                    return ranges_jrrp, ranges_fortune
-            return None, None
-        except Exception as e:
-            logger.error(f"无法读取ranges_jrrp内容: {e}")
-            return None, None
-    
-    def _get_jrrp_range_index(self, jrrp: int, ranges_jrrp: str) -> int:
-        """获取jrrp所属的范围索引"""
-        try:
-            ranges = [r.strip() for r in ranges_jrrp.split(',')]
-            for i, range_str in enumerate(ranges):
-                if '-' in range_str:
-                    start, end = map(int, range_str.split('-'))
-                    if start <= jrrp <= end:
-                        return i
-                else:
-                    if jrrp == int(range_str):
-                        return i
-            return -1
-        except Exception as e:
-            logger.error(f"解析jrrp范围失败: {e}")
-            return -1
-    
-    def _parse_rate_string(self, rate_str: str) -> list:
-        """解析概率调整字符串"""
-        try:
-            if not rate_str:
-                return []
-            rates = []
-            for rate in rate_str.split(','):
-                rates.append(float(rate.strip()))
-            return rates
-        except Exception as e:
-            logger.error(f"解析概率字符串失败: {e}")
-            return []
-    
-    def _check_jrrp_required(self, user_id: str) -> bool:
+    async def _check_jrrp_required(self, user_id: str) -> bool:
         """检查是否满足人品前置条件"""
         try:
             if not self.config.get('lingqian_daily_fortune_support', False):
@@ -256,49 +191,51 @@ class DailyLingqianPlugin(Star):
             if not self.config.get('lingqian_jrrp_required', False):
                 return True  # 未启用required，无需检查
                 
-            # 检查是否有今日人品数据
-            fortune_data = self._load_fortune_data()
-            if not fortune_data or user_id not in fortune_data:
-                return False
-            
-            today = get_today()
-            user_fortune_data = fortune_data[user_id]
-            
-            # 检查是否有今日的数据（支持带时间戳的日期格式）
-            for date_key in user_fortune_data.keys():
-                if date_key.startswith(today):  # 匹配今日日期，忽略时间部分
-                    return True
-            
-            return False
+            # 检查是否有今日人品数据（支持带时间戳的日期格式）
+            return await self.fortune_reader.get_today_fortune_async(user_id) is not None
             
         except Exception as e:
             logger.error(f"检查人品前置条件失败: {e}")
             return True  # 出错时默认允许
     
-    def _format_template(self, template: str, variables: dict) -> str:
-        """格式化模板字符串"""
+    def _format_template(self, template, variables: dict) -> str:
+        """
+        格式化模板字符串（模板按文本缓存编译结果，惰性变量仅在模板引用时解析）
+        :param template: 模板文本或已编译的模板
+        """
+        compiled = template if isinstance(template, CompiledTemplate) else compile_template(template)
         try:
-            return template.format(**variables)
+            # 先按预分析的字段检查变量是否齐全，避免为注定失败的格式化计算惰性变量
+            missing = [field for field in compiled.fields if field not in variables]
+            if missing:
+                logger.debug(f"模板格式化失败: 缺少变量 {missing}")
+                return compiled.text
+            return compiled.render(variables)
         except Exception as e:
             logger.debug(f"模板格式化失败: {e}")
-            return template
+            return compiled.text
     
     def _build_variables(self, event: AstrMessageEvent, user_info: dict = None, lingqian_data: dict = None, **kwargs) -> dict:
-        """构建模板变量字典"""
-        # 获取全局解签统计信息
-        global_stats = get_jieqian_statistics()
-        
-        variables = {
-            'date': get_date(),
-            'today': get_today(),
+        """构建模板变量字典（日期、全局解签统计、图片路径等在模板引用时才计算）"""
+        variables = LazyVariables({
             'user_id': user_info.get('user_id', '') if user_info else event.get_sender_id(),
             'nickname': user_info.get('nickname', '') if user_info else event.get_sender_name(),
             'card': user_info.get('card', '') if user_info else event.get_sender_name(),
             'title': user_info.get('title', '') if user_info else '',
-            # 添加全局解签统计变量
-            'jqhi_total': global_stats['jqhi_total'],           # 历史解签总数
-            'jqhi_total_today': global_stats['jqhi_total_today'], # 今日解签总数
-        }
+        })
+        variables.lazy('date', get_date)
+        variables.lazy('today', get_today)
+        
+        # 全局解签统计，两个变量共用一次查询
+        global_stats = {}
+        def jieqian_stat(key):
+            def resolve():
+                if not global_stats:
+                    global_stats.update(self.llm_manager.get_jieqian_statistics())
+                return global_stats[key]
+            return resolve
+        variables.lazy('jqhi_total', jieqian_stat('jqhi_total'))              # 历史解签总数
+        variables.lazy('jqhi_total_today', jieqian_stat('jqhi_total_today'))  # 今日解签总数
         
         if lingqian_data:
             variables.update({
@@ -309,16 +246,8 @@ class DailyLingqianPlugin(Star):
             })
             
             # 添加图片路径 - 构建格式：./.resource/{lq_pics_version}/{qianxu}.png
-            pics_version = self.config.get('lq_pics_version', '100_default')
             if lingqian_data.get('qianxu'):
-                plugin_dir = os.path.dirname(__file__)
-                image_path = os.path.join(plugin_dir, ".resource", pics_version, f"{lingqian_data['qianxu']}.png")
-                # 确保路径存在，如果不存在则使用占位符
-                if os.path.exists(image_path):
-                    variables['lqpic'] = image_path
-                else:
-                    logger.warning(f"灵签图片不存在: {image_path}")
-                    variables['lqpic'] = f"[图片不存在: {pics_version}/{lingqian_data['qianxu']}.png]"
+                variables.lazy('lqpic', lambda: self._resolve_lqpic(lingqian_data['qianxu']))
             else:
                 variables['lqpic'] = ""
         
@@ -326,6 +255,17 @@ class DailyLingqianPlugin(Star):
         variables.update(kwargs)
         
         return variables
+    
+    def _resolve_lqpic(self, qianxu: int) -> str:
+        """获取灵签图片路径，不存在时返回占位文字"""
+        pics_version = self.config.get('lq_pics_version', '100_default')
+        plugin_dir = os.path.dirname(__file__)
+        image_path = os.path.join(plugin_dir, ".resource", pics_version, f"{qianxu}.png")
+        # 确保路径存在，如果不存在则使用占位符
+        if os.path.exists(image_path):
+            return image_path
+        logger.warning(f"灵签图片不存在: {image_path}")
+        return f"[图片不存在: {pics_version}/{qianxu}.png]"
 
     # ==================== 灵签指令 ====================
     
@@ -371,6 +311,13 @@ class DailyLingqianPlugin(Star):
             yield result
         event.stop_event()
 
+    @filter.command("lqmigrate", alias={"lingqianmigrate"})
+    async def lq_migrate(self, event: AstrMessageEvent, confirm: str = ""):
+        """将JSON数据导入SQLite存储"""
+        async for result in self.command_handler.handle_lq(event, "migrate"):
+            yield result
+        event.stop_event()
+
     # ==================== 解签指令 ====================
 
     @filter.command("jq", alias={"jieqian", "解签"})
@@ -422,9 +369,21 @@ class DailyLingqianPlugin(Star):
             yield result
         event.stop_event()
 
+    # ==================== 群成员变动 ====================
+
+    @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
+    async def on_group_member_notice(self, event: AstrMessageEvent):
+        """监听入群/退群通知，增量更新群成员缓存（不拦截事件）"""
+        GroupManager.handle_member_notice(event)
+
     async def terminate(self):
         """插件卸载时保存缓存"""
         try:
+            # 写回内存中尚未保存的历史数据
+            await self.lingqian_manager.close()
+            await self.llm_manager.close()
+            shutdown_io()
+            
             # 检查是否需要删除数据
             if self.config.get('uninstall_delete_data', False):
                 # 删除插件数据目录
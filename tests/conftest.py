@@ -0,0 +1,24 @@
+"""
+测试公共配置
+将插件根目录加入导入路径；未安装 AstrBot 时提供 astrbot.api 的最小替身（只有日志），
+被测的存储、索引、限流与熔断模块不依赖 AstrBot 的其他接口
+"""
+
+import logging
+import os
+import sys
+import types
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PLUGIN_DIR not in sys.path:
+    sys.path.insert(0, PLUGIN_DIR)
+
+try:
+    import astrbot.api  # noqa: F401
+except ImportError:
+    astrbot = types.ModuleType('astrbot')
+    api = types.ModuleType('astrbot.api')
+    api.logger = logging.getLogger('astrbot')
+    astrbot.api = api
+    sys.modules['astrbot'] = astrbot
+    sys.modules['astrbot.api'] = api
@@ -0,0 +1,111 @@
+"""熔断器状态转换：closed → open → half_open → closed"""
+
+import types
+
+import pytest
+
+from core import core_lq_breaker
+from core.core_lq_breaker import BREAKER_STATE, CircuitBreaker, provider_key
+
+CLOSED = BREAKER_STATE['CLOSED']
+OPEN = BREAKER_STATE['OPEN']
+HALF_OPEN = BREAKER_STATE['HALF_OPEN']
+
+
+class FakeProvider:
+    def __init__(self, provider_id):
+        self.provider_id = provider_id
+
+    def meta(self):
+        return types.SimpleNamespace(id=self.provider_id)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(core_lq_breaker, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_full_cycle(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30, slow_seconds=0)
+    assert breaker.allow('p') and breaker.state('p') == CLOSED
+
+    breaker.record_failure('p', '超时')
+    assert breaker.state('p') == CLOSED
+    breaker.record_failure('p', '超时')
+    assert breaker.state('p') == OPEN
+    assert not breaker.allow('p') and not breaker.available('p')
+
+    clock[0] += 30
+    # available 只判断，不占用试探名额
+    assert breaker.available('p') and breaker.state('p') == OPEN
+    assert breaker.allow('p') and breaker.state('p') == HALF_OPEN
+    # 试探请求进行中，其他请求不放行
+    assert not breaker.allow('p') and not breaker.available('p')
+
+    breaker.record_success('p', 1.0)
+    assert breaker.state('p') == CLOSED
+    assert breaker.health('p').failures == 0
+    assert breaker.allow('p')
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, slow_seconds=0)
+    for _ in range(3):
+        breaker.record_failure('p')
+    clock[0] += 10
+    assert breaker.allow('p') and breaker.state('p') == HALF_OPEN
+
+    # 半开状态下一次失败即重新熔断，冷却重新计时
+    breaker.record_failure('p')
+    assert breaker.state('p') == OPEN
+    clock[0] += 5
+    assert not breaker.allow('p')
+    clock[0] += 5
+    assert breaker.allow('p')
+
+
+def test_lost_probe_is_released_after_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, slow_seconds=0)
+    breaker.record_failure('p')
+    clock[0] += 10
+    assert breaker.allow('p')
+    clock[0] += 9
+    assert not breaker.allow('p')
+    clock[0] += 1
+    assert breaker.allow('p') and breaker.state('p') == HALF_OPEN
+
+
+def test_slow_average_opens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, cooldown=10, slow_seconds=20)
+    breaker.record_success('p', 10.0)
+    assert breaker.state('p') == CLOSED
+    breaker.record_success('p', 60.0)
+    assert breaker.state('p') == OPEN
+
+    clock[0] += 10
+    assert breaker.allow('p')
+    # 试探请求的耗时不与熔断前的平均值混合
+    breaker.record_success('p', 5.0)
+    assert breaker.state('p') == CLOSED
+    assert breaker.health('p').latency == 5.0
+
+
+def test_pick_falls_back_and_peek_does_not_consume_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, slow_seconds=0)
+    primary, fallback = FakeProvider('primary'), FakeProvider('fallback')
+    assert provider_key(primary) == 'primary'
+
+    breaker.record_failure('primary')
+    assert breaker.pick(primary, fallback) is fallback
+    assert breaker.peek(primary, fallback) is fallback
+
+    clock[0] += 10
+    assert breaker.peek(primary, fallback) is primary
+    assert breaker.state('primary') == OPEN
+    assert breaker.pick(primary, fallback) is primary
+    assert breaker.pick(primary, fallback) is fallback
+
+    breaker.record_failure('fallback')
+    assert breaker.pick(primary, fallback) is None
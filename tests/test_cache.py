@@ -0,0 +1,53 @@
+"""签文拆解缓存：写入只标记待写回，由后台任务或关闭时在线程池中落盘"""
+
+import asyncio
+import json
+import os
+import threading
+
+from core.core_lq_cache import ResponseCache
+
+
+def test_put_defers_write_until_close(tmp_path):
+    path = tmp_path / 'cache.json'
+
+    async def scenario():
+        cache = ResponseCache(str(path), ttl=0, max_size=10, flush_interval=3600)
+        threads = []
+        write = cache._write
+
+        def recording_write(entries):
+            threads.append(threading.current_thread())
+            write(entries)
+
+        cache._write = recording_write
+        for i in range(3):
+            cache.put(f'k{i}', f'v{i}')
+        # 未命中时不再整体写回文件
+        assert not os.path.exists(path)
+        await cache.close()
+        assert len(threads) == 1 and threads[0] is not threading.current_thread()
+
+    asyncio.run(scenario())
+
+    with open(path, 'r', encoding='utf-8') as f:
+        assert set(json.load(f)['entries']) == {'k0', 'k1', 'k2'}
+    reopened = ResponseCache(str(path), ttl=0, max_size=10)
+    assert reopened.get('k1') == 'v1'
+
+
+def test_background_flush_writes_periodically(tmp_path):
+    path = tmp_path / 'cache.json'
+
+    async def scenario():
+        cache = ResponseCache(str(path), ttl=0, max_size=10, flush_interval=0.01)
+        cache.put('k', 'v')
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if os.path.exists(path):
+                break
+        assert os.path.exists(path)
+        assert not cache._dirty
+        await cache.close()
+
+    asyncio.run(scenario())
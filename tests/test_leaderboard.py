@@ -0,0 +1,133 @@
+"""按日索引与群排行榜随存储写入同步更新"""
+
+from core.core_lq_leaderboard import Leaderboard, LeaderboardCache
+from core.core_lq_sqlite import LAYOUT_DAY_LIST
+from core.core_lq_store import HistoryStore
+
+TODAY = '2026-01-02'
+YESTERDAY = '2026-01-01'
+MEMBERS = {user_id: {'user_id': user_id} for user_id in ('u1', 'u2', 'u3', 'u4')}
+
+
+def open_store(tmp_path, layout=None):
+    kwargs = {'layout': layout} if layout else {}
+    return HistoryStore(str(tmp_path / 'history.json'), **kwargs)
+
+
+def lingqian_board(store, members=MEMBERS, roster_version=0):
+    cache = LeaderboardCache(lambda qianxu: qianxu)
+    store.day_index.subscribe(cache)
+    return cache, lambda: cache.board('g1', TODAY, members, roster_version, store.day_index.day(TODAY))
+
+
+def test_leaderboard_orders_by_key_then_insertion():
+    board = Leaderboard({}, 0)
+    board.put('a', 2, 0)
+    board.put('b', 1, 1)
+    board.put('c', 2, 2)
+    assert board.top() == [('b', 1), ('a', 2), ('c', 2)]
+    board.put('b', 3, 3)
+    board.remove('a')
+    assert board.top(1) == [('c', 2)]
+    assert 'a' not in board and len(board) == 2
+
+
+def test_day_index_follows_set_and_delete(tmp_path):
+    store = open_store(tmp_path)
+    store.set(['u1', TODAY], {'qianxu': 5})
+    store.set(['u2', TODAY], {'qianxu': 7})
+    store.set(['u1', YESTERDAY], 9)  # 旧格式：只保存了签序
+    assert store.day_index.day(TODAY) == {'u1': 5, 'u2': 7}
+    assert store.day_index.day(YESTERDAY) == {'u1': 9}
+    assert store.day_index.count() == 3
+
+    store.delete(['u1'])
+    assert store.day_index.day(TODAY) == {'u2': 7}
+    assert store.day_index.day(YESTERDAY) == {}
+    assert store.day_index.count() == 1
+
+
+def test_board_updates_after_set(tmp_path):
+    store = open_store(tmp_path)
+    store.set(['u1', TODAY], {'qianxu': 5})
+    store.set(['u2', TODAY], {'qianxu': 7})
+    store.set(['u9', TODAY], {'qianxu': 1})  # 不在群内
+    _, board = lingqian_board(store)
+    first = board()
+    assert first.top() == [('u1', 5), ('u2', 7)]
+
+    store.set(['u3', TODAY], {'qianxu': 1})
+    store.set(['u2', TODAY], {'qianxu': 3})
+    store.set(['u4', YESTERDAY], {'qianxu': 2})  # 不是当天
+    assert board() is first
+    assert first.top() == [('u3', 1), ('u2', 3), ('u1', 5)]
+
+
+def test_board_rebuilds_when_roster_changes(tmp_path):
+    store = open_store(tmp_path)
+    store.set(['u1', TODAY], {'qianxu': 5})
+    store.set(['u4', TODAY], {'qianxu': 1})
+    cache, _ = lingqian_board(store)
+    members = {'u1': MEMBERS['u1']}
+    first = cache.board('g1', TODAY, members, 0, store.day_index.day(TODAY))
+    assert first.top() == [('u1', 5)]
+
+    members['u4'] = MEMBERS['u4']
+    rebuilt = cache.board('g1', TODAY, members, 1, store.day_index.day(TODAY))
+    assert rebuilt is not first
+    assert rebuilt.top() == [('u4', 1), ('u1', 5)]
+
+
+def test_board_updates_after_pop(tmp_path):
+    store = open_store(tmp_path, LAYOUT_DAY_LIST)
+    cache = LeaderboardCache(lambda count: -count)
+    store.day_index.subscribe(cache)
+    for user_id, count in (('u1', 2), ('u2', 3)):
+        for i in range(count):
+            store.append([user_id, TODAY], {'n': i})
+    assert store.day_index.day(TODAY) == {'u1': 2, 'u2': 3}
+    assert store.day_index.count(TODAY) == 5
+
+    board = cache.board('g1', TODAY, MEMBERS, 0, store.day_index.day(TODAY))
+    assert board.top() == [('u2', -3), ('u1', -2)]
+
+    store.pop(['u2', TODAY], -1)
+    store.pop(['u2', TODAY], -1)
+    assert board.top() == [('u1', -2), ('u2', -1)]
+
+    # 列表取空时当天记录一并删除
+    store.pop(['u2', TODAY], 0)
+    assert 'u2' not in store.data
+    assert store.day_index.day(TODAY) == {'u1': 2}
+    assert store.day_index.count(TODAY) == 2
+    assert board.top() == [('u1', -2)]
+
+
+def test_board_resets_after_replace(tmp_path):
+    store = open_store(tmp_path)
+    store.set(['u1', TODAY], {'qianxu': 5})
+    cache, board = lingqian_board(store)
+    first = board()
+    assert len(cache) == 1
+
+    store.replace({'u2': {TODAY: {'qianxu': 8}}, 'u3': {YESTERDAY: {'qianxu': 1}}})
+    assert len(cache) == 0
+    assert store.day_index.day(TODAY) == {'u2': 8}
+    assert store.day_index.count() == 2
+
+    rebuilt = board()
+    assert rebuilt is not first
+    assert rebuilt.top() == [('u2', 8)]
+
+
+def test_boards_are_dropped_when_the_date_changes(tmp_path):
+    store = open_store(tmp_path)
+    store.set(['u1', TODAY], {'qianxu': 5})
+    cache, board = lingqian_board(store)
+    board()
+    cache.board('g1', '2026-01-03', MEMBERS, 0, store.day_index.day('2026-01-03'))
+    assert len(cache) == 1
+
+    # 旧日期的变化不影响当前排行榜
+    store.set(['u2', TODAY], {'qianxu': 1})
+    assert cache.board('g1', '2026-01-03', MEMBERS, 0, {}).top() == []
@@ -0,0 +1,114 @@
+"""LLM请求并发限制：先到先得、群间公平与排队中取消"""
+
+import asyncio
+
+from core.core_lq_limiter import ConcurrencyLimiter, LimiterTicket
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_group_concurrency=0)
+        first = limiter.enter('g1')
+        waiters = [limiter.enter(group) for group in ('g1', 'g2', 'g1')]
+        assert first.state == LimiterTicket.ACTIVE
+        assert [ticket.position for ticket in waiters] == [1, 2, 3]
+
+        admitted = []
+
+        async def worker(index, ticket):
+            async with ticket:
+                admitted.append(index)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(worker(i, ticket)) for i, ticket in enumerate(waiters)]
+        await asyncio.sleep(0)
+        first.release()
+        await asyncio.gather(*tasks)
+        assert admitted == [0, 1, 2]
+        assert limiter.active == 0 and limiter.waiting == 0
+
+    run(scenario())
+
+
+def test_full_group_does_not_block_other_groups():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=3, max_group_concurrency=1)
+        a1 = limiter.enter('a')
+        a2 = limiter.enter('a')
+        b1 = limiter.enter('b')
+        private = limiter.enter('')
+
+        assert a1.state == LimiterTicket.ACTIVE
+        assert a2.state == LimiterTicket.WAITING
+        # 后到的其他群与私聊请求越过名额已满的群
+        assert b1.state == LimiterTicket.ACTIVE
+        assert private.state == LimiterTicket.ACTIVE
+        assert a2.position == 1
+
+        a1.release()
+        assert a2.state == LimiterTicket.ACTIVE
+        assert limiter.active == 3
+
+    run(scenario())
+
+
+def test_same_group_is_first_come_first_served():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=2, max_group_concurrency=1)
+        a1 = limiter.enter('a')
+        a2 = limiter.enter('a')
+        a3 = limiter.enter('a')
+        b1 = limiter.enter('b')
+        b2 = limiter.enter('b')
+        assert b1.state == LimiterTicket.ACTIVE
+        assert [a2.state, a3.state, b2.state] == [LimiterTicket.WAITING] * 3
+
+        b1.release()
+        # 全局名额空出，a群仍满，b群的下一个请求放行
+        assert b2.state == LimiterTicket.ACTIVE
+        a1.release()
+        assert a2.state == LimiterTicket.ACTIVE
+        assert a3.state == LimiterTicket.WAITING
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_group_concurrency=0)
+        first = limiter.enter('g1')
+        cancelled = limiter.enter('g1')
+        last = limiter.enter('g2')
+
+        task = asyncio.create_task(cancelled.wait())
+        await asyncio.sleep(0)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        assert cancelled.state == LimiterTicket.DONE
+        assert last.position == 1
+        first.release()
+        # 取消的请求不占用名额，下一个请求直接放行
+        assert last.state == LimiterTicket.ACTIVE
+        assert limiter.active == 1 and limiter.waiting == 0
+
+        # 重复释放不影响计数
+        cancelled.release()
+        last.release()
+        last.release()
+        assert limiter.active == 0
+
+    run(scenario())
+
+
+def test_from_config():
+    limiter = ConcurrencyLimiter.from_config(
+        {'jieqian_config': {'llm_max_concurrency': 4, 'llm_group_max_concurrency': 2}})
+    assert (limiter.max_concurrency, limiter.max_group_concurrency) == (4, 2)
@@ -0,0 +1,78 @@
+"""用户锁：同一用户的检查与抽取串行执行，空闲的锁及时回收"""
+
+import asyncio
+
+from core.core_lq import DailyLingqianManager
+from core.core_lq_lock import KeyedLock
+
+
+def test_concurrent_draws_record_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = DailyLingqianManager({})
+    records = []
+    set_record = manager.history_store.set
+
+    def recording_set(path, value):
+        records.append(path)
+        set_record(path, value)
+
+    manager.history_store.set = recording_set
+    adjustments = []
+
+    async def get_fortune_adjustment(user_id):
+        # 获取人品调整参数时会让出事件循环
+        adjustments.append(user_id)
+        await asyncio.sleep(0)
+        return None
+
+    async def draw(user_id):
+        # 与灵签指令相同：持锁检查今日记录，未抽取时获取人品调整后抽取
+        async with manager.user_locks.hold(user_id):
+            today_lingqian = manager.get_today_lingqian(user_id)
+            if today_lingqian:
+                return today_lingqian
+            return manager.draw_lingqian(user_id, await get_fortune_adjustment(user_id))
+
+    async def scenario():
+        first, second = await asyncio.gather(draw('u1'), draw('u1'))
+        assert first['qianxu'] == second['qianxu']
+        await manager.close()
+
+    asyncio.run(scenario())
+    # 第二个请求等待第一个抽取完成后直接读到今日记录
+    assert len(adjustments) == 1
+    assert len(records) == 1
+
+
+def test_locks_are_released_when_idle():
+    locks = KeyedLock()
+
+    async def scenario():
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def holder():
+            async with locks.hold('u1'):
+                entered.set()
+                await release.wait()
+
+        async def waiter():
+            async with locks.hold('u1'):
+                pass
+
+        tasks = [asyncio.create_task(holder())]
+        await entered.wait()
+        tasks.append(asyncio.create_task(waiter()))
+        async with locks.hold('u2'):
+            await asyncio.sleep(0)
+            # 持有与等待同一用户的协程共用一把锁
+            assert len(locks) == 2
+            assert locks.locked('u1') and locks.locked('u2')
+
+        assert len(locks) == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        assert len(locks) == 0
+        assert not locks.locked('u1')
+
+    asyncio.run(scenario())
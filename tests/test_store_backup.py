@@ -0,0 +1,88 @@
+"""快照轮转备份与加载时的损坏恢复"""
+
+import json
+import os
+
+from core.core_lq_io import backup_paths
+from core.core_lq_store import HistoryStore
+
+
+def open_store(path, backup_count=2):
+    # 没有事件循环时每次修改立即写回
+    return HistoryStore(str(path), backup_count=backup_count)
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_writes_rotate_backups(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    for qianxu in (1, 2, 3, 4):
+        store.set(['u1', '2026-01-01'], {'qianxu': qianxu})
+
+    bak1, bak2 = backup_paths(str(path), 2)
+    assert read_json(path)['u1']['2026-01-01']['qianxu'] == 4
+    assert read_json(bak1)['u1']['2026-01-01']['qianxu'] == 3
+    assert read_json(bak2)['u1']['2026-01-01']['qianxu'] == 2
+    assert not os.path.exists(f'{path}.bak3')
+
+
+def test_corrupt_file_recovers_from_latest_backup(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    store.set(['u1', '2026-01-02'], {'qianxu': 2})
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"u1": {"2026-01-01"')
+
+    reopened = open_store(path)
+    assert reopened.data == {'u1': {'2026-01-01': {'qianxu': 1}}}
+    # 损坏的文件移到一旁，不会被轮转进旧快照
+    with open(f'{path}.corrupt', 'r', encoding='utf-8') as f:
+        assert f.read() == '{"u1": {"2026-01-01"'
+    assert not os.path.exists(path)
+    assert reopened.day_index.day('2026-01-01') == {'u1': 1}
+
+    # 恢复的数据在下次写回时写入数据文件
+    assert reopened.flush()
+    assert read_json(path) == reopened.data
+
+
+def test_skips_corrupt_backups(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    for qianxu in (1, 2, 3):
+        store.set(['u1', '2026-01-01'], {'qianxu': qianxu})
+    bak1, bak2 = backup_paths(str(path), 2)
+    for broken in (str(path), bak1):
+        with open(broken, 'w', encoding='utf-8') as f:
+            f.write('not json')
+
+    reopened = open_store(path)
+    assert reopened.data == {'u1': {'2026-01-01': {'qianxu': 1}}}
+    assert os.path.exists(f'{path}.corrupt')
+
+
+def test_missing_file_loads_backup(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    store.set(['u1', '2026-01-01'], {'qianxu': 2})
+    os.remove(path)
+
+    reopened = open_store(path)
+    assert reopened.data == {'u1': {'2026-01-01': {'qianxu': 1}}}
+    assert not os.path.exists(f'{path}.corrupt')
+
+
+def test_all_snapshots_corrupt_starts_empty(tmp_path):
+    path = tmp_path / 'history.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[1, 2')
+
+    store = open_store(path)
+    assert store.data == {}
+    assert os.path.exists(f'{path}.corrupt')
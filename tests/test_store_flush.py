@@ -0,0 +1,47 @@
+"""snapshot 模式的异步写回：事件循环中取快照，线程池中序列化与写入"""
+
+import asyncio
+import json
+
+from core.core_lq_sqlite import LAYOUT_DAY_LIST
+from core.core_lq_store import HistoryStore
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_changes_during_write_are_not_lost(tmp_path):
+    path = tmp_path / 'jieqian.json'
+
+    async def scenario():
+        store = HistoryStore(str(path), flush_interval=3600, layout=LAYOUT_DAY_LIST)
+        store.append(['u1', '2026-01-01'], {'n': 0})
+        flush = asyncio.create_task(store.flush_async())
+        await asyncio.sleep(0)
+        # 快照已取出，写入期间原地追加的记录不会混入本次写入
+        store.append(['u1', '2026-01-01'], {'n': 1})
+        assert await flush
+        assert read_json(path) == {'u1': {'2026-01-01': [{'n': 0}]}}
+
+        assert await store.flush_async()
+        assert read_json(path) == {'u1': {'2026-01-01': [{'n': 0}, {'n': 1}]}}
+        await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_snapshot_copies_containers_only(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.json'), flush_interval=3600)
+    record = {'qianxu': 1}
+    store.data = {'u1': {'2026-01-01': record}, 'u2': {'2026-01-01': [1, 2]}, 'u3': [{'date': '2026-01-01'}]}
+    snapshot = store._snapshot()
+
+    assert snapshot == store.data
+    assert snapshot['u1'] is not store.data['u1']
+    assert snapshot['u2']['2026-01-01'] is not store.data['u2']['2026-01-01']
+    assert snapshot['u3'] is not store.data['u3']
+    # 记录总是整体替换，无需复制
+    assert snapshot['u1']['2026-01-01'] is record
+
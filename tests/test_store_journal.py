@@ -0,0 +1,178 @@
+"""journal 模式：日志重放、压缩与整体替换"""
+
+import asyncio
+import json
+import os
+
+from core.core_lq_store import HistoryStore
+from core.core_lq_sqlite import LAYOUT_DAY_LIST
+from core.variable import STORAGE_MODE
+
+JOURNAL = STORAGE_MODE['JOURNAL']
+
+
+def open_store(path, **kwargs):
+    kwargs.setdefault('compact_threshold', 1000)
+    return HistoryStore(str(path), mode=JOURNAL, **kwargs)
+
+
+def journal_lines(store):
+    with open(store.journal_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_replay_restores_uncompacted_changes(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    store.set(['u2', '2026-01-01'], {'qianxu': 2})
+    store.delete(['u2', '2026-01-01'])
+    # 头部之后每次修改一行
+    assert len(journal_lines(store)) == 4
+
+    # 不关闭存储，模拟崩溃后重启
+    reopened = open_store(path)
+    assert reopened.data == {'u1': {'2026-01-01': {'qianxu': 1}}}
+    # 重放后压缩为快照，新日志只剩头部
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == reopened.data
+    assert len(journal_lines(reopened)) == 1
+
+
+def test_replay_list_operations(tmp_path):
+    path = tmp_path / 'jieqian.json'
+    store = open_store(path, layout=LAYOUT_DAY_LIST)
+    store.append(['u1', '2026-01-01'], {'n': 1})
+    store.append(['u1', '2026-01-01'], {'n': 2})
+    store.append(['u1', '2026-01-01'], {'n': 3})
+    store.pop(['u1', '2026-01-01'], 0)
+
+    reopened = open_store(path, layout=LAYOUT_DAY_LIST)
+    assert reopened.data == {'u1': {'2026-01-01': [{'n': 2}, {'n': 3}]}}
+    assert reopened.day_index.count('2026-01-01') == 2
+
+
+def test_truncated_tail_is_dropped(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    store._close_journal()
+    with open(store.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"op":"set","path":["u2"')
+
+    reopened = open_store(path)
+    assert reopened.data == {'u1': {'2026-01-01': {'qianxu': 1}}}
+
+
+def test_journal_of_older_snapshot_is_not_replayed(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    with open(store.journal_path, 'r', encoding='utf-8') as f:
+        stale_journal = f.read()
+    store.compact()
+    store.set(['u1', '2026-01-01'], {'qianxu': 5})
+    store.compact()
+    store._close_journal()
+
+    # 基于旧快照的日志不能重放到新快照上
+    with open(store.journal_path, 'w', encoding='utf-8') as f:
+        f.write(stale_journal)
+    reopened = open_store(path)
+    assert reopened.data == {'u1': {'2026-01-01': {'qianxu': 5}}}
+
+
+def test_compaction_after_threshold(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path, compact_threshold=3)
+    for i in range(3):
+        store.set([f'u{i}', '2026-01-01'], {'qianxu': i + 1})
+
+    # 没有事件循环时达到阈值立即压缩
+    with open(path, 'r', encoding='utf-8') as f:
+        assert len(json.load(f)) == 3
+    assert len(journal_lines(store)) == 1
+
+    store.set(['u9', '2026-01-01'], {'qianxu': 9})
+    reopened = open_store(path)
+    assert set(reopened.data) == {'u0', 'u1', 'u2', 'u9'}
+
+
+def test_replace_without_loop_compacts_immediately(tmp_path):
+    path = tmp_path / 'history.json'
+    store = open_store(path)
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    store.replace({'u2': {'2026-01-02': {'qianxu': 2}}})
+    store.set(['u3', '2026-01-02'], {'qianxu': 3})
+
+    reopened = open_store(path)
+    assert reopened.data == {
+        'u2': {'2026-01-02': {'qianxu': 2}},
+        'u3': {'2026-01-02': {'qianxu': 3}},
+    }
+    assert reopened.day_index.day('2026-01-02') == {'u2': 2, 'u3': 3}
+
+
+def test_replace_in_loop_keeps_changes_made_during_compaction(tmp_path):
+    path = tmp_path / 'history.json'
+
+    async def scenario():
+        store = open_store(path, flush_interval=3600)
+        store.set(['u1', '2026-01-01'], {'qianxu': 1})
+        store.replace({'u2': {'2026-01-02': {'qianxu': 2}}})
+        # 压缩在线程池中进行，期间的修改先暂存
+        store.set(['u3', '2026-01-02'], {'qianxu': 3})
+        assert store._pending is not None
+        await asyncio.gather(*store._tasks)
+        assert store._pending is None
+        store._close_journal()
+
+    asyncio.run(scenario())
+
+    reopened = open_store(path)
+    assert reopened.data == {
+        'u2': {'2026-01-02': {'qianxu': 2}},
+        'u3': {'2026-01-02': {'qianxu': 3}},
+    }
+
+
+def test_replace_in_loop_does_not_replay_list_changes_twice(tmp_path):
+    path = tmp_path / 'jieqian.json'
+    day = ['u1', '2026-01-01']
+
+    async def scenario():
+        store = open_store(path, flush_interval=3600, layout=LAYOUT_DAY_LIST)
+        store.append(day, {'n': 9})
+        store.replace({'u1': {'2026-01-01': [{'n': 0}]}})
+        # 压缩开始前的修改已包含在快照中
+        store.append(day, {'n': 1})
+        await asyncio.sleep(0)
+        # 快照写入期间的修改只记录在新日志中
+        store.append(day, {'n': 2})
+        store.pop(day, 0)
+        await asyncio.gather(*store._tasks)
+        store.append(day, {'n': 3})
+        store.pop(day, -1)
+        store._close_journal()
+
+    asyncio.run(scenario())
+
+    reopened = open_store(path, layout=LAYOUT_DAY_LIST)
+    assert reopened.data == {'u1': {'2026-01-01': [{'n': 1}, {'n': 2}]}}
+    assert reopened.day_index.count('2026-01-01') == 2
+
+
+def test_close_compacts_and_reloads(tmp_path):
+    path = tmp_path / 'history.json'
+
+    async def scenario():
+        store = open_store(path, flush_interval=3600)
+        store.set(['u1', '2026-01-01'], {'qianxu': 1})
+        await store.close()
+
+    asyncio.run(scenario())
+
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == {'u1': {'2026-01-01': {'qianxu': 1}}}
+    assert os.path.exists(f'{path}.journal')
+    assert open_store(path).data == {'u1': {'2026-01-01': {'qianxu': 1}}}
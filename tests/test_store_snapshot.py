@@ -0,0 +1,98 @@
+"""snapshot 模式：常驻内存数据的合并写回、关闭时写回与原子替换"""
+
+import asyncio
+import json
+import os
+
+from core.core_lq_store import HistoryStore
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def count_writes(store):
+    writes = []
+    write_snapshot = store._write_snapshot
+
+    def recording_write(data=None):
+        writes.append(data)
+        write_snapshot(data)
+
+    store._write_snapshot = recording_write
+    return writes
+
+
+def test_changes_are_coalesced_into_one_write(tmp_path):
+    path = tmp_path / 'history.json'
+
+    async def scenario():
+        store = HistoryStore(str(path), flush_interval=0.05)
+        writes = count_writes(store)
+        for i in range(20):
+            store.set([f'u{i}', '2026-01-01'], {'qianxu': i + 1})
+        # 修改只发生在内存中，等待写回间隔
+        assert not os.path.exists(path)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if writes:
+                break
+        assert len(writes) == 1
+        assert len(read_json(path)) == 20
+        await store.close()
+        # 没有新的修改，关闭时不再写入
+        assert len(writes) == 1
+
+    asyncio.run(scenario())
+
+
+def test_close_writes_pending_changes(tmp_path):
+    path = tmp_path / 'history.json'
+
+    async def scenario():
+        store = HistoryStore(str(path), flush_interval=3600)
+        store.set(['u1', '2026-01-01'], {'qianxu': 1})
+        await store.close()
+
+    asyncio.run(scenario())
+    assert read_json(path) == {'u1': {'2026-01-01': {'qianxu': 1}}}
+
+
+def test_zero_interval_writes_every_change(tmp_path):
+    path = tmp_path / 'history.json'
+
+    async def scenario():
+        store = HistoryStore(str(path), flush_interval=0)
+        store.set(['u1', '2026-01-01'], {'qianxu': 1})
+        await asyncio.gather(*store._tasks)
+        assert read_json(path) == {'u1': {'2026-01-01': {'qianxu': 1}}}
+        await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_interval_comes_from_config(tmp_path):
+    store = HistoryStore.from_config(str(tmp_path / 'history.json'), "灵签历史数据", {'storage_flush_interval': 30})
+    assert store.flush_interval == 30
+    assert HistoryStore.from_config(str(tmp_path / 'other.json'), "灵签历史数据", None).flush_interval > 0
+
+
+def test_failed_write_keeps_previous_file(tmp_path, monkeypatch):
+    path = tmp_path / 'history.json'
+    store = HistoryStore(str(path))
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'replace', failing_replace)
+        store.set(['u1', '2026-01-02'], {'qianxu': 2})
+    # 替换失败时原文件保持完整，修改留待下次写回
+    assert read_json(path) == {'u1': {'2026-01-01': {'qianxu': 1}}}
+    assert store._dirty
+
+    assert store.flush()
+    assert read_json(path) == store.data
+    assert not os.path.exists(f'{path}.tmp')
@@ -0,0 +1,128 @@
+"""sqlite 模式：各数据布局的写入、重新加载与JSON数据导入"""
+
+import asyncio
+import os
+import threading
+
+from core.core_lq_sqlite import LAYOUT_DAY_LIST, LAYOUT_USER_LIST
+from core.core_lq_store import HistoryStore
+from core.variable import SQLITE_DB_FILE, STORAGE_MODE
+
+SQLITE = STORAGE_MODE['SQLITE']
+
+
+def open_store(tmp_path, name, **kwargs):
+    return HistoryStore(str(tmp_path / f'{name}.json'), mode=SQLITE, **kwargs)
+
+
+def reload(store, tmp_path, name, **kwargs):
+    asyncio.run(store.close())
+    return open_store(tmp_path, name, **kwargs)
+
+
+def test_day_record_round_trip(tmp_path):
+    store = open_store(tmp_path, 'lingqian')
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    store.set(['u1', '2026-01-02'], {'qianxu': 2})
+    store.set(['u1', '2026-01-02'], {'qianxu': 3})
+    store.set(['u2', '2026-01-02'], {'qianxu': 4})
+    store.delete(['u1', '2026-01-01'])
+    assert os.path.exists(tmp_path / SQLITE_DB_FILE)
+
+    reopened = reload(store, tmp_path, 'lingqian')
+    assert reopened.data == {
+        'u1': {'2026-01-02': {'qianxu': 3}},
+        'u2': {'2026-01-02': {'qianxu': 4}},
+    }
+    assert reopened.day_index.day('2026-01-02') == {'u1': 3, 'u2': 4}
+    asyncio.run(reopened.close())
+
+
+def test_day_list_append_and_pop(tmp_path):
+    store = open_store(tmp_path, 'jieqian', layout=LAYOUT_DAY_LIST)
+    for n in range(3):
+        store.append(['u1', '2026-01-01'], {'n': n})
+    store.pop(['u1', '2026-01-01'], 1)
+
+    reopened = reload(store, tmp_path, 'jieqian', layout=LAYOUT_DAY_LIST)
+    assert reopened.data == {'u1': {'2026-01-01': [{'n': 0}, {'n': 2}]}}
+    assert reopened.day_index.count('2026-01-01') == 2
+    asyncio.run(reopened.close())
+
+
+def test_user_list_and_replace(tmp_path):
+    store = open_store(tmp_path, 'content', layout=LAYOUT_USER_LIST)
+    store.append(['u1'], {'date': '2026-01-01', 'content': 'a'})
+    store.append(['u1'], {'date': '2026-01-02', 'content': 'b'})
+    store.replace({'u2': [{'date': '2026-01-03', 'content': 'c'}]})
+
+    reopened = reload(store, tmp_path, 'content', layout=LAYOUT_USER_LIST)
+    assert reopened.data == {'u2': [{'date': '2026-01-03', 'content': 'c'}]}
+    assert reopened.day_index is None
+    asyncio.run(reopened.close())
+
+
+def test_stores_share_one_database(tmp_path):
+    lingqian = open_store(tmp_path, 'lingqian')
+    jieqian = open_store(tmp_path, 'jieqian', layout=LAYOUT_DAY_LIST)
+    lingqian.set(['u1', '2026-01-01'], {'qianxu': 1})
+    jieqian.append(['u1', '2026-01-01'], {'n': 0})
+    asyncio.run(jieqian.close())
+
+    reopened = reload(lingqian, tmp_path, 'lingqian')
+    assert reopened.data == {'u1': {'2026-01-01': {'qianxu': 1}}}
+    asyncio.run(reopened.close())
+
+
+def test_import_keeps_existing_records(tmp_path):
+    store = open_store(tmp_path, 'jieqian', layout=LAYOUT_DAY_LIST)
+    store.append(['u1', '2026-01-01'], {'n': 'kept'})
+    imported = store.import_data({
+        'u1': {'2026-01-01': [{'n': 'old'}], '2026-01-02': [{'n': 1}, {'n': 2}]},
+        'u2': 'invalid',
+    })
+    assert imported == 2
+
+    reopened = reload(store, tmp_path, 'jieqian', layout=LAYOUT_DAY_LIST)
+    assert reopened.data == {'u1': {'2026-01-01': [{'n': 'kept'}], '2026-01-02': [{'n': 1}, {'n': 2}]}}
+    asyncio.run(reopened.close())
+
+
+def test_writes_run_in_io_thread_with_captured_data(tmp_path):
+    day = ['u1', '2026-01-01']
+
+    async def scenario():
+        store = open_store(tmp_path, 'jieqian', flush_interval=3600, layout=LAYOUT_DAY_LIST)
+        threads = []
+        write = store.backend.write
+
+        def recording_write(batch):
+            threads.append(threading.current_thread())
+            write(batch)
+
+        store.backend.write = recording_write
+        store.append(day, {'n': 0})
+        store.append(day, {'n': 1})
+        # pop 需要重写该用户的数据行，使用入队时的数据副本，不受之后追加的影响
+        store.pop(day, 0)
+        store.append(day, {'n': 2})
+        assert await store.flush_async()
+        assert threads and threads[0] is not threading.current_thread()
+        store.backend.write = write
+        await store.close()
+
+    asyncio.run(scenario())
+
+    reopened = open_store(tmp_path, 'jieqian', layout=LAYOUT_DAY_LIST)
+    assert reopened.data == {'u1': {'2026-01-01': [{'n': 1}, {'n': 2}]}}
+    asyncio.run(reopened.close())
+
+
+def test_clear_empties_the_table(tmp_path):
+    store = open_store(tmp_path, 'lingqian')
+    store.set(['u1', '2026-01-01'], {'qianxu': 1})
+    store.clear()
+
+    reopened = reload(store, tmp_path, 'lingqian')
+    assert reopened.data == {}
+    asyncio.run(reopened.close())